@@ -1,65 +1,75 @@
-import os
+import sqlite3
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_cors import CORS
-from os import environ
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
-app = Flask(__name__)
-app.config.from_object('config.Config')
-db = SQLAlchemy(app)
+# Extensão sem aplicação: ligada em create_app (nenhuma conexão é aberta no import)
+db = SQLAlchemy()
 
-# Import RAG client for HTTP communication with RAG service
-from app import rag_client
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite só aplica FKs (e ON DELETE CASCADE) com o pragma ligado em cada conexão
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
 
 # Configuração CORS: permitir apenas o frontend deployado (e ajuste se precisar de localhost)
 FRONTEND_ORIGIN = "http://18.207.95.49:3000"
 
-@app.after_request
-def after_request(response):
+
+def _add_cors_headers(response):
     response.headers.add('Access-Control-Allow-Origin', FRONTEND_ORIGIN)
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-User-Id, X-User-Name')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     response.headers.add('Access-Control-Allow-Credentials', 'true')
+    response.headers.add('Access-Control-Expose-Headers', 'X-Next-Cursor, X-Total-Count')
     return response
 
-from app import routes
-from app import api_v1
 
-with app.app_context():
-    try:
-        db.create_all()
-        print("✅ Banco de dados inicializado com sucesso!")
-    except Exception as db_init_error:
-        # Gracefully handle DB connection errors (e.g., during setup script or if DB is not available)
-        print(f"⚠️  Database initialization skipped: {str(db_init_error)}")
+def create_app(config_object='config.Config'):
+    """
+    Cria a aplicação: configuração, extensões, rotas e comandos. Não acessa
+    o banco; o schema é criado/migrado por `flask db-migrate` (ou no startup
+    com SCHEMA_AUTO_MIGRATE=1, para desenvolvimento).
+    """
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    db.init_app(app)
+    if app.config.get('DB_SSM_PROJECT'):
+        from app.utils import aws_db
+        with app.app_context():
+            aws_db.use_ssm_credentials(db.engine, app.config['DB_SSM_PROJECT'])
+    app.after_request(_add_cors_headers)
+
+    from app import routes, api_v1, commands, identity, serving
+    serving.install_db_concurrency_limit(app, app.config['DB_CONCURRENCY_LIMIT'], app.config['DB_CONCURRENCY_WAIT'])
+    app.before_request(identity.resolve_identity)
+    app.register_blueprint(routes.bp)
+    app.register_blueprint(api_v1.bp)
+    app.register_blueprint(commands.bp)
+
+    if app.config.get('SCHEMA_AUTO_MIGRATE'):
+        from app import migrations
+        with app.app_context():
+            try:
+                migrations.setup_schema()
+            except Exception as db_init_error:
+                # Banco indisponível não impede a aplicação de subir
+                print(f"⚠️  Database initialization skipped: {str(db_init_error)}")
+    return app
+
+
+_default_app = None
 
-    # Tentativa segura de migrar a coluna profile_photo_url se não existir
-    try:
-        from sqlalchemy import text
-        db.session.execute(text("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns 
-                    WHERE table_name='users' AND column_name='profile_photo_url'
-                ) THEN
-                    BEGIN
-                        ALTER TABLE users ADD COLUMN profile_photo_url VARCHAR(500);
-                    EXCEPTION WHEN OTHERS THEN
-                        -- Ignorar erro caso a coluna já exista em alguns bancos
-                        NULL;
-                    END;
-                END IF;
-            END$$;
-        """))
-        db.session.commit()
-    except Exception as mig_err:
-        # Em SQLite, a sintaxe acima não vale; seguimos sem travar
-        db.session.rollback()
-        try:
-            # Tentativa best-effort para SQLite: criar tabela temporária está fora de escopo; ignorar
-            pass
-        except Exception:
-            pass
 
-    print("✅ Flask API inicializada. RAG service acessível via HTTP client.")
+def __getattr__(name):
+    # `from app import app` (run.py, gunicorn app:app, scripts) cria a aplicação padrão sob demanda
+    global _default_app
+    if name == 'app':
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+from config import Config
+
+
+def generation_name(user_id):
+    """Linha de cache_generations incrementada a cada commit com atividades do usuário"""
+    return f'activity_feed:{user_id}'
+
+
+class ActivityRingBuffer:
+    """
+    Últimas `size` atividades de cada usuário, em memória, para servir o
+    feed da página inicial sem consultar o banco. Cada processo tem o seu;
+    o buffer de um usuário guarda a geração do feed dele (cache_generations)
+    lida antes da carga, e só atende enquanto ela não mudar: um commit com
+    atividades do usuário em qualquer processo incrementa a geração. No
+    processo que gravou, as atividades novas entram direto no buffer; nos
+    demais, a próxima leitura recarrega do banco. A carga vale no máximo
+    `ttl` segundos.
+    """
+
+    def __init__(self, size, ttl, max_users):
+        self.size = size
+        self.ttl = ttl
+        self.max_users = max_users
+        # user_id -> [carregado_em, geração, deque de json (mais recente primeiro)]
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, limit, generation):
+        """Lista do feed (mais recente primeiro) ou None se o buffer não puder atender"""
+        if limit > self.size:
+            return None
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or entry[1] != generation or time.monotonic() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return list(entry[2])[:limit]
+
+    def load(self, user_id, activities, generation):
+        """
+        Substitui o buffer do usuário pelas atividades lidas do banco (mais
+        recente primeiro); `generation` deve ter sido lida antes da consulta
+        """
+        with self._lock:
+            self._users[user_id] = [time.monotonic(), generation, deque(activities[:self.size], maxlen=self.size)]
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def push(self, activities, generations):
+        """
+        Acrescenta atividades recém-gravadas aos buffers já carregados.
+        `generations` traz a geração de cada usuário após o commit; se o
+        buffer não estava na anterior, outro processo gravou no meio e ele
+        é descartado (a próxima leitura recarrega do banco).
+        """
+        with self._lock:
+            for user_id, generation in generations.items():
+                entry = self._users.get(user_id)
+                if entry is None:
+                    continue
+                if entry[1] != generation - 1:
+                    del self._users[user_id]
+                    continue
+                entry[1] = generation
+                for activity in activities:
+                    if activity.get('user_id') == user_id:
+                        entry[2].appendleft(activity)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'users': len(self._users), 'size': self.size, 'hits': self.hits, 'misses': self.misses}
+
+
+feed_buffer = ActivityRingBuffer(
+    size=Config.ACTIVITY_BUFFER_SIZE,
+    ttl=Config.ACTIVITY_BUFFER_TTL,
+    max_users=Config.ACTIVITY_BUFFER_USERS
+)
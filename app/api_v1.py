@@ -1,37 +1,47 @@
-from flask import request, jsonify, make_response
-from app import app, db
+from flask import Blueprint, request, jsonify, make_response, g
+from app import db
 from app.models import (
     User, Herd, Animal, Weighing, Movement, Reproduction, 
-    Vaccine, VaccineApplication, HealthRecord, Attachment, Activity, UserHerd
+    Vaccine, VaccineApplication, HealthRecord, Attachment, Activity, UserHerd, AnimalStatus
+)
+from app import projections, exports, imports, audit, identity, cache_generations
+from app.activity_feed import feed_buffer, generation_name
+from app.pagination import (
+    PaginationError, encode_cursor, keyset_page, parse_limit,
+    wants_cursor_pagination, paginate_request, with_page_headers
 )
 from sqlalchemy import or_
 from datetime import datetime, date
 import os
 from werkzeug.utils import secure_filename
 
+bp = Blueprint('api_v1', __name__)
+
 # ===== ROTAS PARA GESTÃO DE REBANHOS =====
 
-@app.route('/api/v1/herds', methods=['GET'])
+@bp.route('/api/v1/herds', methods=['GET'])
 def get_herds():
     """Listar todos os rebanhos do usuário"""
     try:
-        header_user_id = request.headers.get('X-User-Id') or request.headers.get('X-User-ID')
-        query_param_user_id = request.args.get('user_id', type=int)
-        user_id = None
-        if header_user_id and str(header_user_id).isdigit():
-            user_id = int(header_user_id)
-        elif query_param_user_id:
-            user_id = query_param_user_id
+        user_id = g.user_id
 
         query = Herd.query
         if user_id is not None:
             query = query.join(UserHerd).filter(UserHerd.user_id == user_id)
+
+        if wants_cursor_pagination(request.args):
+            page = paginate_request(query, [Herd.created_at, Herd.id], request.args, count_key=('herds', user_id))
+            response = make_response(jsonify([herd.json() for herd in page.items]), 200)
+            return with_page_headers(response, page)
+
         herds = query.all()
         return make_response(jsonify([herd.json() for herd in herds]), 200)
+    except PaginationError as e:
+        return make_response(jsonify({'message': str(e)}), 400)
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao buscar rebanhos: {str(e)}'}), 500)
 
-@app.route('/api/v1/herds', methods=['POST'])
+@bp.route('/api/v1/herds', methods=['POST'])
 def create_herd():
     """Criar novo rebanho"""
     try:
@@ -54,28 +64,14 @@ def create_herd():
         db.session.add(new_herd)
         db.session.flush()
 
-        user_id = request.headers.get('X-User-Id') or data.get('user_id')
-        if not user_id:
+        user_id = identity.request_user_id(data.get('user_id'))
+        if user_id is None:
             raise ValueError('Usuário não informado para associação da fazenda')
-        association = UserHerd(user_id=int(user_id), herd_id=new_herd.id)
+        association = UserHerd(user_id=user_id, herd_id=new_herd.id)
         db.session.merge(association)
-        
+        projections.track_herd_created(new_herd.id, [user_id])
+        audit.record('create', 'herd', f'Rebanho criado: {new_herd.name}', object_id=new_herd.id, user_id=user_id)
         db.session.commit()
-        # Log activity for herd creation
-        try:
-            username = request.headers.get('X-User-Name')
-            act = Activity(
-                user_id=owner_user_id,
-                username=username,
-                action='create',
-                object_type='herd',
-                object_id=new_herd.id,
-                description=f'Rebanho criado: {new_herd.name}'
-            )
-            db.session.add(act)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
 
         return make_response(jsonify({
             'message': 'Rebanho criado com sucesso',
@@ -85,11 +81,11 @@ def create_herd():
         db.session.rollback()
         return make_response(jsonify({'message': f'Erro ao criar rebanho: {str(e)}'}), 500)
 
-@app.route('/api/v1/herds/<int:herd_id>', methods=['GET'])
+@bp.route('/api/v1/herds/<int:herd_id>', methods=['GET'])
 def get_herd(herd_id):
     """Buscar rebanho por ID"""
     try:
-        user_id = request.args.get('user_id', type=int)
+        user_id = g.user_id
         query = Herd.query.filter_by(id=herd_id)
         if user_id:
             query = query.join(UserHerd).filter(UserHerd.user_id == user_id)
@@ -100,14 +96,14 @@ def get_herd(herd_id):
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao buscar rebanho: {str(e)}'}), 500)
 
-@app.route('/api/v1/herds/<int:herd_id>', methods=['PUT'])
+@bp.route('/api/v1/herds/<int:herd_id>', methods=['PUT'])
 def update_herd(herd_id):
     """Atualizar rebanho"""
     try:
-        user_id = request.headers.get('X-User-Id') or request.args.get('user_id')
+        user_id = g.user_id
         query = Herd.query.filter_by(id=herd_id)
-        if user_id and str(user_id).isdigit():
-            query = query.join(UserHerd).filter(UserHerd.user_id == int(user_id))
+        if user_id is not None:
+            query = query.join(UserHerd).filter(UserHerd.user_id == user_id)
         herd = query.first()
         if not herd:
             return make_response(jsonify({'message': 'Rebanho não encontrado'}), 404)
@@ -123,22 +119,11 @@ def update_herd(herd_id):
         herd.employees_count = data.get('employees_count', herd.employees_count)
         herd.updated_at = datetime.utcnow()
         
+        audit.record(
+            'update', 'herd', f'Rebanho atualizado: {herd.name}', object_id=herd.id,
+            user_id=user_id
+        )
         db.session.commit()
-
-        try:
-            username = request.headers.get('X-User-Name')
-            act = Activity(
-                user_id=effective_user_id,
-                username=username,
-                action='update',
-                object_type='herd',
-                object_id=herd.id,
-                description=f'Rebanho atualizado: {herd.name}'
-            )
-            db.session.add(act)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
         
         return make_response(jsonify({
             'message': 'Rebanho atualizado com sucesso',
@@ -147,36 +132,27 @@ def update_herd(herd_id):
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao atualizar rebanho: {str(e)}'}), 500)
 
-@app.route('/api/v1/herds/<int:herd_id>', methods=['DELETE'])
+@bp.route('/api/v1/herds/<int:herd_id>', methods=['DELETE'])
 def delete_herd(herd_id):
     """Deletar rebanho"""
     try:
-        user_id = request.headers.get('X-User-Id') or request.args.get('user_id')
+        user_id = g.user_id
         query = Herd.query.filter_by(id=herd_id)
-        if user_id and str(user_id).isdigit():
-            query = query.join(UserHerd).filter(UserHerd.user_id == int(user_id))
+        if user_id is not None:
+            query = query.join(UserHerd).filter(UserHerd.user_id == user_id)
         herd = query.first()
         if not herd:
             return make_response(jsonify({'message': 'Rebanho não encontrado'}), 404)
         
+        owner_ids = [owner_id for (owner_id,) in db.session.query(UserHerd.user_id).filter_by(herd_id=herd_id)]
         db.session.delete(herd)
         UserHerd.query.filter_by(herd_id=herd_id).delete()
+        projections.track_herd_deleted(herd_id, owner_ids)
+        audit.record(
+            'delete', 'herd', f'Rebanho removido: {herd.name}', object_id=herd_id,
+            user_id=user_id
+        )
         db.session.commit()
-
-        try:
-            username = request.headers.get('X-User-Name')
-            act = Activity(
-                user_id=int(user_id) if user_id and str(user_id).isdigit() else None,
-                username=username,
-                action='delete',
-                object_type='herd',
-                object_id=herd_id,
-                description=f'Rebanho removido: {herd.name}'
-            )
-            db.session.add(act)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
         
         return make_response(jsonify({'message': 'Rebanho deletado com sucesso'}), 200)
     except Exception as e:
@@ -184,7 +160,7 @@ def delete_herd(herd_id):
 
 # ===== ROTAS PARA GESTÃO DE ANIMAIS =====
 
-@app.route('/api/v1/animals', methods=['GET'])
+@bp.route('/api/v1/animals', methods=['GET'])
 def get_animals():
     """Listar todos os animais com filtros"""
     try:
@@ -193,16 +169,10 @@ def get_animals():
         herd_id = request.args.get('herd_id', type=int)
         status = request.args.get('status')
         breed = request.args.get('breed')
-        user_id_param = request.args.get('user_id')
-        header_user_id = request.headers.get('X-User-Id')
 
         query = Animal.query
 
-        effective_user_id = None
-        if header_user_id and str(header_user_id).isdigit():
-            effective_user_id = int(header_user_id)
-        elif user_id_param and str(user_id_param).isdigit():
-            effective_user_id = int(user_id_param)
+        effective_user_id = g.user_id
 
         if effective_user_id is not None:
             query = query.filter(Animal.user_id == effective_user_id)
@@ -212,6 +182,19 @@ def get_animals():
             query = query.filter_by(status=status)
         if breed:
             query = query.filter(Animal.breed.ilike(f'%{breed}%'))
+
+        # Modo cursor (keyset por created_at, id): custo constante em qualquer profundidade
+        if wants_cursor_pagination(request.args):
+            page_data = paginate_request(
+                query, [Animal.created_at, Animal.id], request.args,
+                count_key=('animals', effective_user_id, herd_id, status, breed)
+            )
+            response = make_response(jsonify({
+                'animals': [animal.json() for animal in page_data.items],
+                'next_cursor': page_data.next_cursor,
+                'total_count': page_data.total
+            }), 200)
+            return with_page_headers(response, page_data)
         
         animals = query.paginate(
             page=page, per_page=per_page, error_out=False
@@ -223,22 +206,18 @@ def get_animals():
             'pages': animals.pages,
             'current_page': page
         }), 200)
+    except PaginationError as e:
+        return make_response(jsonify({'message': str(e)}), 400)
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao buscar animais: {str(e)}'}), 500)
 
-@app.route('/api/v1/animals', methods=['POST'])
+@bp.route('/api/v1/animals', methods=['POST'])
 def create_animal():
     """Criar novo animal"""
     try:
         data = request.get_json()
         
-        header_user_id = request.headers.get('X-User-Id')
-        payload_user_id = data.get('user_id')
-        owner_user_id = None
-        if header_user_id and str(header_user_id).isdigit():
-            owner_user_id = int(header_user_id)
-        elif payload_user_id and str(payload_user_id).isdigit():
-            owner_user_id = int(payload_user_id)
+        owner_user_id = identity.request_user_id(data.get('user_id'))
 
         if owner_user_id is None:
             return make_response(jsonify({'message': 'Usuário não informado para criação do animal'}), 400)
@@ -277,23 +256,10 @@ def create_animal():
         )
         
         db.session.add(new_animal)
+        projections.track_animal_change(None, projections.animal_snapshot(new_animal))
+        audit.record('create', 'animal', f'Animal criado: {new_animal.earring} - {new_animal.name}', obj=new_animal,
+                     user_id=owner_user_id)
         db.session.commit()
-        # Log activity
-        try:
-            user_id = request.headers.get('X-User-Id')
-            username = request.headers.get('X-User-Name')
-            act = Activity(
-                user_id=int(user_id) if user_id and user_id.isdigit() else None,
-                username=username,
-                action='create',
-                object_type='animal',
-                object_id=new_animal.id,
-                description=f'Animal criado: {new_animal.earring} - {new_animal.name}'
-            )
-            db.session.add(act)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
         
         return make_response(jsonify({
             'message': 'Animal criado com sucesso',
@@ -302,17 +268,11 @@ def create_animal():
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao criar animal: {str(e)}'}), 500)
 
-@app.route('/api/v1/animals/<int:animal_id>', methods=['GET'])
+@bp.route('/api/v1/animals/<int:animal_id>', methods=['GET'])
 def get_animal(animal_id):
     """Buscar animal por ID"""
     try:
-        user_id_header = request.headers.get('X-User-Id')
-        user_id_param = request.args.get('user_id')
-        effective_user_id = None
-        if user_id_header and str(user_id_header).isdigit():
-            effective_user_id = int(user_id_header)
-        elif user_id_param and str(user_id_param).isdigit():
-            effective_user_id = int(user_id_param)
+        effective_user_id = g.user_id
 
         query = Animal.query.filter_by(id=animal_id)
         if effective_user_id is not None:
@@ -325,17 +285,11 @@ def get_animal(animal_id):
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao buscar animal: {str(e)}'}), 500)
 
-@app.route('/api/v1/animals/<int:animal_id>', methods=['PUT'])
+@bp.route('/api/v1/animals/<int:animal_id>', methods=['PUT'])
 def update_animal(animal_id):
     """Atualizar animal"""
     try:
-        header_user_id = request.headers.get('X-User-Id')
-        payload_user_id = request.json.get('user_id') if request.is_json else None
-        effective_user_id = None
-        if header_user_id and str(header_user_id).isdigit():
-            effective_user_id = int(header_user_id)
-        elif payload_user_id and str(payload_user_id).isdigit():
-            effective_user_id = int(payload_user_id)
+        effective_user_id = identity.request_user_id(request.json.get('user_id') if request.is_json else None)
 
         query = Animal.query.filter_by(id=animal_id)
         if effective_user_id is not None:
@@ -344,6 +298,7 @@ def update_animal(animal_id):
         animal = query.first()
         if not animal:
             return make_response(jsonify({'message': 'Animal não encontrado'}), 404)
+        counters_before = projections.animal_snapshot(animal)
         
         data = request.get_json()
         animal.name = data.get('name', animal.name)
@@ -373,23 +328,10 @@ def update_animal(animal_id):
         if 'target_weight' in data or 'targetWeight' in data:
             animal.target_weight = float(target_weight_value) if target_weight_value not in [None, '', '0', 0] else None
         
+        projections.track_animal_change(counters_before, projections.animal_snapshot(animal))
+        audit.record('update', 'animal', f'Animal atualizado: {animal.earring or animal.name or animal.id}', object_id=animal.id,
+                     user_id=effective_user_id)
         db.session.commit()
-
-        try:
-            user_id = request.headers.get('X-User-Id')
-            username = request.headers.get('X-User-Name')
-            act = Activity(
-                user_id=int(user_id) if user_id and user_id.isdigit() else None,
-                username=username,
-                action='update',
-                object_type='animal',
-                object_id=animal.id,
-                description=f'Animal atualizado: {animal.earring or animal.name or animal.id}'
-            )
-            db.session.add(act)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
         
         return make_response(jsonify({
             'message': 'Animal atualizado com sucesso',
@@ -398,17 +340,11 @@ def update_animal(animal_id):
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao atualizar animal: {str(e)}'}), 500)
 
-@app.route('/api/v1/animals/<int:animal_id>', methods=['DELETE'])
+@bp.route('/api/v1/animals/<int:animal_id>', methods=['DELETE'])
 def delete_animal(animal_id):
     """Deletar animal"""
     try:
-        user_id_header = request.headers.get('X-User-Id')
-        user_id_param = request.args.get('user_id')
-        effective_user_id = None
-        if user_id_header and str(user_id_header).isdigit():
-            effective_user_id = int(user_id_header)
-        elif user_id_param and str(user_id_param).isdigit():
-            effective_user_id = int(user_id_param)
+        effective_user_id = g.user_id
 
         query = Animal.query.filter_by(id=animal_id)
         if effective_user_id is not None:
@@ -418,51 +354,156 @@ def delete_animal(animal_id):
         if not animal:
             return make_response(jsonify({'message': 'Animal não encontrado'}), 404)
         
-        # Remover dependências antes de excluir o animal
-        try:
-            Weighing.query.filter_by(animal_id=animal_id).delete()
-            Movement.query.filter_by(animal_id=animal_id).delete()
-            Reproduction.query.filter_by(animal_id=animal_id).delete()
-            HealthRecord.query.filter_by(animal_id=animal_id).delete()
-            Attachment.query.filter_by(animal_id=animal_id).delete()
-            db.session.flush()
-        except Exception as cleanup_error:
-            db.session.rollback()
-            return make_response(jsonify({'message': f'Erro ao remover dados do animal: {str(cleanup_error)}'}), 500)
-
+        # Pesagens, movimentações, vacinas, etc. saem pelo ON DELETE CASCADE do banco
+        counters_before = projections.animal_snapshot(animal)
         db.session.delete(animal)
+        projections.track_animal_change(counters_before, None)
+        audit.record('delete', 'animal', f'Animal deletado: id {animal_id}', object_id=animal_id)
         db.session.commit()
-        # Log activity
-        try:
-            act = Activity(
-                user_id=None,
-                username=None,
-                action='delete',
-                object_type='animal',
-                object_id=animal_id,
-                description=f'Animal deletado: id {animal_id}'
-            )
-            db.session.add(act)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
         
         return make_response(jsonify({'message': 'Animal deletado com sucesso'}), 200)
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao deletar animal: {str(e)}'}), 500)
 
+@bp.route('/api/v1/animals/import', methods=['POST'])
+def import_animals():
+    """
+    Importar animais de planilha CSV ou XLSX (multipart, campo `file`).
+    Opcional: `herd_id` no formulário como fazenda padrão das linhas sem
+    fazenda e `dry_run=1` para só validar. Retorna erros por linha.
+    """
+    try:
+        owner_user_id = identity.request_user_id(request.form.get('user_id'))
+        if owner_user_id is None:
+            return make_response(jsonify({'message': 'Usuário não informado para importação'}), 400)
+
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            return make_response(jsonify({'message': 'Envie a planilha no campo file'}), 400)
+
+        default_herd_id = request.form.get('herd_id')
+        dry_run = str(request.values.get('dry_run', '')).lower() in ('1', 'true')
+        try:
+            file_format = imports.import_format(upload.filename)
+            rows = imports.read_rows(upload.stream, file_format)
+            summary = imports.import_animals(
+                rows, owner_user_id,
+                default_herd_id=int(default_herd_id) if default_herd_id and default_herd_id.isdigit() else None,
+                dry_run=dry_run
+            )
+        except imports.ImportFileError as e:
+            return make_response(jsonify({'message': str(e)}), 400)
+
+        summary['dry_run'] = dry_run
+        if not summary['created']:
+            summary['message'] = 'Nenhum animal válido na planilha'
+            return make_response(jsonify(summary), 400)
+        summary['message'] = 'Planilha validada com sucesso' if dry_run else 'Animais importados com sucesso'
+        return make_response(jsonify(summary), 200 if dry_run else 201)
+    except Exception as e:
+        db.session.rollback()
+        return make_response(jsonify({'message': f'Erro ao importar animais: {str(e)}'}), 500)
+
+# Máximo de ids aceitos por requisição em /api/v1/animals/bulk-delete
+MAX_BULK_DELETE_IDS = 5000
+
+def _is_int_id(value):
+    """Aceita inteiros (não booleanos) ou strings só com dígitos"""
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, int) or (isinstance(value, str) and value.isdigit())
+
+@bp.route('/api/v1/animals/bulk-delete', methods=['POST'])
+def delete_animals_bulk():
+    """
+    Excluir animais do usuário em lote, por lista de ids ({"ids": [...]})
+    ou por status ({"status": ["vendido", "morto"], "herd_id": opcional});
+    os dois modos exigem X-User-Id. Dependentes saem pelo ON DELETE
+    CASCADE; tudo em uma transação, com uma única atividade de resumo.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        user_id = identity.request_user_id(data.get('user_id'))
+
+        ids = data.get('ids')
+        statuses = data.get('status')
+        if isinstance(statuses, str):
+            statuses = [statuses]
+
+        if ids is None and not statuses:
+            return make_response(jsonify({'message': 'Informe ids ou status'}), 400)
+        if user_id is None:
+            return make_response(jsonify({'message': 'Exclusão em lote exige X-User-Id'}), 400)
+
+        # Só os animais do próprio usuário, nos dois modos
+        query = db.session.query(Animal.id, Animal.user_id, Animal.herd_id, Animal.status).filter(Animal.user_id == user_id)
+
+        if ids is not None:
+            if not isinstance(ids, list) or not ids:
+                return make_response(jsonify({'message': 'Envie uma lista de ids'}), 400)
+            if len(ids) > MAX_BULK_DELETE_IDS:
+                return make_response(jsonify({'message': f'Máximo de {MAX_BULK_DELETE_IDS} animais por requisição'}), 400)
+            invalid = [animal_id for animal_id in ids if not _is_int_id(animal_id)]
+            if invalid:
+                return make_response(jsonify({'message': 'ids devem ser inteiros', 'invalid': invalid[:20]}), 400)
+            requested = {int(animal_id) for animal_id in ids}
+            rows = query.filter(Animal.id.in_(requested)).all()
+        else:
+            valid_statuses = {status.value for status in AnimalStatus}
+            if not isinstance(statuses, list) or not set(statuses) <= valid_statuses:
+                return make_response(jsonify({'message': f'Status inválido (use {", ".join(sorted(valid_statuses))})'}), 400)
+            requested = None
+            query = query.filter(Animal.status.in_(statuses))
+            if data.get('herd_id') is not None:
+                query = query.filter(Animal.herd_id == data.get('herd_id'))
+            rows = query.all()
+
+        deleted_ids = [row.id for row in rows]
+        if deleted_ids:
+            # Um DELETE por bloco de ids; os dependentes saem pelo ON DELETE CASCADE
+            for start in range(0, len(deleted_ids), MAX_BULK_DELETE_IDS):
+                db.session.execute(
+                    db.delete(Animal).where(Animal.id.in_(deleted_ids[start:start + MAX_BULK_DELETE_IDS])),
+                    execution_options={'synchronize_session': False}
+                )
+            projections.track_animals_deleted([(row.user_id, row.herd_id, row.status) for row in rows])
+            audit.record('delete', 'animal', f'{len(deleted_ids)} animais excluídos em lote', user_id=user_id)
+            db.session.commit()
+
+        response = {
+            'message': 'Animais excluídos com sucesso' if deleted_ids else 'Nenhum animal encontrado para exclusão',
+            'deleted': len(deleted_ids),
+            'ids': deleted_ids
+        }
+        if requested is not None:
+            response['not_found'] = sorted(requested - set(deleted_ids))
+        return make_response(jsonify(response), 200)
+    except Exception as e:
+        db.session.rollback()
+        return make_response(jsonify({'message': f'Erro ao excluir animais em lote: {str(e)}'}), 500)
+
 # ===== ROTAS PARA PESAGENS =====
 
-@app.route('/api/v1/animals/<int:animal_id>/weighings', methods=['GET'])
+@bp.route('/api/v1/animals/<int:animal_id>/weighings', methods=['GET'])
 def get_animal_weighings(animal_id):
     """Listar pesagens de um animal"""
     try:
-        weighings = Weighing.query.filter_by(animal_id=animal_id).order_by(Weighing.date.desc()).all()
+        query = Weighing.query.filter_by(animal_id=animal_id)
+
+        if wants_cursor_pagination(request.args):
+            page = paginate_request(query, [Weighing.date, Weighing.id], request.args, descending=True,
+                                    count_key=('weighings', animal_id))
+            response = make_response(jsonify([weighing.json() for weighing in page.items]), 200)
+            return with_page_headers(response, page)
+
+        weighings = query.order_by(Weighing.date.desc()).all()
         return make_response(jsonify([weighing.json() for weighing in weighings]), 200)
+    except PaginationError as e:
+        return make_response(jsonify({'message': str(e)}), 400)
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao buscar pesagens: {str(e)}'}), 500)
 
-@app.route('/api/v1/animals/<int:animal_id>/weighings', methods=['POST'])
+@bp.route('/api/v1/animals/<int:animal_id>/weighings', methods=['POST'])
 def create_weighing(animal_id):
     """Criar nova pesagem"""
     try:
@@ -479,23 +520,13 @@ def create_weighing(animal_id):
         )
         
         db.session.add(new_weighing)
+        projections.refresh_weight_states([animal_id])
+        audit.record(
+            'weigh', 'weighing',
+            f'Pesagem registrada: {new_weighing.weight} Kg para animal {new_weighing.animal_id}',
+            obj=new_weighing
+        )
         db.session.commit()
-        # Log activity for weighing
-        try:
-            user_id = request.headers.get('X-User-Id')
-            username = request.headers.get('X-User-Name')
-            act = Activity(
-                user_id=int(user_id) if user_id and user_id.isdigit() else None,
-                username=username,
-                action='weigh',
-                object_type='weighing',
-                object_id=new_weighing.id,
-                description=f'Pesagem registrada: {new_weighing.weight} Kg para animal {new_weighing.animal_id}'
-            )
-            db.session.add(act)
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
         
         return make_response(jsonify({
             'message': 'Pesagem registrada com sucesso',
@@ -504,18 +535,152 @@ def create_weighing(animal_id):
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao registrar pesagem: {str(e)}'}), 500)
 
+# Máximo de pesagens aceitas por requisição em /api/v1/weighings/bulk
+MAX_BULK_WEIGHINGS = 5000
+
+def _validate_bulk_weighing(item):
+    """Normaliza uma linha do lote; retorna (dados, None) ou (None, mensagem de erro)"""
+    if not isinstance(item, dict):
+        return None, 'Linha inválida'
+    if not item.get('animal_id') and not item.get('earring'):
+        return None, 'Informe animal_id ou earring'
+    try:
+        weight = float(item.get('weight'))
+    except (TypeError, ValueError):
+        return None, 'Peso inválido'
+    if weight <= 0:
+        return None, 'Peso inválido'
+    try:
+        weighing_date = datetime.strptime(str(item.get('date')), '%Y-%m-%d').date()
+    except ValueError:
+        return None, 'Data inválida (use AAAA-MM-DD)'
+    return {
+        'animal_id': item.get('animal_id'),
+        'earring': item.get('earring'),
+        'weight': weight,
+        'date': weighing_date,
+        'notes': item.get('notes')
+    }, None
+
+@bp.route('/api/v1/weighings/bulk', methods=['POST'])
+def create_weighings_bulk():
+    """
+    Registrar pesagens em lote (sessão de tronco): valida todas as linhas,
+    insere as válidas em uma única transação e retorna o resultado por linha
+    """
+    try:
+        data = request.get_json()
+        items = data.get('weighings') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return make_response(jsonify({'message': 'Envie uma lista de pesagens'}), 400)
+        if len(items) > MAX_BULK_WEIGHINGS:
+            return make_response(jsonify({'message': f'Máximo de {MAX_BULK_WEIGHINGS} pesagens por requisição'}), 400)
+
+        user_id = g.user_id
+
+        results = [None] * len(items)
+        parsed = []
+        for index, item in enumerate(items):
+            row, error = _validate_bulk_weighing(item)
+            if error:
+                results[index] = {'index': index, 'status': 'error', 'message': error}
+            else:
+                parsed.append((index, row))
+
+        # Resolve animal_id e brincos com uma consulta para cada tipo de chave
+        animal_ids = {int(row['animal_id']) for _, row in parsed if row['animal_id'] and str(row['animal_id']).isdigit()}
+        earrings = {str(row['earring']) for _, row in parsed if not row['animal_id'] and row['earring']}
+        known_ids = set()
+        by_earring = {}
+        if animal_ids:
+            query = db.session.query(Animal.id).filter(Animal.id.in_(animal_ids))
+            if user_id is not None:
+                query = query.filter(Animal.user_id == user_id)
+            known_ids = {animal_id for (animal_id,) in query}
+        if earrings:
+            query = db.session.query(Animal.earring, Animal.id).filter(Animal.earring.in_(earrings))
+            if user_id is not None:
+                query = query.filter(Animal.user_id == user_id)
+            by_earring = dict(query.all())
+
+        rows = []
+        positions = []
+        for index, row in parsed:
+            if row['animal_id']:
+                animal_id = int(row['animal_id']) if str(row['animal_id']).isdigit() else None
+                if animal_id not in known_ids:
+                    animal_id = None
+            else:
+                animal_id = by_earring.get(str(row['earring']))
+            if animal_id is None:
+                results[index] = {'index': index, 'status': 'error', 'message': 'Animal não encontrado'}
+                continue
+            rows.append({'animal_id': animal_id, 'weight': row['weight'], 'date': row['date'], 'notes': row['notes']})
+            positions.append(index)
+
+        if not rows:
+            return make_response(jsonify({
+                'message': 'Nenhuma pesagem válida no lote',
+                'created': 0,
+                'failed': len(items),
+                'results': results
+            }), 400)
+
+        # Um único INSERT em lote (executemany) + projeção + atividade, em um commit.
+        # No Postgres os ids voltam na ordem das linhas em poucos statements
+        # (insertmanyvalues); no SQLite de desenvolvimento o SQLAlchemy insere linha a linha.
+        inserted_ids = db.session.execute(
+            db.insert(Weighing).returning(Weighing.id, sort_by_parameter_order=True),
+            rows
+        ).scalars().all()
+        projections.refresh_weight_states([row['animal_id'] for row in rows])
+        audit.record(
+            'weigh', 'weighing',
+            f'{len(rows)} pesagens registradas em lote ({len({row["animal_id"] for row in rows})} animais)',
+            user_id=user_id
+        )
+        db.session.commit()
+
+        for index, row, weighing_id in zip(positions, rows, inserted_ids):
+            results[index] = {
+                'index': index,
+                'status': 'created',
+                'id': weighing_id,
+                'animal_id': row['animal_id']
+            }
+
+        return make_response(jsonify({
+            'message': 'Pesagens registradas com sucesso',
+            'created': len(rows),
+            'failed': len(items) - len(rows),
+            'results': results
+        }), 201)
+    except Exception as e:
+        db.session.rollback()
+        return make_response(jsonify({'message': f'Erro ao registrar pesagens em lote: {str(e)}'}), 500)
+
 # ===== ROTAS PARA MOVIMENTAÇÕES =====
 
-@app.route('/api/v1/animals/<int:animal_id>/movements', methods=['GET'])
+@bp.route('/api/v1/animals/<int:animal_id>/movements', methods=['GET'])
 def get_animal_movements(animal_id):
     """Listar movimentações de um animal"""
     try:
-        movements = Movement.query.filter_by(animal_id=animal_id).order_by(Movement.date.desc()).all()
+        query = Movement.query.filter_by(animal_id=animal_id)
+
+        if wants_cursor_pagination(request.args):
+            page = paginate_request(query, [Movement.date, Movement.id], request.args, descending=True,
+                                    count_key=('movements', animal_id))
+            response = make_response(jsonify([movement.json() for movement in page.items]), 200)
+            return with_page_headers(response, page)
+
+        movements = query.order_by(Movement.date.desc()).all()
         return make_response(jsonify([movement.json() for movement in movements]), 200)
+    except PaginationError as e:
+        return make_response(jsonify({'message': str(e)}), 400)
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao buscar movimentações: {str(e)}'}), 500)
 
-@app.route('/api/v1/animals/<int:animal_id>/movements', methods=['POST'])
+@bp.route('/api/v1/animals/<int:animal_id>/movements', methods=['POST'])
 def create_movement(animal_id):
     """Criar nova movimentação"""
     try:
@@ -546,7 +711,7 @@ def create_movement(animal_id):
 
 # ===== ROTAS PARA REPRODUÇÃO =====
 
-@app.route('/api/v1/animals/<int:animal_id>/reproductions', methods=['GET'])
+@bp.route('/api/v1/animals/<int:animal_id>/reproductions', methods=['GET'])
 def get_animal_reproductions(animal_id):
     """Listar reproduções de um animal"""
     try:
@@ -555,7 +720,7 @@ def get_animal_reproductions(animal_id):
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao buscar reproduções: {str(e)}'}), 500)
 
-@app.route('/api/v1/animals/<int:animal_id>/reproductions', methods=['POST'])
+@bp.route('/api/v1/animals/<int:animal_id>/reproductions', methods=['POST'])
 def create_reproduction(animal_id):
     """Criar nova reprodução"""
     try:
@@ -588,7 +753,7 @@ def create_reproduction(animal_id):
 
 # ===== ROTAS PARA VACINAS =====
 
-@app.route('/api/v1/vaccines', methods=['GET'])
+@bp.route('/api/v1/vaccines', methods=['GET'])
 def get_vaccines():
     """Listar todas as vacinas"""
     try:
@@ -597,7 +762,7 @@ def get_vaccines():
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao buscar vacinas: {str(e)}'}), 500)
 
-@app.route('/api/v1/vaccines', methods=['POST'])
+@bp.route('/api/v1/vaccines', methods=['POST'])
 def create_vaccine():
     """Criar nova vacina"""
     try:
@@ -624,16 +789,26 @@ def create_vaccine():
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao criar vacina: {str(e)}'}), 500)
 
-@app.route('/api/v1/animals/<int:animal_id>/vaccines', methods=['GET'])
+@bp.route('/api/v1/animals/<int:animal_id>/vaccines', methods=['GET'])
 def get_animal_vaccines(animal_id):
     """Listar vacinas aplicadas em um animal"""
     try:
-        applications = VaccineApplication.query.filter_by(animal_id=animal_id).order_by(VaccineApplication.application_date.desc()).all()
+        query = VaccineApplication.query.filter_by(animal_id=animal_id)
+
+        if wants_cursor_pagination(request.args):
+            page = paginate_request(query, [VaccineApplication.application_date, VaccineApplication.id], request.args, descending=True,
+                                    count_key=('vaccine_applications', animal_id))
+            response = make_response(jsonify([application.json() for application in page.items]), 200)
+            return with_page_headers(response, page)
+
+        applications = query.order_by(VaccineApplication.application_date.desc()).all()
         return make_response(jsonify([application.json() for application in applications]), 200)
+    except PaginationError as e:
+        return make_response(jsonify({'message': str(e)}), 400)
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao buscar vacinas do animal: {str(e)}'}), 500)
 
-@app.route('/api/v1/animals/<int:animal_id>/vaccines', methods=['POST'])
+@bp.route('/api/v1/animals/<int:animal_id>/vaccines', methods=['POST'])
 def apply_vaccine(animal_id):
     """Aplicar vacina em um animal"""
     try:
@@ -663,16 +838,26 @@ def apply_vaccine(animal_id):
 
 # ===== ROTAS PARA REGISTROS DE SAÚDE =====
 
-@app.route('/api/v1/animals/<int:animal_id>/health', methods=['GET'])
+@bp.route('/api/v1/animals/<int:animal_id>/health', methods=['GET'])
 def get_animal_health_records(animal_id):
     """Listar registros de saúde de um animal"""
     try:
-        health_records = HealthRecord.query.filter_by(animal_id=animal_id).order_by(HealthRecord.date.desc()).all()
+        query = HealthRecord.query.filter_by(animal_id=animal_id)
+
+        if wants_cursor_pagination(request.args):
+            page = paginate_request(query, [HealthRecord.date, HealthRecord.id], request.args, descending=True,
+                                    count_key=('health_records', animal_id))
+            response = make_response(jsonify([record.json() for record in page.items]), 200)
+            return with_page_headers(response, page)
+
+        health_records = query.order_by(HealthRecord.date.desc()).all()
         return make_response(jsonify([record.json() for record in health_records]), 200)
+    except PaginationError as e:
+        return make_response(jsonify({'message': str(e)}), 400)
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao buscar registros de saúde: {str(e)}'}), 500)
 
-@app.route('/api/v1/animals/<int:animal_id>/health', methods=['POST'])
+@bp.route('/api/v1/animals/<int:animal_id>/health', methods=['POST'])
 def create_health_record(animal_id):
     """Criar novo registro de saúde"""
     try:
@@ -703,7 +888,7 @@ def create_health_record(animal_id):
 
 # ===== ROTAS PARA ANEXOS =====
 
-@app.route('/api/v1/animals/<int:animal_id>/attachments', methods=['GET'])
+@bp.route('/api/v1/animals/<int:animal_id>/attachments', methods=['GET'])
 def get_animal_attachments(animal_id):
     """Listar anexos de um animal"""
     try:
@@ -714,43 +899,32 @@ def get_animal_attachments(animal_id):
 
 # ===== ROTA DE DASHBOARD =====
 
-@app.route('/api/v1/dashboard', methods=['GET'])
+@bp.route('/api/v1/dashboard', methods=['GET'])
 def get_dashboard():
     """Dados para o dashboard"""
     try:
-        header_user_id = request.headers.get('X-User-Id') or request.headers.get('X-User-ID')
-        query_param_user_id = request.args.get('user_id', type=int)
-        effective_user_id = None
-        if header_user_id and str(header_user_id).isdigit():
-            effective_user_id = int(header_user_id)
-        elif query_param_user_id:
-            effective_user_id = query_param_user_id
+        effective_user_id = g.user_id
 
-        animal_query = Animal.query
-        herd_query = Herd.query
         weighing_query = Weighing.query
 
         if effective_user_id is not None:
-            animal_query = animal_query.filter(Animal.user_id == effective_user_id)
-            herd_query = herd_query.join(UserHerd).filter(UserHerd.user_id == effective_user_id)
+            # Contadores mantidos incrementalmente (user_counters / herd_counters)
+            counters = projections.get_user_counters(effective_user_id)
+            total_animals = counters['total_animals']
+            total_herds = counters['total_herds']
+            active_animals = counters['active_animals']
+            herds_with_count = projections.get_herd_distribution(effective_user_id)
             weighing_query = weighing_query.join(Animal).filter(Animal.user_id == effective_user_id)
-
-        total_animals = animal_query.count()
-        total_herds = herd_query.count()
-        active_animals = animal_query.filter_by(status='ativo').count()
+        else:
+            total_animals = Animal.query.count()
+            total_herds = Herd.query.count()
+            active_animals = Animal.query.filter_by(status='ativo').count()
+            herds_with_count = db.session.query(
+                Herd.name,
+                db.func.count(Animal.id).label('animal_count')
+            ).outerjoin(Animal).group_by(Herd.id, Herd.name).all()
 
         recent_weighings = weighing_query.order_by(Weighing.date.desc()).limit(5).all()
-
-        herds_with_count_query = db.session.query(
-            Herd.name,
-            db.func.count(Animal.id).label('animal_count')
-        ).outerjoin(Animal)
-
-        if effective_user_id is not None:
-            herds_with_count_query = herds_with_count_query.join(UserHerd).filter(UserHerd.user_id == effective_user_id)
-            herds_with_count_query = herds_with_count_query.filter(db.or_(Animal.user_id == effective_user_id, Animal.user_id.is_(None)))
-
-        herds_with_count = herds_with_count_query.group_by(Herd.id, Herd.name).all()
         
         return make_response(jsonify({
             'total_animals': total_animals,
@@ -763,31 +937,149 @@ def get_dashboard():
         return make_response(jsonify({'message': f'Erro ao buscar dados do dashboard: {str(e)}'}), 500)
 
 
-@app.route('/api/v1/activities', methods=['GET'])
+def _activity_filter(user_id, username):
+    """Filtro do feed de atividades (listagem e exportação): por user_id, username ou qualquer um dos dois"""
+    if user_id and username:
+        return or_(Activity.user_id == user_id, Activity.username == username)
+    if user_id:
+        return Activity.user_id == user_id
+    if username:
+        return Activity.username == username
+    return None
+
+
+@bp.route('/api/v1/activities', methods=['GET'])
 def get_activities():
-    """Retornar atividades recentes (audit log) permitindo filtro por usuário"""
+    """
+    Retornar atividades recentes (audit log) permitindo filtro por usuário.
+    Paginação por cursor: `limit` (padrão 50) e `before` com o valor de
+    X-Next-Cursor da página anterior. A primeira página filtrada só por
+    user_id vem do feed em memória (X-Cache: HIT), conferido apenas pela
+    geração do feed do usuário, sem consultar as atividades.
+    """
     try:
         from app.models import Activity
 
         user_id = request.args.get('user_id', type=int)
         username = request.args.get('username', type=str)
-        query = Activity.query
+        before = request.args.get('before')
+        try:
+            limit = parse_limit(request.args.get('limit'), default=50)
+        except PaginationError as e:
+            return make_response(jsonify({'message': str(e)}), 400)
+
+        # Feed da página inicial: servido pelo buffer por usuário enquanto a geração do feed não mudar
+        from_buffer = user_id and not username and not before and limit <= feed_buffer.size
+        if from_buffer:
+            generation = cache_generations.current(generation_name(user_id))
+            buffered = feed_buffer.get(user_id, limit, generation)
+            if buffered is not None:
+                response = make_response(jsonify(buffered), 200)
+                if len(buffered) == limit:
+                    response.headers['X-Next-Cursor'] = encode_cursor([buffered[-1]['created_at'], buffered[-1]['id']])
+                response.headers['X-Cache'] = 'HIT'
+                return response
 
-        if user_id and username:
-            query = query.filter(or_(Activity.user_id == user_id, Activity.username == username))
-        elif user_id:
-            query = query.filter(Activity.user_id == user_id)
-        elif username:
-            query = query.filter(Activity.username == username)
+        query = Activity.query
+        condition = _activity_filter(user_id, username)
+        if condition is not None:
+            query = query.filter(condition)
 
-        activities = query.order_by(Activity.created_at.desc()).limit(50).all()
-        return make_response(jsonify([a.json() for a in activities]), 200)
+        order_by = [Activity.created_at, Activity.id]
+        try:
+            if from_buffer:
+                # Carrega o buffer inteiro do usuário e responde com o início dele
+                activities, next_cursor = keyset_page(query, order_by, limit=feed_buffer.size, descending=True)
+                feed = [a.json() for a in activities]
+                feed_buffer.load(user_id, feed, generation)
+                if len(activities) > limit:
+                    next_cursor = encode_cursor([activities[limit - 1].created_at, activities[limit - 1].id])
+                activities = activities[:limit]
+            else:
+                activities, next_cursor = keyset_page(query, order_by, before, limit, descending=True)
+        except PaginationError as e:
+            return make_response(jsonify({'message': str(e)}), 400)
+
+        response = make_response(jsonify([a.json() for a in activities]), 200)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        if from_buffer:
+            response.headers['X-Cache'] = 'MISS'
+        return response
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao buscar atividades: {str(e)}'}), 500)
 
+# ===== ROTAS DE EXPORTAÇÃO (STREAMING) =====
+
+@bp.route('/api/v1/export/animals', methods=['GET'])
+def export_animals():
+    """Exportar animais em NDJSON ou CSV (?format=csv), sem carregar tudo em memória"""
+    try:
+        user_id = g.user_id
+        herd_id = request.args.get('herd_id', type=int)
+        status = request.args.get('status')
+
+        table = Animal.__table__
+        statement = db.select(*table.c).order_by(table.c.id)
+        if user_id is not None:
+            statement = statement.where(table.c.user_id == user_id)
+        if herd_id:
+            statement = statement.where(table.c.herd_id == herd_id)
+        if status:
+            statement = statement.where(table.c.status == status)
+
+        return exports.stream_export(statement, 'animais', request.args.get('format', 'ndjson'))
+    except ValueError as e:
+        return make_response(jsonify({'message': str(e)}), 400)
+    except Exception as e:
+        return make_response(jsonify({'message': f'Erro ao exportar animais: {str(e)}'}), 500)
+
+@bp.route('/api/v1/export/weighings', methods=['GET'])
+def export_weighings():
+    """Exportar pesagens em NDJSON ou CSV, filtrando por usuário, rebanho ou animal"""
+    try:
+        user_id = g.user_id
+        herd_id = request.args.get('herd_id', type=int)
+        animal_id = request.args.get('animal_id', type=int)
+
+        table = Weighing.__table__
+        animals = Animal.__table__
+        statement = db.select(*table.c).order_by(table.c.animal_id, table.c.date, table.c.id)
+        if user_id is not None or herd_id:
+            statement = statement.join(animals, animals.c.id == table.c.animal_id)
+            if user_id is not None:
+                statement = statement.where(animals.c.user_id == user_id)
+            if herd_id:
+                statement = statement.where(animals.c.herd_id == herd_id)
+        if animal_id:
+            statement = statement.where(table.c.animal_id == animal_id)
+
+        return exports.stream_export(statement, 'pesagens', request.args.get('format', 'ndjson'))
+    except ValueError as e:
+        return make_response(jsonify({'message': str(e)}), 400)
+    except Exception as e:
+        return make_response(jsonify({'message': f'Erro ao exportar pesagens: {str(e)}'}), 500)
+
+@bp.route('/api/v1/export/activities', methods=['GET'])
+def export_activities():
+    """Exportar o histórico de atividades em NDJSON ou CSV, com os mesmos filtros de /api/v1/activities"""
+    try:
+        condition = _activity_filter(request.args.get('user_id', type=int), request.args.get('username', type=str))
+
+        table = Activity.__table__
+        statement = db.select(*table.c).order_by(table.c.created_at, table.c.id)
+        if condition is not None:
+            statement = statement.where(condition)
+
+        return exports.stream_export(statement, 'atividades', request.args.get('format', 'ndjson'))
+    except ValueError as e:
+        return make_response(jsonify({'message': str(e)}), 400)
+    except Exception as e:
+        return make_response(jsonify({'message': f'Erro ao exportar atividades: {str(e)}'}), 500)
+
 # ===== ROTA PARA UPLOAD DE DOCUMENTOS DE FAZENDA =====
 
-@app.route('/api/v1/herds/<int:herd_id>/documents', methods=['POST'])
+@bp.route('/api/v1/herds/<int:herd_id>/documents', methods=['POST'])
 def upload_herd_documents(herd_id):
     """Upload de documentos para uma fazenda"""
     try:
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from app import db
+from app import identity
+from app import cache_generations
+from app.activity_feed import feed_buffer, generation_name
+from app.models import Activity
+
+_PENDING_KEY = 'pending_activities'
+_WRITTEN_KEY = 'written_activities'
+
+
+def _request_user():
+    """(user_id, username) da requisição: usuário resolvido em identity (g.user_id) e cabeçalho X-User-Name"""
+    if not has_request_context():
+        return None, None
+    return identity.request_user_id(), request.headers.get('X-User-Name')
+
+
+def record(action, object_type, description, object_id=None, obj=None, user_id=None, username=None):
+    """
+    Registra uma atividade na transação corrente; ela é gravada no mesmo
+    commit da alteração (e descartada se houver rollback). Para entidades
+    novas, passe `obj`: o id é lido depois do flush, no momento do commit.
+    Sem `user_id`/`username`, usa o usuário da requisição (g.user_id) e o
+    cabeçalho X-User-Name; quem resolve o usuário pelo corpo deve informá-lo.
+    """
+    header_user_id, header_username = _request_user()
+    pending = db.session.info.setdefault(_PENDING_KEY, [])
+    pending.append({
+        'action': action,
+        'object_type': object_type,
+        'object_id': object_id,
+        'obj': obj,
+        'description': description,
+        'user_id': user_id if user_id is not None else header_user_id,
+        'username': username if username is not None else header_username
+    })
+
+
+def _write_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    # Garante os ids das entidades novas antes de montar as linhas
+    session.flush()
+    now = datetime.utcnow()
+    rows = []
+    for item in pending:
+        obj = item.pop('obj')
+        if item['object_id'] is None and obj is not None:
+            item['object_id'] = obj.id
+        item['created_at'] = now
+        rows.append(item)
+    # Um único INSERT (executemany) para todas as atividades da transação
+    result = session.execute(
+        db.insert(Activity).returning(Activity.id, sort_by_parameter_order=True),
+        rows
+    )
+    for row, activity_id in zip(rows, result.scalars()):
+        row['id'] = activity_id
+    # Nova geração do feed de cada usuário: os outros processos recarregam o buffer dele
+    generations = {
+        user_id: cache_generations.bump(generation_name(user_id))
+        for user_id in sorted({row['user_id'] for row in rows if row['user_id'] is not None})
+    }
+    # Vão para o feed em memória só depois que o commit confirmar
+    session.info[_WRITTEN_KEY] = ([Activity(**row).json() for row in rows], generations)
+
+
+def _publish_written(session):
+    written = session.info.pop(_WRITTEN_KEY, None)
+    if written:
+        feed_buffer.push(*written)
+
+
+def _discard_pending(session, *args):
+    # Também dispara no ROLLBACK de um SAVEPOINT (begin_nested) ou de um flush que
+    # falhou dentro dele; a transação externa segue viva e o que ela registrou continua
+    if session.in_transaction():
+        return
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_WRITTEN_KEY, None)
+
+
+event.listen(db.session, 'before_commit', _write_pending)
+event.listen(db.session, 'after_commit', _publish_written)
+event.listen(db.session, 'after_soft_rollback', _discard_pending)
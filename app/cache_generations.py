@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import CacheGeneration
+
+_table = CacheGeneration.__table__
+
+
+def current(name):
+    """
+    Geração atual do cache `name` (0 se nunca foi invalidado). Lida em
+    conexão própria, fora da transação da sessão, para enxergar o valor
+    já confirmado por qualquer processo.
+    """
+    with db.engine.connect() as conn:
+        generation = conn.execute(
+            db.select(_table.c.generation).where(_table.c.name == name)
+        ).scalar()
+    return generation or 0
+
+
+def bump(name):
+    """
+    Incrementa a geração de `name` na transação corrente da sessão (vale
+    para os outros processos no commit); retorna o novo valor
+    """
+    now = datetime.utcnow()
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        upsert = insert(_table).values(name=name, generation=1, updated_at=now).on_conflict_do_update(
+            index_elements=[_table.c.name],
+            set_={'generation': _table.c.generation + 1, 'updated_at': now}
+        ).returning(_table.c.generation)
+        return db.session.execute(upsert).scalar()
+
+    update = _table.update().where(_table.c.name == name).values(
+        generation=_table.c.generation + 1, updated_at=now
+    )
+    if not db.session.execute(update).rowcount:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(_table.insert().values(name=name, generation=1, updated_at=now))
+            return 1
+        except IntegrityError:
+            db.session.execute(update)
+    return db.session.execute(db.select(_table.c.generation).where(_table.c.name == name)).scalar()
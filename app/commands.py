@@ -0,0 +1,131 @@
+import click
+from flask import Blueprint, current_app
+
+# Comandos registrados direto no `flask` (sem grupo), via create_app
+bp = Blueprint('commands', __name__, cli_group=None)
+
+
+@bp.cli.command('rebuild-weight-state')
+def rebuild_weight_state():
+    """Reconstrói animal_weight_states a partir do histórico de pesagens."""
+    from app.projections import rebuild_weight_states
+
+    total = rebuild_weight_states()
+    click.echo(f"✅ Estado de peso reconstruído para {total} animais.")
+
+
+@bp.cli.command('reconcile-counters')
+@click.option('--dry-run', is_flag=True, help='Apenas lista as divergências, sem corrigir.')
+def reconcile_counters(dry_run):
+    """Confere user_counters/herd_counters/herd_user_counters contra as tabelas de origem."""
+    from app.projections import reconcile_counters as reconcile
+
+    mismatches = reconcile(fix=not dry_run)
+    for mismatch in mismatches:
+        click.echo(f"⚠️  {mismatch['table']}[{mismatch['key']}]: armazenado={mismatch['stored']} esperado={mismatch['expected']}")
+
+    if not mismatches:
+        click.echo("✅ Contadores consistentes com as tabelas de origem.")
+    elif dry_run:
+        raise SystemExit(1)
+    else:
+        click.echo(f"✅ {len(mismatches)} divergência(s) corrigida(s).")
+
+
+@bp.cli.command('outbox-worker')
+@click.option('--workers', type=int, default=None, help='Quantidade de threads (padrão: OUTBOX_WORKERS).')
+@click.option('--once', is_flag=True, help='Processa as mensagens vencidas e sai.')
+def outbox_worker(workers, once):
+    """Drena a fila de e-mails/SMS (outbound_messages)."""
+    from app import outbox
+
+    if once:
+        total = 0
+        while True:
+            processed = outbox.process_batch()
+            total += processed
+            if not processed:
+                break
+        from app.email_service import email_service
+
+        stats = outbox.queue_stats()
+        click.echo(f"✅ {total} mensagem(ns) processada(s). Fila: {stats}")
+        click.echo(f"📧 Envio de e-mails: {email_service.stats()}")
+        return
+
+    click.echo("📮 Worker da fila de mensagens iniciado (Ctrl+C para sair).")
+    outbox.run_forever(workers)
+
+
+@bp.cli.command('activities-maintain')
+@click.option('--convert', is_flag=True, help='Postgres: converte a tabela activities existente em particionada.')
+@click.option('--retention-months', type=int, default=None, help='Meses mantidos na tabela ativa (padrão: ACTIVITY_RETENTION_MONTHS).')
+@click.option('--action', type=click.Choice(['archive', 'drop']), default=None, help='O que fazer com os meses antigos (padrão: ACTIVITY_RETENTION_ACTION).')
+def activities_maintain(convert, retention_months, action):
+    """Cria partições futuras e aplica a retenção da tabela activities."""
+    from app import partitions
+
+    if convert:
+        if not partitions._is_postgres():
+            raise click.ClickException('Particionamento disponível apenas no Postgres.')
+        if partitions.is_partitioned():
+            click.echo("ℹ️  Tabela activities já é particionada.")
+        else:
+            partitions.convert_to_partitioned()
+            click.echo("✅ Tabela activities convertida para particionamento mensal.")
+
+    summary = partitions.maintain(retention_months, action)
+    if partitions._is_postgres() and not summary['partitioned']:
+        click.echo("⚠️  Tabela activities não particionada; use --convert.")
+    if summary['created']:
+        click.echo(f"✅ Partições garantidas: {', '.join(summary['created'])}")
+    if summary['retired']:
+        verb = 'Removidos' if (action or current_app.config['ACTIVITY_RETENTION_ACTION']) == 'drop' else 'Arquivados'
+        click.echo(f"✅ {verb}: {', '.join(summary['retired'])}")
+    else:
+        click.echo("✅ Nada a arquivar pela política de retenção.")
+
+
+@bp.cli.command('activities-partitions')
+def activities_partitions():
+    """Lista partições/arquivos da tabela activities com linhas e tamanho."""
+    from app import partitions
+
+    stats = partitions.partition_stats()
+    if not stats:
+        click.echo("Nenhuma partição encontrada.")
+        return
+    for item in stats:
+        size = f"{item['bytes'] / 1024 / 1024:.1f} MB" if item['bytes'] is not None else '-'
+        status = 'ativa' if item['attached'] else 'arquivo'
+        click.echo(f"{item['name']:<32} {item['bounds'] or '':<60} {item['rows']:>12} linhas {size:>10}  {status}")
+
+
+@bp.cli.command('db-migrate')
+@click.option('--status', 'show_status', is_flag=True, help='Apenas lista as migrações e quando foram aplicadas.')
+def db_migrate(show_status):
+    """Cria tabelas, aplica migrações pendentes e cria índices declarados (CONCURRENTLY no Postgres)."""
+    from app import migrations
+
+    if show_status:
+        for version, description, applied_at in migrations.status():
+            mark = f"aplicada em {applied_at:%Y-%m-%d %H:%M}" if applied_at else 'pendente'
+            click.echo(f"{version:<45} {mark:<28} {description}")
+        return
+
+    applied = migrations.setup_schema(log=click.echo)
+    click.echo(f"✅ {len(applied)} migração(ões) aplicada(s)." if applied else "✅ Banco já está atualizado.")
+
+
+@bp.cli.command('explain-hot-queries')
+@click.option('--user-id', type=int, default=1, help='Usuário usado nas consultas.')
+@click.option('--animal-id', type=int, default=1, help='Animal usado nas consultas.')
+@click.option('--herd-id', type=int, default=1, help='Fazenda usada nas consultas.')
+def explain_hot_queries(user_id, animal_id, herd_id):
+    """Mostra o plano de execução das consultas dos endpoints mais acessados."""
+    from app.schema import explain_hot_queries as explain
+
+    for label, plan in explain(user_id, animal_id, herd_id):
+        click.echo(f"\n== {label}")
+        for line in plan:
+            click.echo(f"   {line}")
@@ -1,41 +1,132 @@
 import smtplib
+import threading
+import time
 import requests
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from flask import current_app
 import os
 
+class SMTPConnectionPool:
+    """
+    Pequeno pool de conexões SMTP já autenticadas (STARTTLS + login feitos
+    uma vez). Antes de reutilizar, conexões ociosas há muito tempo são
+    descartadas e as demais passam por um NOOP para confirmar que estão vivas.
+    """
+
+    def __init__(self, factory, max_size=2, max_idle=60):
+        self._factory = factory
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self._idle = []  # [(conexão, último uso)]
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.reused = 0
+        self.discarded = 0
+
+    def _close(self, connection):
+        self.discarded += 1
+        try:
+            connection.quit()
+        except Exception:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def _is_alive(self, connection):
+        try:
+            return connection.noop()[0] == 250
+        except Exception:
+            return False
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+            if time.monotonic() - last_used > self.max_idle or not self._is_alive(connection):
+                self._close(connection)
+                continue
+            self.reused += 1
+            return connection
+
+        connection = self._factory()
+        self.opened += 1
+        return connection
+
+    def release(self, connection, broken=False):
+        if broken:
+            self._close(connection)
+            return
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((connection, time.monotonic()))
+                return
+        self._close(connection)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._idle)
+        return {
+            'max_size': self.max_size,
+            'idle': idle,
+            'opened': self.opened,
+            'reused': self.reused,
+            'discarded': self.discarded
+        }
+
 class EmailService:
     def __init__(self):
         # Configurações de email (para desenvolvimento local)
         self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
         self.smtp_port = int(os.getenv('SMTP_PORT', '587'))
+        self.smtp_use_tls = os.getenv('SMTP_USE_TLS', '1').lower() not in ('0', 'false', 'no')
         self.email_user = os.getenv('EMAIL_USER', '')
         self.email_password = os.getenv('EMAIL_PASSWORD', '')
-        
-    def send_password_reset_email(self, to_email, code, username):
-        """Envia email com código de recuperação de senha"""
+        # Servidor sem autenticação (ex.: SMTP de teste local): envia sem senha e sem login
+        self.smtp_no_auth = os.getenv('SMTP_NO_AUTH', '0').lower() in ('1', 'true', 'yes')
+        self.pool = SMTPConnectionPool(
+            self._connect,
+            max_size=int(os.getenv('SMTP_POOL_SIZE', '2')),
+            max_idle=float(os.getenv('SMTP_POOL_MAX_IDLE', '60'))
+        )
+        self._metrics_lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_batch = None
+
+    def _connect(self):
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
         try:
-            # Verificar se temos configurações de e-mail
-            if not self.email_user or not self.email_password:
-                print(f"📧 EMAIL SIMULADO - Para: {to_email}")
-                print(f"📧 Código: {code}")
-                print(f"📧 Usuário: {username}")
-                print(f"📧 Assunto: Recuperação de senha - BoviCare")
-                print(f"📧 Mensagem: Olá {username}, seu código de recuperação é: {code}")
-                print("=" * 50)
-                print("⚠️  Configure as variáveis de ambiente para envio real:")
-                print("   EMAIL_USER=seu-email@gmail.com")
-                print("   EMAIL_PASSWORD=sua-senha-de-app")
-                return True
-            
-            # Envio real de e-mail
-            msg = MIMEMultipart()
-            msg['From'] = self.email_user
-            msg['To'] = to_email
-            msg['Subject'] = "Recuperação de senha - BoviCare"
-            
-            body = f"""
+            if self.smtp_use_tls:
+                server.starttls()
+            if not self.smtp_no_auth:
+                server.login(self.email_user, self.email_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def is_simulated(self):
+        """Sem remetente e senha (ou SMTP_NO_AUTH) os e-mails são apenas exibidos no log"""
+        return not self.email_user or not (self.email_password or self.smtp_no_auth)
+
+    def build_password_reset_email(self, to_email, code, username):
+        msg = MIMEMultipart()
+        msg['From'] = self.email_user
+        msg['To'] = to_email
+        msg['Subject'] = "Recuperação de senha - BoviCare"
+        
+        body = f"""
             Olá {username},
             
             Você solicitou a recuperação de senha para sua conta no BoviCare.
@@ -49,20 +140,123 @@ class EmailService:
             Atenciosamente,
             Equipe BoviCare
             """
-            
-            msg.attach(MIMEText(body, 'plain'))
-            
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email_user, self.email_password)
-            text = msg.as_string()
-            server.sendmail(self.email_user, to_email, text)
-            server.quit()
-            
-            print(f"📧 EMAIL ENVIADO - Para: {to_email}")
+        
+        msg.attach(MIMEText(body, 'plain'))
+        return msg
+
+    def deliver_password_reset_email(self, to_email, code, username):
+        """
+        Envia o e-mail de recuperação; levanta exceção em caso de falha
+        (usado pela fila de envio, que decide sobre novas tentativas)
+        """
+        if self.is_simulated():
+            print(f"📧 EMAIL SIMULADO - Para: {to_email}")
             print(f"📧 Código: {code}")
+            print(f"📧 Usuário: {username}")
+            print(f"📧 Assunto: Recuperação de senha - BoviCare")
+            print(f"📧 Mensagem: Olá {username}, seu código de recuperação é: {code}")
+            print("=" * 50)
+            print("⚠️  Configure as variáveis de ambiente para envio real:")
+            print("   EMAIL_USER=seu-email@gmail.com")
+            print("   EMAIL_PASSWORD=sua-senha-de-app")
+            return
+
+        msg = self.build_password_reset_email(to_email, code, username)
+        result = self.send_many([msg])[0]
+        if not result['ok']:
+            raise result['exception']
+
+        print(f"📧 EMAIL ENVIADO - Para: {to_email}")
+
+    def _send_one(self, connection, msg):
+        recipients = [address.strip() for address in msg['To'].split(',')]
+        connection.sendmail(msg['From'] or self.email_user, recipients, msg.as_string())
+
+    def send_many(self, messages):
+        """
+        Envia vários e-mails (objetos MIME com From/To preenchidos) pela mesma
+        conexão do pool. Se o servidor derrubar a conexão no meio do lote,
+        reconecta e tenta a mensagem de novo uma vez. Retorna um resultado
+        por mensagem: {'to', 'ok', 'error', 'exception'}.
+        """
+        started = time.monotonic()
+        results = []
+
+        if self.is_simulated():
+            for msg in messages:
+                print(f"📧 EMAIL SIMULADO - Para: {msg['To']}")
+                print(f"📧 Assunto: {msg['Subject']}")
+                for part in msg.walk():
+                    if part.get_content_type() == 'text/plain':
+                        print(f"📧 Mensagem: {part.get_payload(decode=True).decode('utf-8', 'replace').strip()}")
+                print("=" * 50)
+                results.append({'to': msg['To'], 'ok': True, 'error': None, 'exception': None})
+            return results
+
+        pending = list(messages)
+        retried = False
+        while pending:
+            try:
+                connection = self.pool.acquire()
+            except (smtplib.SMTPException, OSError) as e:
+                # Sem conexão com o servidor: o restante do lote falha de uma vez
+                results.extend({'to': msg['To'], 'ok': False, 'error': str(e), 'exception': e} for msg in pending)
+                break
+
+            try:
+                while pending:
+                    msg = pending[0]
+                    try:
+                        self._send_one(connection, msg)
+                        results.append({'to': msg['To'], 'ok': True, 'error': None, 'exception': None})
+                    except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                            smtplib.SMTPDataError, smtplib.SMTPNotSupportedError) as e:
+                        # Recusa desta mensagem; a conexão segue válida para as próximas
+                        results.append({'to': msg['To'], 'ok': False, 'error': str(e), 'exception': e})
+                    pending.pop(0)
+                    retried = False
+            except (smtplib.SMTPException, OSError) as e:
+                # Conexão caiu no meio do lote: descarta, reconecta e tenta esta mensagem mais uma vez
+                self.pool.release(connection, broken=True)
+                if retried:
+                    msg = pending.pop(0)
+                    results.append({'to': msg['To'], 'ok': False, 'error': str(e), 'exception': e})
+                retried = not retried
+                continue
+            self.pool.release(connection)
+
+        self._record_batch(results, time.monotonic() - started)
+        return results
+
+    def _record_batch(self, results, elapsed):
+        ok = sum(1 for result in results if result['ok'])
+        with self._metrics_lock:
+            self.sent += ok
+            self.failed += len(results) - ok
+            self.batches += 1
+            self.last_batch = {
+                'messages': len(results),
+                'failed': len(results) - ok,
+                'seconds': round(elapsed, 3),
+                'messages_per_second': round(len(results) / elapsed, 1) if elapsed > 0 else None
+            }
+
+    def stats(self):
+        """Métricas de envio (totais e vazão do último lote) e do pool de conexões"""
+        with self._metrics_lock:
+            return {
+                'sent': self.sent,
+                'failed': self.failed,
+                'batches': self.batches,
+                'last_batch': self.last_batch,
+                'pool': self.pool.stats()
+            }
+
+    def send_password_reset_email(self, to_email, code, username):
+        """Envia email com código de recuperação de senha"""
+        try:
+            self.deliver_password_reset_email(to_email, code, username)
             return True
-            
         except Exception as e:
             print(f"Erro ao enviar email: {str(e)}")
             return False
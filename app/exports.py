@@ -0,0 +1,72 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from flask import Response, stream_with_context
+
+from app import db
+
+# Linhas buscadas por ida ao banco; com yield_per o driver usa cursor no servidor
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _rows(statement, batch_size=EXPORT_BATCH_SIZE):
+    """Itera as linhas em lotes, sem materializar o resultado inteiro em memória"""
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    try:
+        for partition in result.partitions():
+            for row in partition:
+                yield row
+    finally:
+        result.close()
+
+
+def _ndjson(columns, rows):
+    for row in rows:
+        record = {name: _serialize(value) for name, value in zip(columns, row)}
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def _csv(columns, rows, batch_size=EXPORT_BATCH_SIZE):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow([_serialize(value) for value in row])
+        pending += 1
+        if pending >= batch_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def stream_export(statement, filename, export_format='ndjson'):
+    """
+    Resposta em streaming com as linhas de `statement` (um select de colunas),
+    em NDJSON (um objeto por linha) ou CSV com cabeçalho.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'Formato de exportação inválido: {export_format}')
+
+    columns = [column.key for column in statement.selected_columns]
+    rows = _rows(statement)
+    body = _csv(columns, rows) if export_format == 'csv' else _ndjson(columns, rows)
+
+    response = Response(stream_with_context(body), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{export_format}'
+    return response
@@ -0,0 +1,154 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from app import db
+from app.models import User
+from config import Config
+
+_CHANGED_KEY = 'changed_user_ids'
+
+
+class CachedUser(namedtuple('CachedUser', [column.name for column in User.__table__.columns if column.name != 'password'])):
+    """
+    Cópia somente leitura de um usuário (sem o hash da senha), segura para
+    compartilhar entre threads. Para alterar o usuário, carregue o modelo.
+    """
+    __slots__ = ()
+
+    # Mesmos campos e formato de User.json()
+    json = User.json
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(*(getattr(user, name) for name in cls._fields))
+
+
+class UserCache:
+    """
+    Usuários lidos recentemente, por id, limitados a `max_size` (LRU) e
+    válidos por `ttl` segundos. Alterações feitas neste processo invalidam
+    a entrada no commit; as de outros processos aparecem quando o TTL vence.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._users = OrderedDict()  # user_id -> (carregado_em, CachedUser)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id, cached_user):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._users[user_id] = (time.monotonic(), cached_user)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._users.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._users),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations
+            }
+
+
+user_cache = UserCache(max_size=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL)
+
+
+def _parse_user_id(value):
+    return int(value) if value and str(value).isdigit() else None
+
+
+def resolve_identity():
+    """
+    before_request: usuário da requisição em `g.user_id`, pelo cabeçalho
+    X-User-Id (o nome do cabeçalho não diferencia maiúsculas) ou, na falta
+    dele, pelo parâmetro `user_id` da query string. O usuário em si só é
+    carregado por current_user(), quando a rota precisa dele.
+    """
+    g.user_id = _parse_user_id(request.headers.get('X-User-Id')) or _parse_user_id(request.args.get('user_id'))
+
+
+def request_user_id(fallback=None):
+    """`g.user_id` ou, na falta dele, o id informado no corpo/formulário (`fallback`), se numérico"""
+    if g.get('user_id') is not None:
+        return g.user_id
+    return _parse_user_id(fallback)
+
+
+def load_user(user_id):
+    """CachedUser do cache ou do banco; None se o usuário não existe"""
+    cached = user_cache.get(user_id)
+    if cached is not None:
+        return cached
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    cached = CachedUser.from_user(user)
+    user_cache.set(user_id, cached)
+    return cached
+
+
+def current_user():
+    """Usuário de `g.user_id` (CachedUser), carregado uma vez por requisição; None se ausente ou inexistente"""
+    if 'user' not in g:
+        g.user = load_user(g.user_id) if g.get('user_id') is not None else None
+    return g.user
+
+
+# ===== INVALIDAÇÃO =====
+# Qualquer UPDATE/DELETE de usuário pelo ORM invalida a entrada quando o commit confirmar
+
+def _track_changed_user(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_CHANGED_KEY, set()).add(target.id)
+
+
+def _invalidate_changed(session):
+    for user_id in session.info.pop(_CHANGED_KEY, ()):
+        user_cache.invalidate(user_id)
+
+
+def _discard_changed(session, *args):
+    # Savepoint desfeito: a transação externa continua e suas invalidações também
+    if session.in_transaction():
+        return
+    session.info.pop(_CHANGED_KEY, None)
+
+
+event.listen(User, 'after_update', _track_changed_user)
+event.listen(User, 'after_delete', _track_changed_user)
+event.listen(db.session, 'after_commit', _invalidate_changed)
+event.listen(db.session, 'after_soft_rollback', _discard_changed)
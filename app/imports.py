@@ -0,0 +1,247 @@
+import codecs
+import csv
+import itertools
+from datetime import date, datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db, projections, audit
+from app.models import Animal, AnimalStatus, Herd, UserHerd
+
+# Linhas inseridas por INSERT em lote (executemany)
+IMPORT_BATCH_SIZE = 2000
+# Limite de linhas por arquivo importado
+MAX_IMPORT_ROWS = 50000
+# Erros por linha devolvidos na resposta (o total vem em `failed`)
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_FORMATS = ('csv', 'xlsx')
+
+# Cabeçalhos aceitos para cada campo (comparados sem caixa e sem espaços nas pontas)
+COLUMN_ALIASES = {
+    'earring': ('earring', 'brinco'),
+    'name': ('name', 'nome'),
+    'breed': ('breed', 'raca', 'raça'),
+    'birth_date': ('birth_date', 'birthdate', 'data_nascimento', 'nascimento'),
+    'origin': ('origin', 'origem'),
+    'gender': ('gender', 'sexo'),
+    'status': ('status', 'situacao', 'situação'),
+    'entry_weight': ('entry_weight', 'entryweight', 'peso_entrada'),
+    'target_weight': ('target_weight', 'targetweight', 'peso_meta', 'peso_alvo'),
+    'herd_id': ('herd_id', 'herdid', 'fazenda_id'),
+    'herd': ('herd', 'fazenda', 'rebanho'),
+}
+_HEADER_TO_FIELD = {alias: field for field, aliases in COLUMN_ALIASES.items() for alias in aliases}
+
+
+class ImportFileError(ValueError):
+    """Arquivo de importação ilegível ou sem as colunas obrigatórias"""
+    pass
+
+
+def import_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in IMPORT_FORMATS:
+        raise ImportFileError('Formato não suportado (use .csv ou .xlsx)')
+    return extension
+
+
+def _csv_rows(stream):
+    """Linhas do CSV lidas do upload sob demanda; aceita ',' ou ';' (Excel pt-BR)"""
+    text = codecs.getreader('utf-8-sig')(stream, errors='replace')
+    first_line = text.readline()
+    delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+    return csv.reader(itertools.chain([first_line], text), delimiter=delimiter)
+
+
+def _xlsx_rows(stream):
+    """Linhas da primeira planilha em modo somente leitura (não carrega o arquivo inteiro)"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise ImportFileError('Importação de XLSX requer o pacote openpyxl') from e
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFileError(f'Arquivo XLSX inválido: {str(e)}') from e
+    return workbook.active.iter_rows(values_only=True)
+
+
+def read_rows(stream, file_format):
+    """Itera (número_da_linha, {campo: valor}) a partir do cabeçalho do arquivo"""
+    rows = _xlsx_rows(stream) if file_format == 'xlsx' else _csv_rows(stream)
+    header = next(rows, None)
+    if not header:
+        raise ImportFileError('Arquivo vazio')
+    fields = [_HEADER_TO_FIELD.get(str(cell or '').strip().lower()) for cell in header]
+    if 'earring' not in fields:
+        raise ImportFileError('Coluna obrigatória ausente: earring (ou brinco)')
+
+    for line, row in enumerate(rows, start=2):
+        values = {field: value for field, value in zip(fields, row) if field}
+        if all(value in (None, '') for value in values.values()):
+            continue
+        yield line, values
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value or None
+
+
+def _parse_date(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    value = str(value).strip()
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError('Data de nascimento inválida (use AAAA-MM-DD ou DD/MM/AAAA)')
+
+
+def _parse_weight(value, label):
+    if value in (None, ''):
+        return None
+    if isinstance(value, (int, float)):
+        weight = float(value)
+    else:
+        try:
+            weight = float(str(value).strip().replace(',', '.'))
+        except ValueError as e:
+            raise ValueError(f'{label} inválido') from e
+    if weight < 0:
+        raise ValueError(f'{label} inválido')
+    return weight or None
+
+
+def _validate(values, owner_user_id, herds_by_id, herds_by_name, default_herd_id):
+    """Converte uma linha em valores de Animal; levanta ValueError com a mensagem do erro"""
+    earring = _text(values.get('earring'))
+    if not earring:
+        raise ValueError('Brinco é obrigatório')
+    if len(earring) > Animal.__table__.c.earring.type.length:
+        raise ValueError('Brinco muito longo')
+
+    herd_id = default_herd_id
+    if _text(values.get('herd_id')):
+        herd_text = _text(values.get('herd_id'))
+        if not herd_text.isdigit() or int(herd_text) not in herds_by_id:
+            raise ValueError('Fazenda não encontrada para o usuário informado')
+        herd_id = int(herd_text)
+    elif _text(values.get('herd')):
+        herd_id = herds_by_name.get(_text(values.get('herd')).lower())
+        if herd_id is None:
+            raise ValueError('Fazenda não encontrada para o usuário informado')
+
+    status = (_text(values.get('status')) or AnimalStatus.ATIVO.value).lower()
+    if status not in {item.value for item in AnimalStatus}:
+        raise ValueError('Status inválido')
+
+    return {
+        'earring': earring,
+        'name': _text(values.get('name')),
+        'breed': _text(values.get('breed')),
+        'birth_date': _parse_date(values.get('birth_date')),
+        'origin': _text(values.get('origin')),
+        'gender': _text(values.get('gender')),
+        'status': status,
+        'entry_weight': _parse_weight(values.get('entry_weight'), 'Peso de entrada'),
+        'target_weight': _parse_weight(values.get('target_weight'), 'Peso meta'),
+        'herd_id': herd_id,
+        'user_id': owner_user_id,
+    }
+
+
+def import_animals(rows, owner_user_id, default_herd_id=None, dry_run=False):
+    """
+    Importa animais das linhas de read_rows em uma transação: fazendas do
+    usuário lidas uma vez, brincos conferidos contra o arquivo (conjunto em
+    memória) e contra o banco (um SELECT por lote) e INSERT em lotes de
+    IMPORT_BATCH_SIZE. Retorna o resumo com os erros por linha.
+    """
+    herds = (
+        db.session.query(Herd.id, Herd.name)
+        .join(UserHerd, UserHerd.herd_id == Herd.id)
+        .filter(UserHerd.user_id == owner_user_id)
+        .all()
+    )
+    herds_by_id = {herd_id for herd_id, _ in herds}
+    herds_by_name = {name.strip().lower(): herd_id for herd_id, name in herds if name}
+    if default_herd_id is not None and default_herd_id not in herds_by_id:
+        raise ImportFileError('Fazenda não encontrada para o usuário informado')
+
+    summary = {'created': 0, 'failed': 0, 'errors': []}
+    seen_earrings = set()
+    snapshots = []
+
+    def fail(line, earring, message):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'row': line, 'earring': earring, 'message': message})
+
+    def flush(batch):
+        existing = {
+            earring for (earring,) in
+            db.session.query(Animal.earring).filter(Animal.earring.in_([row['earring'] for _, row in batch]))
+        }
+        valid = []
+        for line, row in batch:
+            if row['earring'] in existing:
+                fail(line, row['earring'], 'Brinco já existe')
+            else:
+                valid.append(row)
+        if valid and not dry_run:
+            db.session.execute(db.insert(Animal), valid)
+        summary['created'] += len(valid)
+        snapshots.extend((row['user_id'], row['herd_id'], row['status']) for row in valid)
+
+    try:
+        batch = []
+        total = 0
+        for line, values in rows:
+            total += 1
+            if total > MAX_IMPORT_ROWS:
+                raise ImportFileError(f'Máximo de {MAX_IMPORT_ROWS} linhas por arquivo')
+            try:
+                row = _validate(values, owner_user_id, herds_by_id, herds_by_name, default_herd_id)
+            except ValueError as e:
+                fail(line, _text(values.get('earring')), str(e))
+                continue
+            if row['earring'] in seen_earrings:
+                fail(line, row['earring'], 'Brinco repetido no arquivo')
+                continue
+            seen_earrings.add(row['earring'])
+            batch.append((line, row))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+
+        # Brincos já cadastrados só são detectados no lote; reordena pelo número da linha
+        summary['errors'].sort(key=lambda error: error['row'])
+        if dry_run or not summary['created']:
+            db.session.rollback()
+            return summary
+
+        projections.track_animals_created(snapshots)
+        audit.record('create', 'animal', f"{summary['created']} animais importados de planilha", user_id=owner_user_id)
+        db.session.commit()
+    except IntegrityError as e:
+        # Outro cadastro usou um dos brincos entre a conferência e o insert
+        db.session.rollback()
+        raise ImportFileError('Brinco cadastrado durante a importação; envie o arquivo novamente') from e
+    except ImportFileError:
+        db.session.rollback()
+        raise
+    return summary
@@ -0,0 +1,223 @@
+import re
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from app import db
+from app.models import utcnow
+
+# Versões aplicadas; criada pelo próprio runner
+schema_migrations = db.Table(
+    'schema_migrations',
+    db.Column('version', db.String(100), primary_key=True),
+    db.Column('applied_at', db.DateTime, nullable=False)
+)
+
+# Chave do pg_advisory_lock que serializa o runner entre processos (workers do gunicorn)
+_ADVISORY_LOCK_KEY = 72_310_021
+
+Migration = namedtuple('Migration', ['version', 'description', 'apply'])
+
+
+def _is_postgres(conn):
+    return conn.dialect.name == 'postgresql'
+
+
+def _is_partitioned(conn, table_name):
+    if not _is_postgres(conn):
+        return False
+    return bool(conn.execute(text(
+        "SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass(:name)"
+    ), {'name': table_name}).scalar())
+
+
+def create_index(conn, index):
+    """
+    Cria o índice se não existir. No Postgres usa CONCURRENTLY (sem bloquear
+    escritas) e refaz índices deixados inválidos por uma tentativa
+    interrompida; tabelas particionadas não aceitam CONCURRENTLY.
+    """
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=conn.dialect))
+    if not _is_postgres(conn):
+        conn.execute(text(ddl))
+        return
+
+    valid = conn.execute(text(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"
+    ), {'name': index.name}).scalar()
+    if valid is True:
+        return
+    if valid is False:
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+    if not _is_partitioned(conn, index.table.name):
+        ddl = re.sub(r'^CREATE (UNIQUE )?INDEX', r'CREATE \1INDEX CONCURRENTLY', ddl)
+    conn.execute(text(ddl))
+
+
+def drop_index(conn, name):
+    concurrently = 'CONCURRENTLY ' if _is_postgres(conn) else ''
+    conn.execute(text(f'DROP INDEX {concurrently}IF EXISTS "{name}"'))
+
+
+def ensure_declared_indexes(conn):
+    """Cria os índices declarados nos modelos que ainda não existem no banco; retorna os nomes"""
+    inspector = inspect(conn)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not table.indexes or not inspector.has_table(table.name):
+            continue
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda item: item.name):
+            if index.name not in existing:
+                create_index(conn, index)
+                created.append(index.name)
+    return created
+
+
+# ===== MIGRAÇÕES (em ordem; cada uma precisa ser idempotente) =====
+
+def _add_users_profile_photo_url(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('users')}
+    if 'profile_photo_url' not in columns:
+        conn.execute(text("ALTER TABLE users ADD COLUMN profile_photo_url VARCHAR(500)"))
+
+
+def _drop_single_column_animal_id_indexes(conn):
+    # Cobertos pelos índices compostos (animal_id, data, ...) criados no passo anterior
+    for table in ('weighings', 'movements', 'reproductions', 'vaccine_applications', 'health_records', 'attachments'):
+        drop_index(conn, f'ix_{table}_animal_id')
+
+
+def _backfill_weight_states(conn):
+    # Usa a sessão (transação própria, commit por lote): o cálculo fica em projections
+    from app.projections import backfill_weight_states
+    backfill_weight_states()
+
+
+def _reset_herd_counters(conn):
+    # Totais antigos não têm as linhas por dono; são recriados juntos na próxima escrita/leitura
+    conn.execute(text("DELETE FROM herd_user_counters"))
+    conn.execute(text("DELETE FROM herd_counters"))
+
+
+def _clear_finished_outbox_payloads(conn):
+    # Mensagens já enviadas/desistidas guardavam o código de reset em texto puro
+    conn.execute(text(
+        "UPDATE outbound_messages SET payload = '{}' WHERE status IN ('sent', 'failed') AND payload <> '{}'"
+    ))
+
+
+def _created_at_not_null(conn):
+    # created_at é chave de paginação (created_at, id): um NULL quebrava o cursor
+    # e deixava a linha inalcançável. Linhas antigas sem data ficam com a mais
+    # antiga da tabela (ou agora, se nenhuma tiver data).
+    default = utcnow().compile(dialect=conn.dialect)
+    for table in ('users', 'herds', 'animals'):
+        conn.execute(text(
+            f"UPDATE {table} SET created_at = COALESCE("
+            f"(SELECT MIN(created_at) FROM {table}), CURRENT_TIMESTAMP) WHERE created_at IS NULL"
+        ))
+        if _is_postgres(conn):
+            conn.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN created_at SET DEFAULT {default}, "
+                f"ALTER COLUMN created_at SET NOT NULL"
+            ))
+
+
+def _activities_created_at_not_null(conn):
+    # Particionada no Postgres, created_at já é obrigatória (faz parte da PK); o
+    # default no servidor cobre inserts fora do ORM, que antes falhavam ali
+    default = utcnow().compile(dialect=conn.dialect)
+    if not _is_partitioned(conn, 'activities'):
+        conn.execute(text(
+            "UPDATE activities SET created_at = COALESCE("
+            "(SELECT MIN(created_at) FROM activities), CURRENT_TIMESTAMP) WHERE created_at IS NULL"
+        ))
+    if _is_postgres(conn):
+        conn.execute(text(
+            f"ALTER TABLE activities ALTER COLUMN created_at SET DEFAULT {default}, "
+            f"ALTER COLUMN created_at SET NOT NULL"
+        ))
+
+
+MIGRATIONS = [
+    Migration('0001_users_profile_photo_url', 'Coluna users.profile_photo_url', _add_users_profile_photo_url),
+    Migration('0002_hot_path_indexes', 'Índices compostos dos caminhos de leitura frequentes', ensure_declared_indexes),
+    Migration('0003_drop_single_column_animal_id_indexes', 'Remove índices só de animal_id cobertos pelos compostos',
+              _drop_single_column_animal_id_indexes),
+    Migration('0004_backfill_weight_states', 'Estado de peso dos animais com pesagens anteriores à projeção',
+              _backfill_weight_states),
+    Migration('0005_reset_herd_counters', 'Recria herd_counters junto com herd_user_counters (por dono)',
+              _reset_herd_counters),
+    Migration('0006_clear_finished_outbox_payloads', 'Remove o payload (código de reset) de mensagens enviadas ou com falha',
+              _clear_finished_outbox_payloads),
+    Migration('0007_created_at_not_null', 'created_at obrigatório em users, herds e animals (chave de paginação)',
+              _created_at_not_null),
+    Migration('0008_activities_created_at_not_null', 'created_at obrigatório e com default no servidor em activities',
+              _activities_created_at_not_null),
+]
+
+
+def applied_versions(conn):
+    schema_migrations.create(conn, checkfirst=True)
+    return {version for (version,) in conn.execute(db.select(schema_migrations.c.version))}
+
+
+def run(log=print):
+    """
+    Aplica as migrações pendentes e cria índices declarados ainda ausentes.
+    Roda em conexão AUTOCOMMIT (exigido por CREATE INDEX CONCURRENTLY), sob
+    advisory lock no Postgres para que só um processo migre por vez.
+    Retorna as versões aplicadas nesta execução.
+    """
+    applied_now = []
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if _is_postgres(conn):
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': _ADVISORY_LOCK_KEY})
+        try:
+            done = applied_versions(conn)
+            for migration in MIGRATIONS:
+                if migration.version in done:
+                    continue
+                log(f"🔧 Migração {migration.version}: {migration.description}")
+                migration.apply(conn)
+                conn.execute(schema_migrations.insert().values(
+                    version=migration.version, applied_at=datetime.utcnow()
+                ))
+                applied_now.append(migration.version)
+
+            created = ensure_declared_indexes(conn)
+            if created:
+                log(f"🔧 Índices criados: {', '.join(created)}")
+        finally:
+            if _is_postgres(conn):
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': _ADVISORY_LOCK_KEY})
+    return applied_now
+
+
+def status():
+    """[(versão, descrição, aplicada_em ou None)] de todas as migrações conhecidas"""
+    with db.engine.connect() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        applied = dict(conn.execute(db.select(schema_migrations.c.version, schema_migrations.c.applied_at)).all())
+        conn.commit()
+    return [(migration.version, migration.description, applied.get(migration.version)) for migration in MIGRATIONS]
+
+
+def setup_schema(log=print):
+    """
+    Todo o trabalho de schema que antes rodava no import da aplicação:
+    cria tabelas novas, aplica migrações, prepara as partições de
+    activities e ajusta ações ON DELETE das FKs
+    """
+    from app import partitions, schema
+
+    db.create_all()
+    applied = run(log=log)
+    partitions.setup_at_startup()
+    fixed_fks = schema.sync_foreign_key_actions()
+    if fixed_fks:
+        log(f"✅ Ação ON DELETE ajustada em: {', '.join(fixed_fks)}")
+    return applied
@@ -2,6 +2,27 @@ from app import db
 from datetime import datetime, timedelta
 import secrets
 from enum import Enum
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+# Default no servidor equivalente a datetime.utcnow (inserts fora do ORM)
+class utcnow(FunctionElement):
+    type = db.DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    # SQLite: CURRENT_TIMESTAMP já é UTC
+    return 'CURRENT_TIMESTAMP'
+
+
+@compiles(utcnow, 'postgresql')
+def _utcnow_postgresql(element, compiler, **kw):
+    # now() segue o TimeZone da sessão; a coluna é timestamp sem fuso, em UTC
+    return "(now() AT TIME ZONE 'utc')"
+
 
 # Enums para padronização
 class AnimalStatus(Enum):
@@ -22,8 +43,12 @@ class ReproductionType(Enum):
 
 class UserHerd(db.Model):
     __tablename__ = 'user_herds'
+    __table_args__ = (
+        # A PK (user_id, herd_id) atende as buscas por usuário; este índice, as por rebanho
+        db.Index('ix_user_herds_herd_id', 'herd_id'),
+    )
 
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
     herd_id = db.Column(db.Integer, db.ForeignKey('herds.id'), primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -39,7 +64,7 @@ class User(db.Model):
     role = db.Column(db.String(20), default='user')  # admin, veterinarian, technician, user
     is_active = db.Column(db.Boolean, default=True)
     profile_photo_url = db.Column(db.String(500), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=utcnow())
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     herds = db.relationship('Herd', secondary='user_herds', back_populates='owners')
@@ -61,7 +86,7 @@ class PasswordReset(db.Model):
     __tablename__ = 'password_resets'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     code = db.Column(db.String(6), nullable=False)
     method = db.Column(db.String(10), nullable=False)  # 'email' ou 'sms'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -91,6 +116,37 @@ class PasswordReset(db.Model):
             'used': self.used
         }
 
+# Fila persistente de mensagens (e-mail/SMS) enviadas em segundo plano
+class OutboundMessage(db.Model):
+    __tablename__ = 'outbound_messages'
+
+    id = db.Column(db.Integer, primary_key=True)
+    channel = db.Column(db.String(10), nullable=False)  # email, sms
+    kind = db.Column(db.String(50), nullable=False)  # password_reset
+    recipient = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON com os dados do template
+    status = db.Column(db.String(10), nullable=False, default='pending', index=True)  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def json(self):
+        return {
+            'id': self.id,
+            'channel': self.channel,
+            'kind': self.kind,
+            'recipient': self.recipient,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
+
 # ===== MODELOS PARA GESTÃO DE GADO =====
 
 # Rebanhos/Lotes/Fazendas
@@ -106,7 +162,7 @@ class Herd(db.Model):
     capacity = db.Column(db.Integer)
     owner_name = db.Column(db.String(100))  # Nome do proprietário
     employees_count = db.Column(db.Integer)  # Número de funcionários
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=utcnow())
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     owners = db.relationship('User', secondary='user_herds', back_populates='herds')
@@ -130,6 +186,12 @@ class Herd(db.Model):
 # Animais
 class Animal(db.Model):
     __tablename__ = 'animals'
+    __table_args__ = (
+        # Listagens do usuário filtradas por fazenda/status e paginadas por (created_at, id)
+        db.Index('ix_animals_user_id_herd_id_status', 'user_id', 'herd_id', 'status'),
+        db.Index('ix_animals_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_animals_herd_id', 'herd_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     earring = db.Column(db.String(20), unique=True, nullable=False)  # Brinco
@@ -141,14 +203,15 @@ class Animal(db.Model):
     status = db.Column(db.String(20), default=AnimalStatus.ATIVO.value)
     entry_weight = db.Column(db.Float, nullable=True)
     target_weight = db.Column(db.Float, nullable=True)
-    mother_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='SET NULL'))
-    father_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='SET NULL'))
+    mother_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='SET NULL'), index=True)
+    father_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='SET NULL'), index=True)
     herd_id = db.Column(db.Integer, db.ForeignKey('herds.id'))
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Animais de um usuário excluído ficam sem dono (não são apagados)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=utcnow())
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    owner = db.relationship('User', backref=db.backref('animals', lazy=True))
+    owner = db.relationship('User', backref=db.backref('animals', lazy=True, passive_deletes=True))
     
     def json(self):
         return {
@@ -173,6 +236,10 @@ class Animal(db.Model):
 # Pesagens
 class Weighing(db.Model):
     __tablename__ = 'weighings'
+    __table_args__ = (
+        # Histórico do animal ordenado por data (também atende o ON DELETE CASCADE)
+        db.Index('ix_weighings_animal_id_date_id', 'animal_id', 'date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     animal_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='CASCADE'), nullable=False)
@@ -191,19 +258,91 @@ class Weighing(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+# Estado atual de peso do animal (projeção mantida a cada escrita em weighings)
+class AnimalWeightState(db.Model):
+    __tablename__ = 'animal_weight_states'
+
+    animal_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='CASCADE'), primary_key=True)
+    last_weight = db.Column(db.Float)
+    last_weighing_date = db.Column(db.Date)
+    previous_weight = db.Column(db.Float)
+    previous_weighing_date = db.Column(db.Date)
+    gmd = db.Column(db.Float)  # Ganho médio diário entre as duas últimas pesagens
+    weighings_count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def json(self):
+        return {
+            'animal_id': self.animal_id,
+            'last_weight': self.last_weight,
+            'last_weighing_date': self.last_weighing_date.isoformat() if self.last_weighing_date else None,
+            'previous_weight': self.previous_weight,
+            'previous_weighing_date': self.previous_weighing_date.isoformat() if self.previous_weighing_date else None,
+            'gmd': self.gmd,
+            'weighings_count': self.weighings_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+# Contadores mantidos por usuário (dashboard e /api/user/stats)
+class UserCounter(db.Model):
+    __tablename__ = 'user_counters'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    total_animals = db.Column(db.Integer, nullable=False, default=0)
+    active_animals = db.Column(db.Integer, nullable=False, default=0)
+    total_herds = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Contador de animais por rebanho
+class HerdCounter(db.Model):
+    __tablename__ = 'herd_counters'
+
+    herd_id = db.Column(db.Integer, db.ForeignKey('herds.id', ondelete='CASCADE'), primary_key=True)
+    animal_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Animais de cada dono dentro do rebanho (distribuição do dashboard por usuário).
+# Criado junto com o HerdCounter do rebanho; dono ausente = nenhum animal dele.
+class HerdUserCounter(db.Model):
+    __tablename__ = 'herd_user_counters'
+
+    herd_id = db.Column(db.Integer, db.ForeignKey('herds.id', ondelete='CASCADE'), primary_key=True)
+    # Sem FK: 0 representa os animais sem usuário (Animal.user_id nulo)
+    user_id = db.Column(db.Integer, primary_key=True)
+    animal_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+# Geração de cada cache em memória: invalidar = incrementar a geração, e cada
+# processo descarta o próprio cache ao ver um valor diferente do que conhece
+class CacheGeneration(db.Model):
+    __tablename__ = 'cache_generations'
+
+    name = db.Column(db.String(100), primary_key=True)
+    generation = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 
 # Modelo para atividades / audit log
 class Activity(db.Model):
     __tablename__ = 'activities'
+    __table_args__ = (
+        # Feed de atividades: filtro por usuário ordenado por data
+        db.Index('ix_activities_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_activities_username_created_at', 'username', 'created_at'),
+        # Feed geral, exportação e retenção por data
+        db.Index('ix_activities_created_at', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    # O histórico sobrevive ao usuário (username continua gravado)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
     username = db.Column(db.String(100), nullable=True)
     action = db.Column(db.String(50), nullable=False)  # create, update, delete, weigh
     object_type = db.Column(db.String(50), nullable=True)  # animal, weighing, herd, user
     object_id = db.Column(db.Integer, nullable=True)
     description = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Chave de partição no Postgres: lá a PK é (id, created_at), criada por partitions.convert_to_partitioned
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=utcnow())
 
     def _derive_icon(self):
         icon_map = {
@@ -235,6 +374,9 @@ class Activity(db.Model):
 # Movimentações
 class Movement(db.Model):
     __tablename__ = 'movements'
+    __table_args__ = (
+        db.Index('ix_movements_animal_id_date_id', 'animal_id', 'date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     animal_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='CASCADE'), nullable=False)
@@ -262,15 +404,18 @@ class Movement(db.Model):
 # Reprodução
 class Reproduction(db.Model):
     __tablename__ = 'reproductions'
+    __table_args__ = (
+        db.Index('ix_reproductions_animal_id_date', 'animal_id', 'date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     animal_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='CASCADE'), nullable=False)
     reproduction_type = db.Column(db.String(30), nullable=False)  # cobertura_natural, inseminacao_artificial, etc.
     date = db.Column(db.Date, nullable=False)
-    partner_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='SET NULL'))  # Parceiro (touro)
+    partner_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='SET NULL'), index=True)  # Parceiro (touro)
     expected_birth = db.Column(db.Date)  # Data esperada do parto
     actual_birth = db.Column(db.Date)  # Data real do parto
-    offspring_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='SET NULL'))  # Filhote gerado
+    offspring_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='SET NULL'), index=True)  # Filhote gerado
     success = db.Column(db.Boolean, default=True)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -318,6 +463,9 @@ class Vaccine(db.Model):
 
 class VaccineApplication(db.Model):
     __tablename__ = 'vaccine_applications'
+    __table_args__ = (
+        db.Index('ix_vaccine_applications_animal_id_application_date_id', 'animal_id', 'application_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     animal_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='CASCADE'), nullable=False)
@@ -343,6 +491,9 @@ class VaccineApplication(db.Model):
 # Registros de Saúde
 class HealthRecord(db.Model):
     __tablename__ = 'health_records'
+    __table_args__ = (
+        db.Index('ix_health_records_animal_id_date_id', 'animal_id', 'date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     animal_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='CASCADE'), nullable=False)
@@ -372,6 +523,9 @@ class HealthRecord(db.Model):
 # Anexos e Documentos
 class Attachment(db.Model):
     __tablename__ = 'attachments'
+    __table_args__ = (
+        db.Index('ix_attachments_animal_id_created_at', 'animal_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     animal_id = db.Column(db.Integer, db.ForeignKey('animals.id', ondelete='CASCADE'), nullable=False)
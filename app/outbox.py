@@ -0,0 +1,240 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models import OutboundMessage
+from config import Config
+
+PENDING = 'pending'
+SENDING = 'sending'
+SENT = 'sent'
+FAILED = 'failed'
+
+# Mensagem em "sending" há mais que isso pertence a um worker que morreu
+LOCK_TIMEOUT = timedelta(minutes=5)
+
+# Payload gravado quando a mensagem chega a um estado final (o original tem o código de reset)
+CLEARED_PAYLOAD = '{}'
+
+_wakeup = threading.Event()
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+
+def enqueue(channel, kind, recipient, payload):
+    """
+    Adiciona a mensagem à fila na transação corrente: ela só existe
+    para os workers depois do commit de quem a criou.
+    """
+    message = OutboundMessage(
+        channel=channel,
+        kind=kind,
+        recipient=recipient,
+        payload=json.dumps(payload, ensure_ascii=False),
+        status=PENDING,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(message)
+    return message
+
+
+def enqueue_password_reset(user, reset_request):
+    recipient = user.email if reset_request.method == 'email' else user.phone
+    return enqueue(reset_request.method, 'password_reset', recipient, {
+        'code': reset_request.code,
+        'username': user.username
+    })
+
+
+def wake():
+    """Avisa os workers deste processo que há mensagem nova (evita esperar o polling)"""
+    _wakeup.set()
+
+
+def retry_delay(attempts):
+    """Backoff exponencial: base, 2x base, 4x base... limitado a 1 hora"""
+    return timedelta(seconds=min(Config.OUTBOX_RETRY_BASE * (2 ** max(attempts - 1, 0)), 3600))
+
+
+def claim_batch(limit=10):
+    """
+    Reserva até `limit` mensagens vencidas para este worker. A reserva é um
+    UPDATE condicional por linha, então dois workers (ou processos) nunca
+    recebem a mesma mensagem, em Postgres ou SQLite.
+    """
+    now = datetime.utcnow()
+    stale = now - LOCK_TIMEOUT
+    candidates = (
+        db.session.query(OutboundMessage.id, OutboundMessage.status)
+        .filter(db.or_(
+            db.and_(OutboundMessage.status == PENDING, OutboundMessage.next_attempt_at <= now),
+            db.and_(OutboundMessage.status == SENDING, OutboundMessage.locked_at < stale)
+        ))
+        .order_by(OutboundMessage.next_attempt_at, OutboundMessage.id)
+        .limit(limit)
+        .all()
+    )
+
+    table = OutboundMessage.__table__
+    claimed = []
+    for message_id, status in candidates:
+        condition = table.c.status == status
+        if status == SENDING:
+            condition = db.and_(condition, table.c.locked_at < stale)
+        result = db.session.execute(
+            table.update()
+            .where(table.c.id == message_id, condition)
+            .values(status=SENDING, locked_at=now, attempts=table.c.attempts + 1)
+        )
+        if result.rowcount == 1:
+            claimed.append(message_id)
+    db.session.commit()
+
+    if not claimed:
+        return []
+    return OutboundMessage.query.filter(OutboundMessage.id.in_(claimed)).order_by(OutboundMessage.id).all()
+
+
+def deliver(message):
+    """Envia pelo canal da mensagem; levanta exceção em caso de falha"""
+    from app.email_service import email_service, sms_service
+
+    payload = json.loads(message.payload)
+    if message.kind != 'password_reset':
+        raise ValueError(f'Tipo de mensagem desconhecido: {message.kind}')
+
+    if message.channel == 'email':
+        email_service.deliver_password_reset_email(message.recipient, payload['code'], payload['username'])
+    elif message.channel == 'sms':
+        if not sms_service.send_password_reset_sms(message.recipient, payload['code'], payload['username']):
+            raise RuntimeError('Falha no envio do SMS')
+    else:
+        raise ValueError(f'Canal desconhecido: {message.channel}')
+
+
+def _finish(message, error=None):
+    now = datetime.utcnow()
+    message.locked_at = None
+    if error is None:
+        message.status = SENT
+        message.sent_at = now
+        message.last_error = None
+    else:
+        message.last_error = str(error)[:1000]
+        if message.attempts >= Config.OUTBOX_MAX_ATTEMPTS:
+            message.status = FAILED
+        else:
+            message.status = PENDING
+            message.next_attempt_at = now + retry_delay(message.attempts)
+    if message.status in (SENT, FAILED):
+        # Não guarda o código de reset em texto puro depois que ele não será mais enviado
+        message.payload = CLEARED_PAYLOAD
+    db.session.commit()
+
+
+def _deliver_emails(messages):
+    """E-mails do lote enviados juntos pela mesma conexão SMTP (send_many)"""
+    from app.email_service import email_service
+
+    mime_messages = []
+    for message in messages:
+        payload = json.loads(message.payload)
+        mime_messages.append(email_service.build_password_reset_email(
+            message.recipient, payload['code'], payload['username']
+        ))
+    results = email_service.send_many(mime_messages)
+    for message, result in zip(messages, results):
+        if result['ok']:
+            _finish(message)
+        else:
+            print(f"DEBUG: Falha ao enviar mensagem {message.id} (email): {result['error']}")
+            _finish(message, result['error'])
+
+
+def process_batch(limit=10):
+    """Reserva e envia um lote; retorna quantas mensagens foram processadas"""
+    messages = claim_batch(limit)
+    emails = [message for message in messages if message.channel == 'email' and message.kind == 'password_reset']
+    if emails:
+        _deliver_emails(emails)
+
+    for message in messages:
+        if message in emails:
+            continue
+        try:
+            deliver(message)
+        except Exception as e:
+            print(f"DEBUG: Falha ao enviar mensagem {message.id} ({message.channel}): {str(e)}")
+            _finish(message, e)
+        else:
+            _finish(message)
+    return len(messages)
+
+
+def _worker_loop(app, poll_interval, stop_event=None):
+    while stop_event is None or not stop_event.is_set():
+        try:
+            with app.app_context():
+                processed = process_batch()
+                db.session.remove()
+        except Exception as e:
+            print(f"DEBUG: Erro no worker da fila de mensagens: {str(e)}")
+            processed = 0
+        if not processed:
+            _wakeup.wait(poll_interval)
+            _wakeup.clear()
+
+
+def start_workers(count=None, poll_interval=None, stop_event=None):
+    """Inicia `count` threads que drenam a fila (chamar dentro do contexto da aplicação); retorna as threads"""
+    app = current_app._get_current_object()
+    threads = []
+    for index in range(count or Config.OUTBOX_WORKERS):
+        thread = threading.Thread(
+            target=_worker_loop,
+            args=(app, poll_interval or Config.OUTBOX_POLL_INTERVAL, stop_event),
+            name=f'outbox-worker-{index}',
+            daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def ensure_inprocess_workers():
+    """
+    Com OUTBOX_INPROCESS_WORKERS ativo, sobe os workers dentro do processo
+    da API na primeira mensagem enfileirada (uma vez por processo/pid)
+    """
+    global _worker_pid
+    if not Config.OUTBOX_INPROCESS_WORKERS:
+        return
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+    start_workers()
+
+
+def queue_stats():
+    rows = db.session.query(OutboundMessage.status, db.func.count(OutboundMessage.id)).group_by(OutboundMessage.status)
+    stats = {PENDING: 0, SENDING: 0, SENT: 0, FAILED: 0}
+    stats.update({status: count for status, count in rows})
+    return stats
+
+
+def run_forever(workers=None, poll_interval=None):
+    """Loop do processo dedicado (`flask outbox-worker`)"""
+    stop_event = threading.Event()
+    threads = start_workers(workers, poll_interval, stop_event)
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop_event.set()
+        wake()
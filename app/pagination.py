@@ -0,0 +1,180 @@
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+from sqlalchemy.types import Date, DateTime, Float, Integer, Numeric, String
+
+# Limite máximo de itens por página aceito pelos endpoints paginados
+MAX_PAGE_SIZE = 1000
+DEFAULT_PAGE_SIZE = 50
+
+# Cache de contagens totais (include_total=1): validade em segundos e número de chaves
+COUNT_CACHE_TTL = 60
+COUNT_CACHE_SIZE = 1024
+
+Page = namedtuple('Page', ['items', 'next_cursor', 'total'])
+
+
+class PaginationError(ValueError):
+    """Parâmetro de paginação (cursor ou limit) inválido"""
+    pass
+
+
+def _serialize(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(values):
+    """Serializa a chave da última linha da página em um cursor opaco (base64 url-safe)"""
+    raw = json.dumps([_serialize(value) for value in values], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverso de encode_cursor; levanta PaginationError se o cursor não for válido"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise PaginationError('Cursor inválido') from e
+    if not isinstance(values, list):
+        raise PaginationError('Cursor inválido')
+    return values
+
+
+def decode_id_cursor(cursor):
+    """Cursor de paginação só por id: exatamente um valor inteiro"""
+    values = decode_cursor(cursor)
+    if len(values) != 1 or type(values[0]) is not int:
+        raise PaginationError('Cursor inválido')
+    return values[0]
+
+
+def parse_limit(value, default=None, maximum=MAX_PAGE_SIZE):
+    """Converte o parâmetro `limit` da requisição, limitado a `maximum`"""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError) as e:
+        raise PaginationError('Parâmetro limit inválido') from e
+    if limit <= 0:
+        raise PaginationError('Parâmetro limit inválido')
+    return min(limit, maximum)
+
+
+def wants_cursor_pagination(args):
+    """O modo cursor é opcional: ativado quando a requisição envia `limit` ou `cursor`"""
+    return 'cursor' in args or 'limit' in args
+
+
+def _parse_key(column, value):
+    """
+    Converte um valor vindo do cursor de volta ao tipo da coluna de ordenação;
+    valores nulos ou de outro tipo (ex.: texto onde se espera um id inteiro)
+    são recusados aqui, antes de chegar ao banco
+    """
+    column_type = column.type
+    if isinstance(column_type, (DateTime, Date)):
+        if not isinstance(value, str):
+            raise PaginationError('Cursor inválido')
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError as e:
+            raise PaginationError('Cursor inválido') from e
+        return parsed if isinstance(column_type, DateTime) else parsed.date()
+    if isinstance(column_type, Integer):
+        if type(value) is not int:
+            raise PaginationError('Cursor inválido')
+        return value
+    if isinstance(column_type, String):
+        if not isinstance(value, str):
+            raise PaginationError('Cursor inválido')
+        return value
+    if isinstance(column_type, (Float, Numeric)):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise PaginationError('Cursor inválido')
+        return value
+    raise PaginationError('Cursor inválido')
+
+
+def _after_key(order_by, values, descending):
+    """Predicado keyset `(c1, c2, ...) > (v1, v2, ...)` portável (sem row values)"""
+    clauses = []
+    for position, column in enumerate(order_by):
+        equal_prefix = [order_by[i] == values[i] for i in range(position)]
+        beyond = column < values[position] if descending else column > values[position]
+        clauses.append(and_(*equal_prefix, beyond))
+    return or_(*clauses)
+
+
+def keyset_page(query, order_by, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """
+    Uma página ordenada por `order_by` (colunas NOT NULL; a última deve ser única, ex.: id)
+    a partir do cursor, sem OFFSET: o custo não depende da profundidade.
+    Retorna (itens, próximo_cursor_ou_None).
+    """
+    if cursor:
+        values = decode_cursor(cursor)
+        if len(values) != len(order_by):
+            raise PaginationError('Cursor inválido')
+        values = [_parse_key(column, value) for column, value in zip(order_by, values)]
+        query = query.filter(_after_key(order_by, values, descending))
+
+    ordering = [column.desc() if descending else column.asc() for column in order_by]
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], column.key) for column in order_by])
+    return rows, next_cursor
+
+
+_count_cache = OrderedDict()
+_count_cache_lock = threading.Lock()
+
+
+def cached_count(key, query, ttl=COUNT_CACHE_TTL):
+    """COUNT(*) da consulta reaproveitado por `ttl` segundos para a mesma chave"""
+    now = time.monotonic()
+    with _count_cache_lock:
+        cached = _count_cache.get(key)
+        if cached and cached[1] > now:
+            _count_cache.move_to_end(key)
+            return cached[0]
+
+    total = query.order_by(None).count()
+
+    with _count_cache_lock:
+        _count_cache[key] = (total, now + ttl)
+        _count_cache.move_to_end(key)
+        while len(_count_cache) > COUNT_CACHE_SIZE:
+            _count_cache.popitem(last=False)
+    return total
+
+
+def paginate_request(query, order_by, args, descending=False, count_key=None):
+    """Aplica keyset_page com os parâmetros `limit`, `cursor` e `include_total` da requisição"""
+    limit = parse_limit(args.get('limit'), default=DEFAULT_PAGE_SIZE)
+    items, next_cursor = keyset_page(query, order_by, args.get('cursor'), limit, descending)
+
+    total = None
+    if count_key is not None and str(args.get('include_total', '')).lower() in ('1', 'true'):
+        total = cached_count(count_key, query)
+    return Page(items, next_cursor, total)
+
+
+def with_page_headers(response, page):
+    """Expõe próximo cursor e total em cabeçalhos (endpoints que retornam listas)"""
+    if page.next_cursor:
+        response.headers['X-Next-Cursor'] = page.next_cursor
+    if page.total is not None:
+        response.headers['X-Total-Count'] = str(page.total)
+    return response
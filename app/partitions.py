@@ -0,0 +1,294 @@
+from datetime import datetime
+
+from sqlalchemy import MetaData, Table, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import db
+from app.models import Activity, utcnow
+from config import Config
+
+ARCHIVE_PREFIX = 'activities_archive_'
+DEFAULT_PARTITION = 'activities_default'
+
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def _month_start(value):
+    return datetime(value.year, value.month, 1)
+
+
+def _add_months(month, count):
+    years, index = divmod(month.month - 1 + count, 12)
+    return datetime(month.year + years, index + 1, 1)
+
+
+def partition_name(month):
+    return f'activities_{month:%Y_%m}'
+
+
+def archive_name(month):
+    return f'{ARCHIVE_PREFIX}{month:%Y_%m}'
+
+
+def _month_from_name(name):
+    """activities_2026_01 / activities_archive_2026_01 -> datetime(2026, 1, 1); None para outros nomes"""
+    try:
+        year, month = name.rsplit('_', 2)[-2:]
+        return datetime(int(year), int(month), 1)
+    except ValueError:
+        return None
+
+
+def retention_cutoff(retention_months=None):
+    """Primeiro mês mantido na tabela ativa; None quando a retenção está desativada"""
+    months = Config.ACTIVITY_RETENTION_MONTHS if retention_months is None else retention_months
+    if not months:
+        return None
+    return _add_months(_month_start(datetime.utcnow()), -months)
+
+
+# ===== POSTGRES: PARTICIONAMENTO MENSAL POR created_at =====
+
+def is_partitioned():
+    if not _is_postgres():
+        return False
+    return bool(db.session.execute(text(
+        "SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass('activities')"
+    )).scalar())
+
+
+def _relation_exists(name):
+    return db.session.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {'name': name}).scalar()
+
+
+def _create_partition(month):
+    """
+    Cria a partição do mês. Se a DEFAULT já recebeu linhas desse mês, o
+    Postgres recusa o CREATE ... PARTITION OF; nesse caso a partição é
+    criada como tabela comum, as linhas saem da DEFAULT para ela e ela é
+    anexada (com a DEFAULT travada para não receber novas linhas do mês no meio).
+    """
+    name = partition_name(month)
+    if _relation_exists(name):
+        return
+    start, end = f'{month:%Y-%m-%d}', f'{_add_months(month, 1):%Y-%m-%d}'
+    bounds = f"FOR VALUES FROM ('{start}') TO ('{end}')"
+
+    in_default = _relation_exists(DEFAULT_PARTITION) and db.session.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= :start AND created_at < :end)"
+    ), {'start': start, 'end': end}).scalar()
+    if not in_default:
+        db.session.execute(text(f"CREATE TABLE {name} PARTITION OF activities {bounds}"))
+        return
+
+    columns = ', '.join(column.name for column in Activity.__table__.columns)
+    in_month = "created_at >= :start AND created_at < :end"
+    db.session.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE"))
+    db.session.execute(text(f"CREATE TABLE {name} (LIKE activities INCLUDING DEFAULTS)"))
+    db.session.execute(text(
+        f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {DEFAULT_PARTITION} WHERE {in_month}"
+    ), {'start': start, 'end': end})
+    db.session.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_month}"), {'start': start, 'end': end})
+    # Índices, PK e FK da tabela pai são criados na partição pelo ATTACH
+    db.session.execute(text(f"ALTER TABLE activities ATTACH PARTITION {name} {bounds}"))
+
+
+def ensure_partitions(months_ahead=None):
+    """
+    Cria as partições do mês corrente e dos próximos `months_ahead` meses
+    (idempotente). Uma partição que falhar é pulada com aviso, sem impedir
+    as demais nem o restante do setup_schema.
+    """
+    ahead = Config.ACTIVITY_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    current = _month_start(datetime.utcnow())
+    created = []
+    for offset in range(ahead + 1):
+        month = _add_months(current, offset)
+        try:
+            with db.session.begin_nested():
+                _create_partition(month)
+        except SQLAlchemyError as e:
+            print(f"⚠️  Partição {partition_name(month)} não criada: {str(e)}")
+            continue
+        created.append(partition_name(month))
+    db.session.commit()
+    return created
+
+
+def convert_to_partitioned():
+    """
+    Converte a tabela activities comum em particionada por mês, numa única
+    transação: renomeia a atual, cria a particionada com as partições
+    necessárias (mais uma DEFAULT de segurança), copia as linhas e recria
+    chave primária (id, created_at), FK (mesmo nome, com o ON DELETE do
+    modelo) e índices. Bloqueia a tabela durante a cópia; em bases grandes,
+    rode em janela de manutenção.
+    """
+    default = utcnow().compile(dialect=db.engine.dialect)
+    columns = ', '.join(column.name for column in Activity.__table__.columns)
+    values = ', '.join(
+        f'COALESCE(created_at, {default})' if column.name == 'created_at' else column.name
+        for column in Activity.__table__.columns
+    )
+
+    db.session.execute(text("LOCK TABLE activities IN ACCESS EXCLUSIVE MODE"))
+    oldest = db.session.execute(text("SELECT min(created_at) FROM activities")).scalar()
+    sequence = db.session.execute(text("SELECT pg_get_serial_sequence('activities', 'id')")).scalar()
+    # Recria a FK de user_id com o nome atual e a ação ON DELETE declarada no modelo
+    fk = next(iter(Activity.__table__.c.user_id.foreign_keys))
+    fk_name = db.session.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conrelid = 'activities'::regclass AND contype = 'f' "
+        "AND conkey = ARRAY[(SELECT attnum FROM pg_attribute "
+        "WHERE attrelid = 'activities'::regclass AND attname = 'user_id')]::smallint[]"
+    )).scalar() or 'activities_user_id_fkey'
+
+    db.session.execute(text("ALTER TABLE activities RENAME TO activities_legacy"))
+    db.session.execute(text(
+        "CREATE TABLE activities (LIKE activities_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+    ))
+    # Como no modelo: inserts que omitem created_at recebem o default em vez de violar a PK
+    db.session.execute(text(f"ALTER TABLE activities ALTER COLUMN created_at SET DEFAULT {default}"))
+
+    month = _month_start(oldest or datetime.utcnow())
+    last = _add_months(_month_start(datetime.utcnow()), Config.ACTIVITY_PARTITIONS_AHEAD)
+    while month <= last:
+        _create_partition(month)
+        month = _add_months(month, 1)
+    db.session.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF activities DEFAULT"))
+
+    db.session.execute(text(f"INSERT INTO activities ({columns}) SELECT {values} FROM activities_legacy"))
+    if sequence:
+        db.session.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY activities.id"))
+    db.session.execute(text("DROP TABLE activities_legacy"))
+
+    db.session.execute(text("ALTER TABLE activities ADD PRIMARY KEY (id, created_at)"))
+    db.session.execute(text(
+        f'ALTER TABLE activities ADD CONSTRAINT "{fk_name}" FOREIGN KEY (user_id) '
+        f'REFERENCES {fk.column.table.name} ({fk.column.name}) ON DELETE {fk.ondelete or "NO ACTION"}'
+    ))
+    for index in Activity.__table__.indexes:
+        index.create(db.session.connection())
+    db.session.commit()
+
+
+def _postgres_apply_retention(cutoff, action):
+    rows = db.session.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'activities'::regclass"
+    )).scalars().all()
+
+    affected = []
+    for name in sorted(rows):
+        month = _month_from_name(name)
+        if name == DEFAULT_PARTITION or month is None or month >= cutoff:
+            continue
+        if action == 'drop':
+            db.session.execute(text(f"DROP TABLE {name}"))
+        else:
+            # Desanexada, a partição vira uma tabela comum de arquivo
+            db.session.execute(text(f"ALTER TABLE activities DETACH PARTITION {name}"))
+            db.session.execute(text(f"ALTER TABLE {name} RENAME TO {archive_name(month)}"))
+        affected.append(name)
+    db.session.commit()
+    return affected
+
+
+# ===== SQLITE: ROTAÇÃO PARA TABELAS DE ARQUIVO MENSAIS =====
+
+def _sqlite_apply_retention(cutoff, action):
+    """Move (ou apaga) as linhas anteriores a `cutoff` para activities_archive_AAAA_MM"""
+    table = Activity.__table__
+    oldest = db.session.query(db.func.min(table.c.created_at)).filter(table.c.created_at < cutoff).scalar()
+    if oldest is None:
+        return []
+
+    affected = []
+    month = _month_start(oldest)
+    while month < cutoff:
+        next_month = _add_months(month, 1)
+        in_month = db.and_(table.c.created_at >= month, table.c.created_at < next_month)
+        if action != 'drop':
+            name = archive_name(month)
+            db.session.execute(text(f"CREATE TABLE IF NOT EXISTS {name} AS SELECT * FROM activities WHERE 0"))
+            archive = Table(name, MetaData(), autoload_with=db.session.connection())
+            db.session.execute(archive.insert().from_select(
+                [column.name for column in table.columns],
+                db.select(*table.columns).where(in_month)
+            ))
+        result = db.session.execute(table.delete().where(in_month))
+        if result.rowcount:
+            affected.append(archive_name(month) if action != 'drop' else f'{month:%Y-%m}')
+        db.session.commit()
+        month = next_month
+    return affected
+
+
+# ===== MANUTENÇÃO E INSPEÇÃO =====
+
+def maintain(retention_months=None, action=None):
+    """
+    Rotina periódica (startup e `flask activities-maintain`): no Postgres
+    garante as partições futuras e desanexa/apaga as antigas; no SQLite
+    move as linhas antigas para tabelas de arquivo.
+    """
+    action = action or Config.ACTIVITY_RETENTION_ACTION
+    cutoff = retention_cutoff(retention_months)
+    summary = {'partitioned': is_partitioned(), 'created': [], 'retired': []}
+
+    if _is_postgres():
+        if not summary['partitioned']:
+            return summary
+        summary['created'] = ensure_partitions()
+        if cutoff is not None:
+            summary['retired'] = _postgres_apply_retention(cutoff, action)
+    elif cutoff is not None:
+        summary['retired'] = _sqlite_apply_retention(cutoff, action)
+    return summary
+
+
+def setup_at_startup():
+    """
+    No Postgres: converte a tabela ainda vazia (instalação nova) e garante
+    as partições dos próximos meses. Tabelas com dados são convertidas só
+    via `flask activities-maintain --convert`.
+    """
+    if not _is_postgres():
+        return
+    if not is_partitioned():
+        if db.session.execute(text("SELECT EXISTS (SELECT 1 FROM activities)")).scalar():
+            print("⚠️  Tabela activities não particionada; rode `flask activities-maintain --convert`.")
+            return
+        convert_to_partitioned()
+    ensure_partitions()
+
+
+def partition_stats():
+    """Partições (Postgres) ou meses (SQLite) da tabela ativa e tabelas de arquivo, com linhas e tamanho"""
+    if _is_postgres():
+        rows = db.session.execute(text(
+            "SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bounds, "
+            "c.reltuples::bigint AS rows, pg_total_relation_size(c.oid) AS bytes, "
+            "c.relispartition AS attached "
+            "FROM pg_class c "
+            "WHERE c.relkind = 'r' AND (c.relispartition AND c.oid IN "
+            "(SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass('activities')) "
+            "OR c.relname LIKE :archive) "
+            "ORDER BY c.relname"
+        ), {'archive': ARCHIVE_PREFIX + '%'}).mappings().all()
+        return [dict(row, rows=max(row['rows'], 0)) for row in rows]
+
+    table = Activity.__table__
+    month = db.func.strftime('%Y-%m', table.c.created_at)
+    stats = [
+        {'name': 'activities', 'bounds': label, 'rows': count, 'bytes': None, 'attached': True}
+        for label, count in db.session.query(month, db.func.count()).group_by(month).order_by(month)
+    ]
+    archives = db.session.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :archive ORDER BY name"
+    ), {'archive': ARCHIVE_PREFIX + '%'}).scalars().all()
+    for name in archives:
+        count = db.session.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+        stats.append({'name': name, 'bounds': None, 'rows': count, 'bytes': None, 'attached': False})
+    return stats
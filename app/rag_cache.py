@@ -0,0 +1,172 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app import db, cache_generations, rag_client
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Name of the shared generation row (cache_generations) bumped on invalidation
+GENERATION_NAME = "rag_response_cache"
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL and hit/miss counters.
+
+    Each gunicorn worker has its own instance. Invalidation goes through a
+    generation number kept in the database: a worker that sees a generation
+    other than its own drops every entry, and a result computed under an
+    older generation is never stored.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation: Optional[int] = None
+        self.synced_at = float("-inf")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Dict[str, Any], generation: Optional[int] = None) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                # Computed before an invalidation that this worker has seen since
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self.invalidations += 1
+            return removed
+
+    def sync(self, generation: int) -> int:
+        """Adopt the shared generation; drops every entry when it changed. Returns entries removed."""
+        with self._lock:
+            self.synced_at = time.monotonic()
+            if generation == self.generation:
+                return 0
+            removed = len(self._entries)
+            self._entries.clear()
+            if self.generation is not None:
+                self.invalidations += 1
+            self.generation = generation
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "generation": self.generation,
+                # Counters above are this worker's only
+                "worker_pid": os.getpid()
+            }
+
+
+response_cache = ResponseCache(Config.RAG_CACHE_SIZE, Config.RAG_CACHE_TTL)
+
+
+def sync_generation(force: bool = False) -> Optional[int]:
+    """
+    Re-read the shared generation at most every RAG_CACHE_SYNC_INTERVAL
+    seconds (or now, with force). If the database can't be read, the
+    worker keeps serving under the generation it already knows.
+    """
+    if not force and time.monotonic() - response_cache.synced_at < Config.RAG_CACHE_SYNC_INTERVAL:
+        return response_cache.generation
+    try:
+        generation = cache_generations.current(GENERATION_NAME)
+    except Exception as e:
+        logger.warning(f"Could not read the RAG cache generation: {str(e)}")
+        return response_cache.generation
+    removed = response_cache.sync(generation)
+    if removed:
+        logger.info(f"RAG response cache dropped {removed} entries (generation {generation})")
+    return generation
+
+
+def invalidate() -> Dict[str, int]:
+    """Bump the shared generation (every worker drops its entries) and clear this worker now"""
+    generation = cache_generations.bump(GENERATION_NAME)
+    db.session.commit()
+    return {"generation": generation, "removed": response_cache.sync(generation)}
+
+
+def cached_query_rag(
+    message: str,
+    top_k: int = 5,
+    use_reranking: bool = True,
+    **kwargs: Any
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    query_rag behind the response cache. Returns (result, hit).
+    Errors are never cached; neither are empty replies.
+    """
+    cached, generation = get_cached(message, top_k, use_reranking)
+    if cached is not None:
+        return cached, True
+
+    result = rag_client.query_rag(message=message, top_k=top_k, use_reranking=use_reranking, **kwargs)
+    store_result(message, top_k, use_reranking, result, generation)
+    return result, False
+
+
+def get_cached(message: str, top_k: int, use_reranking: bool) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+    """
+    Cached answer (or None) plus the generation it was looked up under;
+    pass that generation to store_result for the answer computed on a miss.
+    """
+    generation = sync_generation()
+    key = rag_client.query_key(message, top_k, use_reranking)
+    cached = response_cache.get(key)
+    if cached is not None:
+        logger.info(f"RAG cache hit for key {key}")
+    return cached, generation
+
+
+def store_result(
+    message: str,
+    top_k: int,
+    use_reranking: bool,
+    result: Dict[str, Any],
+    generation: Optional[int] = None
+) -> None:
+    if result.get("reply"):
+        response_cache.set(rag_client.query_key(message, top_k, use_reranking), result, generation)
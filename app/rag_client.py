@@ -1,10 +1,23 @@
+import json
 import logging
+import re
+import os
+import threading
+import time
+import unicodedata
+import mmh3
 import requests
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional, Tuple
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException, Timeout, ConnectionError
+from urllib3.util.retry import Retry
+from config import Config
 
 logger = logging.getLogger(__name__)
 
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
 class RAGClientError(Exception):
     """Base exception for RAG client errors"""
     pass
@@ -17,22 +30,314 @@ class RAGTimeoutError(RAGClientError):
     """Raised when RAG service times out"""
     pass
 
+class RAGCircuitOpenError(RAGServiceUnavailableError):
+    """Raised without calling the RAG service while the circuit breaker is open"""
+    pass
+
+def _build_session() -> requests.Session:
+    """
+    Build a Session whose adapter keeps up to RAG_POOL_SIZE keep-alive
+    connections per host and retries connection errors with backoff.
+
+    Only connect failures are retried (read=0): the request never reached
+    the service, so retrying a POST /ask is safe. Read timeouts and HTTP
+    errors are surfaced immediately.
+    """
+    retry = Retry(
+        total=Config.RAG_MAX_RETRIES,
+        connect=Config.RAG_MAX_RETRIES,
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=Config.RAG_RETRY_BACKOFF,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=Config.RAG_POOL_SIZE,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def _timeouts(read_timeout: float, connect_timeout: Optional[float] = None):
+    return (connect_timeout if connect_timeout is not None else Config.RAG_CONNECT_TIMEOUT, read_timeout)
+
+
+def pool_stats() -> Dict[str, Any]:
+    """
+    Connection pool statistics for the shared session.
+
+    `connections_created` counts sockets opened over the pool's lifetime;
+    with keep-alive working it stays close to the pool size while
+    `requests` keeps growing.
+    """
+    stats = {
+        "pool_size": Config.RAG_POOL_SIZE,
+        "max_retries": Config.RAG_MAX_RETRIES,
+        "connect_timeout": Config.RAG_CONNECT_TIMEOUT,
+        "hosts": []
+    }
+    if _session is None:
+        return stats
+
+    adapter = _session.get_adapter("http://")
+    pools = adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        stats["hosts"].append({
+            "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+            "connections_created": pool.num_connections,
+            "requests": pool.num_requests,
+            # Idle keep-alive sockets plus slots not yet opened
+            "free_slots": pool.pool.qsize() if pool.pool is not None else 0
+        })
+    return stats
+
+
+_WHITESPACE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " \t\n?!.,;:"
+
+
+def normalize_query(message: str) -> str:
+    """
+    Canonical form of a query: accents removed, casefolded, whitespace
+    collapsed and leading/trailing punctuation stripped, so
+    "Bezerro com  diarréia?" and "bezerro com diarreia" are the same query.
+    """
+    decomposed = unicodedata.normalize("NFKD", message)
+    without_accents = "".join(char for char in decomposed if not unicodedata.combining(char))
+    collapsed = _WHITESPACE.sub(" ", without_accents.casefold())
+    return collapsed.strip(_EDGE_PUNCTUATION)
+
+
+def query_key(message: str, top_k: int, use_reranking: bool) -> str:
+    """128-bit murmur3 hash of the normalized query and retrieval parameters"""
+    raw = f"{normalize_query(message)}\x1f{top_k}\x1f{int(bool(use_reranking))}"
+    return format(mmh3.hash128(raw.encode("utf-8"), signed=False), "032x")
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller (leader)
+    runs the upstream request, later callers wait for its outcome. Results
+    and errors are delivered to every waiter; each waiter has its own
+    timeout, so a slow upstream call does not hold anyone past their limit.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.upstream = 0
+        self.coalesced = 0
+        self.waiter_timeouts = 0
+        self.errors = 0
+
+    def do(self, key: str, fn, wait_timeout: Optional[float] = None) -> Dict[str, Any]:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.upstream += 1
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+
+        if leader:
+            try:
+                flight.result = fn()
+            except BaseException as e:
+                flight.error = e
+                with self._lock:
+                    self.errors += 1
+                raise
+            finally:
+                with self._lock:
+                    del self._flights[key]
+                flight.done.set()
+            return dict(flight.result)
+
+        if not flight.done.wait(wait_timeout):
+            with self._lock:
+                self.waiter_timeouts += 1
+            raise RAGTimeoutError(f"Timed out after {wait_timeout}s waiting for an identical in-flight RAG query")
+        if flight.error is not None:
+            error = flight.error
+            if isinstance(error, RAGClientError):
+                raise type(error)(str(error)) from error
+            raise RAGClientError(f"Unexpected error: {str(error)}") from error
+        return dict(flight.result)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "upstream_requests": self.upstream,
+                "coalesced_requests": self.coalesced,
+                "in_flight": len(self._flights),
+                "waiter_timeouts": self.waiter_timeouts,
+                "upstream_errors": self.errors
+            }
+
+
+_single_flight = SingleFlight()
+
+
+def coalescing_stats() -> Dict[str, Any]:
+    """Upstream vs coalesced /ask calls since the process started."""
+    return _single_flight.stats()
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `failure_threshold` consecutive availability
+    failures (connection errors, 503s, timeouts). While open, calls fail
+    immediately with RAGCircuitOpenError. After `cooldown` seconds (or
+    as soon as the health prober sees the service back) it goes half-open
+    and lets a single trial call through: success closes it, failure
+    re-opens it for another cool-down.
+
+    Other client errors (4xx, bad payloads) mean the service answered,
+    so they count as successes for availability purposes.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("RAG circuit breaker closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+                self.times_opened += 1
+                logger.warning(f"RAG circuit breaker opened after {self.failures} failures")
+
+    def service_recovered(self) -> None:
+        """Health probe succeeded: skip the rest of the cool-down."""
+        with self._lock:
+            if self.state == self.OPEN:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+
+    def call(self, fn):
+        if not self.allow():
+            raise RAGCircuitOpenError("RAG service circuit is open; failing fast")
+        try:
+            result = fn()
+        except (RAGServiceUnavailableError, RAGTimeoutError):
+            self.record_failure()
+            raise
+        except BaseException:
+            self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "failure_threshold": self.failure_threshold,
+                "cooldown_seconds": self.cooldown,
+                "retry_in_seconds": round(retry_in, 1),
+                "times_opened": self.times_opened,
+                "rejected_calls": self.rejected
+            }
+
+
+breaker = CircuitBreaker(Config.RAG_BREAKER_FAILURES, Config.RAG_BREAKER_COOLDOWN)
+
+
 def query_rag(
     message: str,
     top_k: int = 5,
     use_reranking: bool = True,
     rag_service_url: str = "http://localhost:8000",
-    timeout: int = 60
+    timeout: int = 60,
+    connect_timeout: Optional[float] = None,
+    coalesce: bool = True
 ) -> Dict[str, Any]:
     """
     Query the RAG service via HTTP.
+
+    Concurrent calls for the same normalized query share one upstream
+    request (see SingleFlight) unless `coalesce` is False.
     
     Args:
         message: The user's query message
         top_k: Number of top results to return
         use_reranking: Whether to use reranking
         rag_service_url: Base URL of the RAG service
-        timeout: Request timeout in seconds
+        timeout: Read timeout in seconds
+        connect_timeout: Connect timeout in seconds (defaults to RAG_CONNECT_TIMEOUT)
+        coalesce: Share the upstream request with identical in-flight queries
         
     Returns:
         Dictionary with 'reply' and 'sources' keys
@@ -42,6 +347,27 @@ def query_rag(
         RAGTimeoutError: If the request times out
         RAGClientError: For other client errors
     """
+    def upstream() -> Dict[str, Any]:
+        return breaker.call(
+            lambda: _query_upstream(message, top_k, use_reranking, rag_service_url, timeout, connect_timeout)
+        )
+
+    if not coalesce:
+        return upstream()
+
+    connect = connect_timeout if connect_timeout is not None else Config.RAG_CONNECT_TIMEOUT
+    key = f"{rag_service_url}|{query_key(message, top_k, use_reranking)}"
+    return _single_flight.do(key, upstream, wait_timeout=timeout + connect)
+
+
+def _query_upstream(
+    message: str,
+    top_k: int,
+    use_reranking: bool,
+    rag_service_url: str,
+    timeout: int,
+    connect_timeout: Optional[float]
+) -> Dict[str, Any]:
     url = f"{rag_service_url}/ask"
     
     payload = {
@@ -52,11 +378,10 @@ def query_rag(
     
     try:
         logger.info(f"Querying RAG service at {url} with message: {message[:50]}...")
-        response = requests.post(
+        response = get_session().post(
             url,
             json=payload,
-            timeout=timeout,
-            headers={"Content-Type": "application/json"}
+            timeout=_timeouts(timeout, connect_timeout)
         )
         
         response.raise_for_status()
@@ -93,14 +418,16 @@ def query_rag(
 
 def check_rag_health(
     rag_service_url: str = "http://localhost:8000",
-    timeout: int = 5
+    timeout: int = 5,
+    connect_timeout: Optional[float] = None
 ) -> Dict[str, Any]:
     """
     Check the health of the RAG service.
     
     Args:
         rag_service_url: Base URL of the RAG service
-        timeout: Request timeout in seconds
+        timeout: Read timeout in seconds
+        connect_timeout: Connect timeout in seconds (defaults to RAG_CONNECT_TIMEOUT)
         
     Returns:
         Dictionary with health status information
@@ -108,7 +435,7 @@ def check_rag_health(
     url = f"{rag_service_url}/health"
     
     try:
-        response = requests.get(url, timeout=timeout)
+        response = get_session().get(url, timeout=_timeouts(timeout, connect_timeout))
         response.raise_for_status()
         return {
             "status": "healthy",
@@ -121,3 +448,196 @@ def check_rag_health(
             "error": str(e)
         }
 
+
+_health_state: Optional[Dict[str, Any]] = None
+_health_lock = threading.Lock()
+_prober_pid: Optional[int] = None
+
+
+def _probe(rag_service_url: str) -> None:
+    global _health_state
+    status = check_rag_health(rag_service_url=rag_service_url, timeout=Config.RAG_HEALTH_TIMEOUT)
+    if status["status"] == "healthy":
+        breaker.service_recovered()
+    else:
+        breaker.record_failure()
+    status["checked_at"] = time.time()
+    with _health_lock:
+        _health_state = status
+
+
+def _probe_loop(rag_service_url: str, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            _probe(rag_service_url)
+        except Exception as e:
+            logger.error(f"RAG health prober error: {str(e)}")
+
+
+def start_health_prober(rag_service_url: str, interval: Optional[float] = None) -> None:
+    """
+    Start the background prober for this process (idempotent). Keyed on
+    the pid so a worker forked from a preloaded master starts its own.
+    """
+    global _prober_pid
+    with _health_lock:
+        if _prober_pid == os.getpid():
+            return
+        _prober_pid = os.getpid()
+    thread = threading.Thread(
+        target=_probe_loop,
+        args=(rag_service_url, interval or Config.RAG_HEALTH_INTERVAL),
+        name="rag-health-prober",
+        daemon=True
+    )
+    thread.start()
+
+
+def get_health_status(rag_service_url: str) -> Dict[str, Any]:
+    """
+    Last health probe result plus circuit breaker state, served from
+    memory. Only the very first call in a process probes synchronously.
+    """
+    start_health_prober(rag_service_url)
+    with _health_lock:
+        state = _health_state
+    if state is None:
+        _probe(rag_service_url)
+        with _health_lock:
+            state = _health_state
+
+    status = dict(state)
+    status["age_seconds"] = round(time.time() - state["checked_at"], 1)
+    status["circuit"] = breaker.stats()
+    if breaker.state == CircuitBreaker.OPEN:
+        status["status"] = "unhealthy"
+    return status
+
+
+
+def _parse_sse(lines: Iterator[str]) -> Iterator[Tuple[str, str]]:
+    """Parse a Server-Sent Events line stream into (event, data) pairs."""
+    event, data = "message", []
+    for line in lines:
+        if line is None:
+            continue
+        if line == "":
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith(":"):
+            continue
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].lstrip())
+    if data:
+        yield event, "\n".join(data)
+
+
+def stream_rag(
+    message: str,
+    top_k: int = 5,
+    use_reranking: bool = True,
+    rag_service_url: str = "http://localhost:8000",
+    timeout: int = 60,
+    connect_timeout: Optional[float] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Query the RAG service in streaming mode (POST /ask/stream, SSE).
+
+    The upstream sends `token` events ({"text": ...}), one `sources` event
+    ({"sources": [...]}) and a final `done`. The connection is opened
+    before this function returns, so connection/HTTP errors raise the same
+    exceptions as query_rag; the returned iterator then yields
+    (event, payload) pairs as they arrive. `timeout` bounds the wait
+    between chunks, not the whole answer.
+
+    If the RAG service has no streaming endpoint (404), falls back to
+    query_rag and yields the full reply as a single token.
+    """
+    url = f"{rag_service_url}/ask/stream"
+    payload = {
+        "query": message,
+        "top_k": top_k,
+        "use_reranking": use_reranking
+    }
+
+    if not breaker.allow():
+        raise RAGCircuitOpenError("RAG service circuit is open; failing fast")
+
+    try:
+        logger.info(f"Streaming RAG query at {url} with message: {message[:50]}...")
+        response = get_session().post(
+            url,
+            json=payload,
+            timeout=_timeouts(timeout, connect_timeout),
+            headers={"Accept": "text/event-stream"},
+            stream=True
+        )
+        if response.status_code == 404:
+            response.close()
+        else:
+            response.raise_for_status()
+
+    except ConnectionError as e:
+        logger.error(f"Failed to connect to RAG service at {rag_service_url}: {str(e)}")
+        breaker.record_failure()
+        raise RAGServiceUnavailableError(f"RAG service is not available at {rag_service_url}") from e
+
+    except Timeout as e:
+        logger.error(f"RAG service timeout after {timeout}s: {str(e)}")
+        breaker.record_failure()
+        raise RAGTimeoutError(f"RAG service timeout after {timeout}s") from e
+
+    except requests.exceptions.HTTPError as e:
+        logger.error(f"RAG service HTTP error: {e.response.status_code}")
+        if e.response.status_code == 503:
+            breaker.record_failure()
+            raise RAGServiceUnavailableError("RAG service returned 503") from e
+        breaker.record_success()
+        raise RAGClientError(f"RAG service HTTP error: {e.response.status_code}") from e
+
+    except RequestException as e:
+        logger.error(f"RAG service request error: {str(e)}")
+        breaker.record_success()
+        raise RAGClientError(f"RAG service request error: {str(e)}") from e
+
+    except BaseException:
+        # Anything else must still settle the breaker, or a HALF_OPEN trial stays in flight forever
+        breaker.record_failure()
+        raise
+
+    breaker.record_success()
+    if response.status_code == 404:
+        # Outside the try: query_rag settles the breaker for its own request
+        result = query_rag(
+            message=message,
+            top_k=top_k,
+            use_reranking=use_reranking,
+            rag_service_url=rag_service_url,
+            timeout=timeout,
+            connect_timeout=connect_timeout
+        )
+        return iter([
+            ("token", {"text": result["reply"]}),
+            ("sources", {"sources": result["sources"]}),
+            ("done", {})
+        ])
+    return _stream_events(response, timeout)
+
+
+def _stream_events(response: requests.Response, timeout: int) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    try:
+        for event, data in _parse_sse(response.iter_lines(decode_unicode=True)):
+            try:
+                yield event, json.loads(data)
+            except ValueError:
+                yield event, {"text": data}
+    except Timeout as e:
+        raise RAGTimeoutError(f"RAG service stalled for more than {timeout}s") from e
+    except RequestException as e:
+        raise RAGClientError(f"RAG stream interrupted: {str(e)}") from e
+    finally:
+        response.close()
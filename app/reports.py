@@ -0,0 +1,428 @@
+from app import db
+from app.models import Animal, Weighing, AnimalWeightState
+
+# Quantidade de pesagens retornadas no histórico de cada animal
+REPORT_HISTORY_SIZE = 10
+
+# Faixas de GMD (kg/dia) usadas no relatório de desempenho, da maior para a menor
+GMD_BUCKETS = [
+    (1.4, 'Excelente'),
+    (1.0, 'Bom'),
+    (0.6, 'Regular'),
+]
+GMD_FALLBACK_DAYS = 30
+
+
+def _is_sqlite():
+    return db.session.get_bind().dialect.name == 'sqlite'
+
+
+def _round(expr, digits):
+    """ROUND portável: Postgres só arredonda NUMERIC; devolve FLOAT para o JSON"""
+    return db.cast(db.func.round(db.cast(expr, db.Numeric), digits), db.Float)
+
+
+def _as_date(expr):
+    """Parte de data de um DATETIME (CAST AS DATE no SQLite viraria número)"""
+    if _is_sqlite():
+        return db.func.date(expr)
+    return db.cast(expr, db.Date)
+
+
+def _days_between(later, earlier):
+    """Diferença em dias inteiros entre duas datas"""
+    if _is_sqlite():
+        return db.cast(db.func.julianday(later) - db.func.julianday(earlier), db.Integer)
+    return later - earlier
+
+
+def _is_set(column):
+    """Equivalente SQL de `if valor:` para colunas numéricas (não nulo e diferente de zero)"""
+    return db.and_(column.isnot(None), column != 0)
+
+
+def _ranked_weighings(user_id=None, limit=REPORT_HISTORY_SIZE):
+    """Subquery com as últimas `limit` pesagens de cada animal (ROW_NUMBER por animal_id)"""
+    row_number = db.func.row_number().over(
+        partition_by=Weighing.animal_id,
+        order_by=(Weighing.date.desc(), Weighing.id.desc())
+    ).label('rn')
+
+    ranked = db.session.query(
+        Weighing.animal_id.label('animal_id'),
+        Weighing.id.label('weighing_id'),
+        Weighing.date.label('date'),
+        Weighing.weight.label('weight'),
+        row_number
+    ).join(Animal, Animal.id == Weighing.animal_id)
+
+    if user_id is not None:
+        ranked = ranked.filter(Animal.user_id == user_id)
+
+    ranked = ranked.subquery()
+    return db.session.query(ranked).filter(ranked.c.rn <= limit).subquery()
+
+
+def _report_entry(animal, history):
+    """Calcula tendência, meta e alerta de um animal a partir do histórico já ordenado"""
+    current_weight = None
+    last_date = None
+
+    if history:
+        current_weight = history[0]['weight']
+        last_date = history[0]['date']
+    elif animal.entry_weight is not None:
+        current_weight = animal.entry_weight
+
+    previous_weight = None
+    if len(history) > 1:
+        previous_weight = history[1]['weight']
+    elif animal.entry_weight is not None:
+        previous_weight = animal.entry_weight
+
+    entry_weight = animal.entry_weight
+    target_weight = animal.target_weight
+
+    weight_change = None
+    if current_weight is not None and previous_weight is not None:
+        weight_change = round(current_weight - previous_weight, 2)
+
+    difference_to_target = None
+    percentage_to_target = None
+    status = 'Sem dados suficientes'
+    message = 'Cadastre pesagens para obter um acompanhamento preciso.'
+    trend = 'stable'
+
+    if current_weight is not None:
+        status = 'Acompanhamento em progresso'
+        message = 'Sem meta definida para este animal.' if not target_weight else ''
+
+        if weight_change is not None:
+            if weight_change > 0.5:
+                trend = 'up'
+            elif weight_change < -0.5:
+                trend = 'down'
+                status = 'Alerta: perda de peso'
+                message = f'Perdeu {abs(weight_change):.2f} kg desde a última pesagem.'
+
+        if target_weight:
+            difference_to_target = round(target_weight - current_weight, 2)
+
+            if entry_weight is not None:
+                total_needed = target_weight - entry_weight
+                if total_needed > 0:
+                    achieved = current_weight - entry_weight
+                    percentage_to_target = round(min(max(achieved / total_needed, 0), 1) * 100, 2)
+
+            if difference_to_target <= 0:
+                status = 'Meta atingida'
+                message = 'Animal já atingiu ou superou o peso de abate.'
+                trend = 'up'
+            elif status != 'Alerta: perda de peso':
+                status = 'Em progresso'
+                message = f'Faltam {abs(difference_to_target):.2f} kg para atingir a meta de abate.'
+
+    return {
+        'id': animal.id,
+        'name': animal.name or animal.earring,
+        'currentWeight': current_weight,
+        'entryWeight': entry_weight,
+        'targetWeight': target_weight,
+        'differenceToTarget': difference_to_target,
+        'percentageToTarget': percentage_to_target,
+        'weightChange': weight_change,
+        'lastWeighingDate': last_date,
+        'status': status,
+        'message': message,
+        'trend': trend,
+        'history': history
+    }
+
+
+def build_weight_report(user_id=None):
+    """
+    Monta o relatório de peso (/api/weight/report) com uma única consulta:
+    animais do usuário + últimas pesagens de cada um via função de janela.
+    """
+    ranked = _ranked_weighings(user_id)
+
+    query = db.session.query(
+        Animal.id,
+        Animal.name,
+        Animal.earring,
+        Animal.entry_weight,
+        Animal.target_weight,
+        ranked.c.weighing_id,
+        ranked.c.date,
+        ranked.c.weight
+    ).outerjoin(ranked, ranked.c.animal_id == Animal.id)
+
+    if user_id is not None:
+        query = query.filter(Animal.user_id == user_id)
+
+    rows = query.order_by(Animal.id, ranked.c.rn).all()
+
+    # Agrupar as linhas por animal mantendo a ordem (animal_id, rn)
+    grouped = []
+    for row in rows:
+        if not grouped or grouped[-1][0].id != row.id:
+            grouped.append((row, []))
+        if row.weighing_id is not None:
+            grouped[-1][1].append({
+                'id': row.weighing_id,
+                'date': row.date.strftime('%Y-%m-%d') if row.date else None,
+                'weight': row.weight
+            })
+
+    report_animals = []
+    current_weights = []
+    reached_target_count = 0
+    losing_weight_count = 0
+    without_data_count = 0
+
+    for animal, history in grouped:
+        entry = _report_entry(animal, history)
+        report_animals.append(entry)
+
+        if entry['currentWeight'] is None:
+            without_data_count += 1
+            continue
+        current_weights.append(entry['currentWeight'])
+        if entry['status'] == 'Meta atingida':
+            reached_target_count += 1
+        if entry['weightChange'] is not None and entry['weightChange'] < -0.5:
+            losing_weight_count += 1
+
+    average_weight = round(sum(current_weights) / len(current_weights), 2) if current_weights else None
+    alerts = [animal for animal in report_animals if 'Alerta' in animal['status']]
+
+    return {
+        'summary': {
+            'totalCattle': len(report_animals),
+            'withTarget': sum(1 for a in report_animals if a['targetWeight'] not in (None, '')),
+            'reachedTarget': reached_target_count,
+            'losingWeight': losing_weight_count,
+            'withoutData': without_data_count,
+            'averageWeight': average_weight
+        },
+        'alerts': alerts,
+        'animals': report_animals
+    }
+
+
+def build_performance_report(user_id=None):
+    """
+    Monta o relatório de desempenho (/api/weight/performance-report) em uma única
+    instrução SQL: última pesagem e a anterior via LAG, ganho, GMD, faixa de status
+    e os totais do resumo (agregados de janela sobre o próprio resultado).
+    """
+    # 1) Última pesagem de cada animal, com a pesagem anterior via LAG
+    chronological = (Weighing.date, Weighing.id)
+    weighings = db.session.query(
+        Weighing.animal_id.label('animal_id'),
+        Weighing.weight.label('weight'),
+        Weighing.date.label('date'),
+        db.func.row_number().over(
+            partition_by=Weighing.animal_id,
+            order_by=(Weighing.date.desc(), Weighing.id.desc())
+        ).label('rn'),
+        db.func.lag(Weighing.weight).over(partition_by=Weighing.animal_id, order_by=chronological).label('previous_weight'),
+        db.func.lag(Weighing.date).over(partition_by=Weighing.animal_id, order_by=chronological).label('previous_date')
+    ).join(Animal, Animal.id == Weighing.animal_id)
+    if user_id is not None:
+        weighings = weighings.filter(Animal.user_id == user_id)
+    weighings = weighings.subquery()
+    latest = db.session.query(weighings).filter(weighings.c.rn == 1).subquery()
+
+    # 2) Pesos atual/anterior com os mesmos fallbacks de antes
+    #    (peso de entrada e data de cadastro quando há só uma pesagem)
+    uses_entry_as_previous = db.and_(
+        latest.c.weight.isnot(None), latest.c.previous_weight.is_(None), _is_set(Animal.entry_weight)
+    )
+    animals = db.session.query(
+        Animal.id.label('id'),
+        Animal.name.label('name'),
+        Animal.earring.label('earring'),
+        Animal.breed.label('breed'),
+        db.case(
+            (latest.c.weight.isnot(None), latest.c.weight),
+            (_is_set(Animal.entry_weight), Animal.entry_weight),
+        ).label('current_weight'),
+        latest.c.date.label('last_date'),
+        db.case(
+            (latest.c.previous_weight.isnot(None), latest.c.previous_weight),
+            (uses_entry_as_previous, Animal.entry_weight),
+        ).label('previous_weight'),
+        db.case(
+            (latest.c.previous_weight.isnot(None), latest.c.previous_date),
+            (uses_entry_as_previous, _as_date(Animal.created_at)),
+        ).label('previous_date')
+    ).outerjoin(latest, latest.c.animal_id == Animal.id)
+    if user_id is not None:
+        animals = animals.filter(Animal.user_id == user_id)
+    animals = animals.subquery()
+
+    # 3) Ganho de peso e intervalo em dias
+    gains = db.session.query(
+        animals,
+        _round(animals.c.current_weight - animals.c.previous_weight, 2).label('weight_gain'),
+        _days_between(animals.c.last_date, animals.c.previous_date).label('days')
+    ).filter(animals.c.current_weight.isnot(None)).subquery()
+
+    # 4) GMD (assume 30 dias quando faltam datas)
+    gmds = db.session.query(
+        gains,
+        db.case(
+            (gains.c.weight_gain.is_(None), None),
+            (gains.c.days.is_(None), _round(gains.c.weight_gain / float(GMD_FALLBACK_DAYS), 3)),
+            (gains.c.days > 0, _round(gains.c.weight_gain / gains.c.days, 3)),
+            else_=0.0
+        ).label('gmd')
+    ).subquery()
+
+    # 5) Faixa de status
+    status = db.case(
+        (gmds.c.gmd.is_(None), 'Sem dados'),
+        *[(gmds.c.gmd >= threshold, label) for threshold, label in GMD_BUCKETS],
+        else_='Crítico'
+    )
+    statuses = db.session.query(gmds, status.label('status')).subquery()
+
+    # 6) Totais do resumo na mesma passada
+    def count_status(label):
+        return db.func.sum(db.case((statuses.c.status == label, 1), else_=0)).over()
+
+    rows = db.session.query(
+        statuses,
+        db.func.count().over().label('total'),
+        count_status('Excelente').label('excellent'),
+        count_status('Bom').label('good'),
+        count_status('Regular').label('regular'),
+        count_status('Crítico').label('critical'),
+        _round(db.func.avg(statuses.c.gmd).over(), 3).label('average_gmd')
+    ).order_by(statuses.c.id).all()
+
+    performance_data = [
+        {
+            'id': f"#{row.id}",
+            'name': row.name or row.earring,
+            'breed': row.breed or 'N/A',
+            'previous_weight': row.previous_weight,
+            'current_weight': row.current_weight,
+            'weight_gain': row.weight_gain,
+            'gmd': row.gmd,
+            'status': row.status
+        }
+        for row in rows
+    ]
+
+    first = rows[0] if rows else None
+    return {
+        'animals': performance_data,
+        'summary': {
+            'total': first.total if first else 0,
+            'excellent': int(first.excellent) if first else 0,
+            'good': int(first.good) if first else 0,
+            'regular': int(first.regular) if first else 0,
+            'critical': int(first.critical) if first else 0,
+            'average_gmd': first.average_gmd if first else None
+        }
+    }
+
+
+# Situações derivadas do peso atual e os aliases aceitos no filtro `situations`
+DEFAULT_CURRENT_WEIGHT = 350
+SITUATION_ALIASES = {
+    'Acima da média': {'aboveAverage', 'acima da média', 'acima da media'},
+    'Abaixo da média': {'belowAverage', 'abaixo da média', 'abaixo da media'},
+    'Estável': {'stable', 'estável', 'estavel'},
+    'Sem histórico': {'sem histórico'},
+    'Sem dados': {'sem dados'},
+}
+
+
+def _situations_matching(situations_filter):
+    """Situações (como gravadas no relatório) aceitas pelo filtro recebido do frontend"""
+    return [
+        situation for situation, aliases in SITUATION_ALIASES.items()
+        if aliases & set(situations_filter)
+    ]
+
+
+def build_cattle_filter(user_id=None, herd_id=None, min_weight=200, max_weight=700,
+                        breeds=None, situations=None, limit=None, after_id=None):
+    """
+    Filtra o gado (/api/cattle/filter) inteiramente no banco: peso atual (lido da
+    projeção animal_weight_states), situação derivada, faixa de peso, raça e
+    situação viram colunas/WHERE, com paginação por id (keyset).
+
+    Retorna (itens, último_id_se_houver_mais_páginas).
+    """
+    last_weight = AnimalWeightState.last_weight
+
+    current_weight = db.case(
+        (last_weight.isnot(None), last_weight),
+        (_is_set(Animal.entry_weight), Animal.entry_weight),
+        else_=DEFAULT_CURRENT_WEIGHT
+    )
+    situation = db.case(
+        (db.and_(last_weight.isnot(None), last_weight > 400), 'Acima da média'),
+        (db.and_(last_weight.isnot(None), last_weight < 300), 'Abaixo da média'),
+        (last_weight.isnot(None), 'Estável'),
+        (_is_set(Animal.entry_weight), 'Sem histórico'),
+        else_='Sem dados'
+    )
+
+    cattle = db.session.query(
+        Animal.id.label('id'),
+        Animal.name.label('name'),
+        Animal.breed.label('breed'),
+        Animal.gender.label('gender'),
+        Animal.status.label('status'),
+        Animal.created_at.label('created_at'),
+        current_weight.label('current_weight'),
+        situation.label('situation')
+    ).outerjoin(AnimalWeightState, AnimalWeightState.animal_id == Animal.id)
+
+    if user_id is not None:
+        cattle = cattle.filter(Animal.user_id == user_id)
+    if herd_id:
+        cattle = cattle.filter(Animal.herd_id == herd_id)
+    if breeds:
+        breed_normalized = db.func.lower(db.func.coalesce(Animal.breed, ''))
+        cattle = cattle.filter(db.or_(*[breed_normalized.contains(b, autoescape=True) for b in breeds]))
+    if after_id is not None:
+        cattle = cattle.filter(Animal.id > after_id)
+
+    cattle = cattle.subquery()
+    query = db.session.query(cattle).filter(
+        cattle.c.current_weight >= min_weight,
+        cattle.c.current_weight <= max_weight
+    )
+    if situations:
+        query = query.filter(cattle.c.situation.in_(_situations_matching(situations)))
+
+    query = query.order_by(cattle.c.id)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    rows = query.all()
+
+    last_id = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        last_id = rows[-1].id
+
+    items = [
+        {
+            'id': row.id,
+            'name': row.name,
+            'currentWeight': row.current_weight,
+            'breed': row.breed,
+            'situation': row.situation,
+            'entry_date': row.created_at.strftime('%Y-%m-%d') if row.created_at else None,
+            'gender': row.gender,
+            'status': row.status
+        }
+        for row in rows
+    ]
+    return items, last_id
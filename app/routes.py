@@ -1,15 +1,31 @@
-from flask import request, jsonify, make_response
-from app import app, db
+from flask import Blueprint, request, jsonify, make_response, Response, g
+from app import db
 from app.models import User, PasswordReset, Animal, Weighing, Activity, Herd, UserHerd
 from app import rag_client
+from app import rag_cache
+from app import reports
+from app import projections
+from app import outbox
+from app import audit
+from app import identity
+from app import serving
+from app.pagination import (
+    PaginationError, encode_cursor, decode_id_cursor, parse_limit,
+    wants_cursor_pagination, paginate_request, with_page_headers
+)
 from config import Config
+import hmac
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+bp = Blueprint('routes', __name__)
+
 # ===== ROTA PARA CHAT IA (RAG) =====
 
-@app.route('/api/chat/diagnose', methods=['POST', 'OPTIONS'])
+@bp.route('/api/chat/diagnose', methods=['POST', 'OPTIONS'])
+@serving.without_db_limit
 def chat_diagnose():
     """
     Chat endpoint that proxies requests to the RAG service.
@@ -24,8 +40,8 @@ def chat_diagnose():
         if not message or not isinstance(message, str) or not message.strip():
             return make_response(jsonify({'message': 'Mensagem inválida'}), 400)
 
-        # Query RAG service via HTTP client
-        result = rag_client.query_rag(
+        # Query RAG service via HTTP client (respostas repetidas vêm do cache)
+        result, cache_hit = rag_cache.cached_query_rag(
             message=message.strip(),
             top_k=5,
             use_reranking=True,
@@ -33,14 +49,19 @@ def chat_diagnose():
             timeout=Config.RAG_SERVICE_TIMEOUT
         )
 
-        return make_response(jsonify(result), 200)
+        response = make_response(jsonify(result), 200)
+        response.headers['X-Cache'] = 'HIT' if cache_hit else 'MISS'
+        return response
 
     except rag_client.RAGServiceUnavailableError as e:
         logger.error(f"RAG service unavailable: {str(e)}")
-        return make_response(jsonify({
+        response = make_response(jsonify({
             'message': 'Serviço de diagnóstico temporariamente indisponível. Verifique se o servidor RAG está rodando.',
             'error': str(e)
         }), 503)
+        if isinstance(e, rag_client.RAGCircuitOpenError):
+            response.headers['Retry-After'] = str(int(rag_client.breaker.stats()['retry_in_seconds']) or 1)
+        return response
     
     except rag_client.RAGTimeoutError as e:
         logger.error(f"RAG service timeout: {str(e)}")
@@ -63,18 +84,129 @@ def chat_diagnose():
         }), 500)
 
 
-@app.route('/api/health/rag', methods=['GET'])
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _sse_from_result(result):
+    yield _sse('token', {'text': result.get('reply', '')})
+    yield _sse('sources', {'sources': result.get('sources', [])})
+    yield _sse('done', {})
+
+
+def _sse_from_rag(events, message, generation):
+    """Repassa os eventos do RAG ao cliente e guarda a resposta completa no cache"""
+    reply, sources = [], []
+    completed = False
+    try:
+        for event, payload in events:
+            if event == 'done':
+                completed = True
+                break
+            if event == 'token':
+                reply.append(payload.get('text', ''))
+            elif event == 'sources':
+                sources = payload.get('sources', [])
+            yield _sse(event, payload)
+            if event == 'error':
+                return
+    except rag_client.RAGClientError as e:
+        logger.error(f"RAG stream failed: {str(e)}")
+
+    if not completed:
+        # Resposta incompleta: avisa o cliente e não guarda no cache
+        yield _sse('error', {'message': 'A resposta do diagnóstico foi interrompida. Tente novamente.'})
+        return
+
+    rag_cache.store_result(message, 5, True, {'reply': ''.join(reply), 'sources': sources}, generation)
+    yield _sse('done', {})
+
+
+@bp.route('/api/chat/diagnose/stream', methods=['POST', 'OPTIONS'])
+@serving.without_db_limit
+def chat_diagnose_stream():
+    """
+    Variante em streaming (Server-Sent Events) de /api/chat/diagnose: os
+    trechos da resposta são repassados à medida que o RAG os gera.
+    Eventos: token {"text"}, sources {"sources"}, done, error {"message"}.
+    """
+    try:
+        if request.method == 'OPTIONS':
+            return make_response()
+
+        data = request.get_json() or {}
+        message = data.get('message') or data.get('query')
+
+        if not message or not isinstance(message, str) or not message.strip():
+            return make_response(jsonify({'message': 'Mensagem inválida'}), 400)
+        message = message.strip()
+
+        cached, generation = rag_cache.get_cached(message, 5, True)
+        if cached is not None:
+            body, cache_status = _sse_from_result(cached), 'HIT'
+        else:
+            # A conexão com o RAG é aberta aqui: falhas viram 503/504 antes do stream começar
+            events = rag_client.stream_rag(
+                message=message,
+                top_k=5,
+                use_reranking=True,
+                rag_service_url=Config.RAG_SERVICE_URL,
+                timeout=Config.RAG_SERVICE_TIMEOUT
+            )
+            body, cache_status = _sse_from_rag(events, message, generation), 'MISS'
+
+        response = Response(body, mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.headers['X-Cache'] = cache_status
+        return response
+
+    except rag_client.RAGServiceUnavailableError as e:
+        logger.error(f"RAG service unavailable: {str(e)}")
+        response = make_response(jsonify({
+            'message': 'Serviço de diagnóstico temporariamente indisponível. Verifique se o servidor RAG está rodando.',
+            'error': str(e)
+        }), 503)
+        if isinstance(e, rag_client.RAGCircuitOpenError):
+            response.headers['Retry-After'] = str(int(rag_client.breaker.stats()['retry_in_seconds']) or 1)
+        return response
+
+    except rag_client.RAGTimeoutError as e:
+        logger.error(f"RAG service timeout: {str(e)}")
+        return make_response(jsonify({
+            'message': 'O serviço de diagnóstico demorou muito para responder. Tente novamente.',
+            'error': str(e)
+        }), 504)
+
+    except rag_client.RAGClientError as e:
+        logger.error(f"RAG client error: {str(e)}")
+        return make_response(jsonify({
+            'message': 'Erro ao processar sua solicitação.',
+            'error': str(e)
+        }), 500)
+
+    except Exception as e:
+        logger.error(f"Unexpected error in streaming chat endpoint: {str(e)}", exc_info=True)
+        return make_response(jsonify({
+            'message': f'Erro inesperado ao processar diagnóstico: {str(e)}'
+        }), 500)
+
+
+@bp.route('/api/health/rag', methods=['GET'])
+@serving.without_db_limit
 def rag_health():
     """
     Health check endpoint for the RAG service.
-    Returns the status of the RAG service connection.
+    Returns the status of the RAG service connection, as last seen by the
+    background prober (no live request per hit).
     """
     try:
-        health_status = rag_client.check_rag_health(
-            rag_service_url=Config.RAG_SERVICE_URL,
-            timeout=5
-        )
+        health_status = rag_client.get_health_status(Config.RAG_SERVICE_URL)
         
+        health_status['pool'] = rag_client.pool_stats()
+        health_status['cache'] = rag_cache.response_cache.stats()
+        health_status['coalescing'] = rag_client.coalescing_stats()
+
         status_code = 200 if health_status['status'] == 'healthy' else 503
         return make_response(jsonify(health_status), status_code)
     
@@ -85,7 +217,41 @@ def rag_health():
             'error': str(e)
         }), 500)
 
-from app.email_service import email_service, sms_service
+@bp.route('/api/chat/cache', methods=['GET'])
+def rag_cache_stats():
+    """Estatísticas do cache de respostas do diagnóstico (do worker que atendeu: cada um tem o seu)"""
+    return make_response(jsonify(rag_cache.response_cache.stats()), 200)
+
+
+@bp.route('/api/chat/cache/invalidate', methods=['POST'])
+def invalidate_rag_cache():
+    """
+    Limpa o cache de respostas do diagnóstico em todos os workers: a geração
+    compartilhada é incrementada no banco e cada worker descarta o seu cache
+    ao vê-la (em até RAG_CACHE_SYNC_INTERVAL segundos).
+    Chamar sempre que a base de conhecimento do RAG for reindexada.
+    """
+    try:
+        token = Config.RAG_CACHE_ADMIN_TOKEN
+        if not token:
+            # Sem token configurado o endpoint fica desligado (qualquer um poderia limpar o cache)
+            return make_response(jsonify({'message': 'Invalidação do cache desabilitada: defina RAG_CACHE_ADMIN_TOKEN'}), 403)
+        provided = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(provided.encode('utf-8'), token.encode('utf-8')):
+            return make_response(jsonify({'message': 'Não autorizado'}), 403)
+
+        result = rag_cache.invalidate()
+        logger.info(f"RAG response cache invalidated (generation {result['generation']}, {result['removed']} entries in this worker)")
+        return make_response(jsonify({
+            'message': 'Cache de diagnóstico invalidado com sucesso',
+            'generation': result['generation'],
+            'removed': result['removed']
+        }), 200)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error invalidating RAG cache: {str(e)}")
+        return make_response(jsonify({'message': f'Erro ao invalidar cache: {str(e)}'}), 500)
+
 import os
 from werkzeug.utils import secure_filename
 from datetime import datetime
@@ -103,7 +269,7 @@ def cors_headers(f):
     decorated_function.__name__ = f.__name__
     return decorated_function
 
-@app.route('/', methods=['GET'])
+@bp.route('/', methods=['GET'])
 def home():
     return make_response(jsonify({
         'message': 'BoviCare API is running!', 
@@ -135,11 +301,11 @@ def home():
         }
     }), 200)
 
-@app.route('/test', methods=['GET'])
+@bp.route('/test', methods=['GET'])
 def test():
     return make_response(jsonify({'message': 'test route'}), 200)
 
-@app.route('/test-cors', methods=['GET', 'POST', 'OPTIONS'])
+@bp.route('/test-cors', methods=['GET', 'POST', 'OPTIONS'])
 def test_cors():
     if request.method == 'OPTIONS':
         response = make_response()
@@ -154,7 +320,7 @@ def test_cors():
         'headers': dict(request.headers)
     }), 200)
 
-@app.route('/users/register', methods=['POST'])
+@bp.route('/users/register', methods=['POST'])
 def create_user():
     try:
         print(f"DEBUG: Recebendo requisição POST em /users/register")
@@ -197,7 +363,7 @@ def create_user():
         print(f"DEBUG: Erro ao criar usuário: {str(e)}")
         return make_response(jsonify({'message': f'Error creating user: {str(e)}'}), 500)
 
-@app.route('/users/login', methods=['POST'])
+@bp.route('/users/login', methods=['POST'])
 def login_user():
     try:
         print(f"DEBUG: Recebendo requisição POST em /users/login")
@@ -248,29 +414,36 @@ def login_user():
             'success': False
         }), 500)
 
-@app.route('/users', methods=['GET'])
+@bp.route('/users', methods=['GET'])
 def get_users():
     try:
         print('DEBUG: Received GET /users request from', request.remote_addr)
+        if wants_cursor_pagination(request.args):
+            page = paginate_request(User.query, [User.created_at, User.id], request.args, count_key=('users',))
+            response = make_response(jsonify([user.json() for user in page.items]), 200)
+            return with_page_headers(response, page)
+
         users = User.query.all()
         return make_response(jsonify([user.json() for user in users]), 200)
+    except PaginationError as e:
+        return make_response(jsonify({'message': str(e)}), 400)
     except Exception as e:
         return make_response(jsonify({'message': f'Error fetching users: {str(e)}'}), 500)
 
-@app.route('/users/<int:id>', methods=['GET'])
+@bp.route('/users/<int:id>', methods=['GET'])
 def get_user(id):
     try:
-        user = User.query.filter_by(id=id).first()
+        user = identity.load_user(id)
         if user:
             return make_response(jsonify({'user': user.json()}), 200)
         return make_response(jsonify({'message': 'User not found'}), 404)
     except Exception as e:
         return make_response(jsonify({'message': f'Error fetching user: {str(e)}'}), 500)
 
-@app.route('/users/<int:id>', methods=['PUT'])
+@bp.route('/users/<int:id>', methods=['PUT'])
 def update_user(id):
     try:
-        user = User.query.filter_by(id=id).first()
+        user = db.session.get(User, id)
         if user:
             data = request.get_json()
             user.username = data.get('username', user.username)
@@ -283,21 +456,24 @@ def update_user(id):
     except Exception as e:
         return make_response(jsonify({'message': f'Error updating user: {str(e)}'}), 500)
 
-@app.route('/users/<int:id>', methods=['DELETE'])
+@bp.route('/users/<int:id>', methods=['DELETE'])
 def delete_user(id):
     try:
-        user = User.query.filter_by(id=id).first()
+        user = db.session.get(User, id)
         if user:
+            # Animais e atividades ficam sem usuário, vínculos e códigos de reset saem pelo ON DELETE
+            projections.track_user_deleted(user.id)
             db.session.delete(user)
             db.session.commit()
             return make_response(jsonify({'message': 'User deleted'}), 200)
         return make_response(jsonify({'message': 'User not found'}), 404)
     except Exception as e:
+        db.session.rollback()
         return make_response(jsonify({'message': f'Error deleting user: {str(e)}'}), 500)
 
 # ===== ROTAS DE RECUPERAÇÃO DE SENHA =====
 
-@app.route('/auth/forgot-password', methods=['POST'])
+@bp.route('/auth/forgot-password', methods=['POST'])
 def forgot_password():
     """Inicia processo de recuperação de senha"""
     try:
@@ -326,40 +502,28 @@ def forgot_password():
         # Invalidar códigos anteriores do usuário
         PasswordReset.query.filter_by(user_id=user.id, used=False).update({'used': True})
         
-        # Criar novo código de recuperação
+        # Criar novo código de recuperação; o envio fica na fila (mesma transação)
         reset_request = PasswordReset(user_id=user.id, method=method)
         db.session.add(reset_request)
+        outbox.enqueue_password_reset(user, reset_request)
         db.session.commit()
-        
-        # Enviar código
-        success = False
-        if method == 'email':
-            success = email_service.send_password_reset_email(
-                user.email, 
-                reset_request.code, 
-                user.username
-            )
-        elif method == 'sms':
-            success = sms_service.send_password_reset_sms(
-                user.phone, 
-                reset_request.code, 
-                user.username
-            )
-        
-        if success:
-            return make_response(jsonify({
-                'message': 'Código enviado com sucesso',
-                'method': method,
-                'expires_in': 30  # minutos
-            }), 200)
-        else:
-            return make_response(jsonify({'message': 'Erro ao enviar código'}), 500)
+
+        # O e-mail/SMS é enviado em segundo plano pelos workers da fila
+        outbox.ensure_inprocess_workers()
+        outbox.wake()
+
+        return make_response(jsonify({
+            'message': 'Código enviado com sucesso',
+            'method': method,
+            'expires_in': 30  # minutos
+        }), 200)
             
     except Exception as e:
+        db.session.rollback()
         print(f"DEBUG: Erro em forgot-password: {str(e)}")
         return make_response(jsonify({'message': f'Erro interno: {str(e)}'}), 500)
 
-@app.route('/auth/verify-code', methods=['POST'])
+@bp.route('/auth/verify-code', methods=['POST'])
 def verify_code():
     """Verifica código de recuperação"""
     try:
@@ -409,7 +573,7 @@ def verify_code():
         print(f"DEBUG: Erro em verify-code: {str(e)}")
         return make_response(jsonify({'message': f'Erro interno: {str(e)}'}), 500)
 
-@app.route('/auth/reset-password', methods=['POST'])
+@bp.route('/auth/reset-password', methods=['POST'])
 def reset_password():
     """Redefine a senha do usuário"""
     try:
@@ -457,7 +621,7 @@ def reset_password():
 
 # ===== ROTA PARA UPLOAD DE FOTO DE PERFIL =====
 
-@app.route('/api/profile/photo', methods=['POST', 'OPTIONS'])
+@bp.route('/api/profile/photo', methods=['POST', 'OPTIONS'])
 def upload_profile_photo():
     """Upload de foto de perfil"""
     try:
@@ -508,17 +672,16 @@ def upload_profile_photo():
         # URL relativa para acessar a imagem
         photo_url = f"/uploads/profiles/{unique_filename}"
 
-        # Tentar identificar usuário atual pelo header
-        user_id = request.headers.get('X-User-ID') or request.headers.get('X-User-Id') or request.args.get('user_id')
-        if user_id and str(user_id).isdigit():
+        # Usuário atual (X-User-Id ou user_id), resolvido antes da rota
+        if g.user_id is not None:
             try:
-                user = User.query.filter_by(id=int(user_id)).first()
+                user = db.session.get(User, g.user_id)
                 if user:
                     user.profile_photo_url = photo_url
                     db.session.commit()
             except Exception as save_err:
                 db.session.rollback()
-                print(f"DEBUG: Falha ao salvar URL da foto no usuário {user_id}: {save_err}")
+                print(f"DEBUG: Falha ao salvar URL da foto no usuário {g.user_id}: {save_err}")
 
         return make_response(jsonify({
             'message': 'Foto de perfil atualizada com sucesso',
@@ -531,7 +694,7 @@ def upload_profile_photo():
 
 # ===== ROTA PARA SERVIR ARQUIVOS ESTÁTICOS =====
 
-@app.route('/uploads/<path:filename>')
+@bp.route('/uploads/<path:filename>')
 def uploaded_file(filename):
     """Servir arquivos de upload"""
     from flask import send_from_directory
@@ -543,24 +706,15 @@ def uploaded_file(filename):
 
 # ===== ENDPOINTS ADICIONAIS PARA O FRONTEND =====
 
-@app.route('/api/profile', methods=['GET'])
+@bp.route('/api/profile', methods=['GET'])
 def get_profile():
     """Obter dados do perfil do usuário"""
     try:
-        # Obter ID do usuário do header ou parâmetro
-        header_user_id = request.headers.get('X-User-ID') or request.headers.get('X-User-Id')
-        param_user_id = request.args.get('user_id')
-        user_id = None
-        if header_user_id and str(header_user_id).isdigit():
-            user_id = int(header_user_id)
-        elif param_user_id and str(param_user_id).isdigit():
-            user_id = int(param_user_id)
-
-        if user_id is None:
+        if g.user_id is None:
             return make_response(jsonify({'message': 'ID do usuário não fornecido'}), 400)
         
-        # Buscar usuário no banco de dados
-        user = User.query.filter_by(id=user_id).first()
+        # Usuário da requisição (cache de usuários)
+        user = identity.current_user()
         
         if not user:
             return make_response(jsonify({'message': 'Usuário não encontrado'}), 404)
@@ -581,22 +735,15 @@ def get_profile():
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao obter perfil: {str(e)}'}), 500)
 
-@app.route('/api/user/current', methods=['GET'])
+@bp.route('/api/user/current', methods=['GET'])
 def get_current_user():
     """Obter dados do usuário atual"""
     try:
-        # Obter ID do usuário do header Authorization ou parâmetro
-        user_id = request.headers.get('X-User-ID')
-        
-        if not user_id:
-            # Se não tiver header, tentar obter do parâmetro da query
-            user_id = request.args.get('user_id')
-        
-        if not user_id:
+        if g.user_id is None:
             return make_response(jsonify({'message': 'ID do usuário não fornecido'}), 400)
         
-        # Buscar usuário no banco de dados
-        user = User.query.filter_by(id=int(user_id)).first()
+        # Usuário da requisição (cache de usuários)
+        user = identity.current_user()
         
         if not user:
             return make_response(jsonify({'message': 'Usuário não encontrado'}), 404)
@@ -623,36 +770,30 @@ def get_current_user():
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao obter usuário atual: {str(e)}'}), 500)
 
-@app.route('/api/user/stats', methods=['GET'])
+@bp.route('/api/user/stats', methods=['GET'])
 def get_user_stats():
     """Obter estatísticas do usuário"""
     try:
-        # Obter ID do usuário do header ou parâmetro
-        user_id = request.headers.get('X-User-ID') or request.args.get('user_id')
-        
-        if not user_id:
+        if g.user_id is None:
             return make_response(jsonify({'message': 'ID do usuário não fornecido'}), 400)
         
-        # Buscar usuário no banco de dados
-        user = User.query.filter_by(id=int(user_id)).first()
+        # Usuário da requisição (cache de usuários)
+        user = identity.current_user()
         
         if not user:
             return make_response(jsonify({'message': 'Usuário não encontrado'}), 404)
         
-        # Buscar estatísticas reais (por enquanto com dados básicos)
-        from app.models import Herd
-        
-        farms_count = Herd.query.join(UserHerd).filter(UserHerd.user_id == user.id).count() if hasattr(user, 'id') else 0
-        cattle_count = Animal.query.filter(Animal.user_id == user.id).count() if hasattr(user, 'id') else 0
+        # Estatísticas lidas dos contadores mantidos (user_counters)
+        counters = projections.get_user_counters(user.id)
         
         return make_response(jsonify({
-            'farmsRegistered': farms_count,
-            'cattleRegistered': cattle_count
+            'farmsRegistered': counters['total_herds'],
+            'cattleRegistered': counters['total_animals']
         }), 200)
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao obter estatísticas: {str(e)}'}), 500)
 
-@app.route('/api/user/profile', methods=['PUT', 'OPTIONS'])
+@bp.route('/api/user/profile', methods=['PUT', 'OPTIONS'])
 def update_user_profile():
     """Atualizar perfil do usuário"""
     try:
@@ -666,6 +807,9 @@ def update_user_profile():
         updated_data = request.json
         
         # TODO: Salvar dados no banco de dados
+        # O front relê o perfil logo em seguida: descarta a cópia em cache
+        if g.user_id is not None:
+            identity.user_cache.invalidate(g.user_id)
         
         return make_response(jsonify({
             'message': 'Perfil atualizado com sucesso',
@@ -676,7 +820,7 @@ def update_user_profile():
         print(f"DEBUG: Erro ao atualizar perfil: {str(e)}")
         return make_response(jsonify({'message': f'Erro ao atualizar perfil: {str(e)}'}), 500)
 
-@app.route('/api/user/change-password', methods=['PUT', 'OPTIONS'])
+@bp.route('/api/user/change-password', methods=['PUT', 'OPTIONS'])
 def change_password():
     """Alterar senha do usuário"""
     try:
@@ -689,13 +833,13 @@ def change_password():
         data = request.get_json()
         current_password = data.get('current_password')
         new_password = data.get('new_password')
-        user_id = data.get('user_id')
+        user_id = data.get('user_id') or g.user_id
         
-        if not current_password or not new_password or not user_id:
+        if not current_password or not new_password or not user_id or not str(user_id).isdigit():
             return make_response(jsonify({'message': 'Senha atual, nova senha e ID do usuário são obrigatórios'}), 400)
         
-        # Buscar usuário no banco de dados
-        user = User.query.filter_by(id=int(user_id)).first()
+        # Modelo completo (o cache não guarda o hash da senha)
+        user = db.session.get(User, int(user_id))
         
         if not user:
             return make_response(jsonify({'message': 'Usuário não encontrado'}), 404)
@@ -723,18 +867,12 @@ def change_password():
 
 # ===== ROTAS PARA CADASTRO DE GADO =====
 
-@app.route('/api/cattle', methods=['POST'])
+@bp.route('/api/cattle', methods=['POST'])
 def add_cattle():
     """Cadastrar novo gado"""
     try:
         data = request.get_json()
-        header_user_id = request.headers.get('X-User-Id') or request.headers.get('X-User-ID')
-        payload_user_id = data.get('user_id')
-        owner_user_id = None
-        if header_user_id and str(header_user_id).isdigit():
-            owner_user_id = int(header_user_id)
-        elif payload_user_id and str(payload_user_id).isdigit():
-            owner_user_id = int(payload_user_id)
+        owner_user_id = identity.request_user_id(data.get('user_id'))
 
         if owner_user_id is None:
             return make_response(jsonify({'message': 'Usuário não informado para criação do gado'}), 400)
@@ -777,26 +915,11 @@ def add_cattle():
         )
         
         db.session.add(new_animal)
+        projections.track_animal_change(None, projections.animal_snapshot(new_animal))
+        # Registrar atividade de criação (gravada no mesmo commit)
+        audit.record('create', 'animal', f"Animal criado: {new_animal.earring or new_animal.name}", obj=new_animal,
+                     user_id=owner_user_id)
         db.session.commit()
-        
-        # Registrar atividade de criação
-        try:
-            user_id = request.headers.get('X-User-Id')
-            username = request.headers.get('X-User-Name')
-            description = f"Animal criado: {new_animal.earring or new_animal.name or new_animal.id}"
-            activity = Activity(
-                user_id=int(user_id) if user_id and str(user_id).isdigit() else None,
-                username=username,
-                action='create',
-                object_type='animal',
-                object_id=new_animal.id,
-                description=description
-            )
-            db.session.add(activity)
-            db.session.commit()
-        except Exception as log_error:
-            db.session.rollback()
-            print(f"DEBUG: Falha ao registrar atividade de criação de gado: {log_error}")
 
         return make_response(jsonify({
             'message': 'Gado cadastrado com sucesso',
@@ -810,17 +933,11 @@ def add_cattle():
             'message': f'Erro ao cadastrar gado: {str(e)}'
         }), 500)
 
-@app.route('/api/cattle/<int:cattle_id>', methods=['PUT'])
+@bp.route('/api/cattle/<int:cattle_id>', methods=['PUT'])
 def update_cattle(cattle_id):
     """Atualizar dados de um gado"""
     try:
-        header_user_id = request.headers.get('X-User-Id') or request.headers.get('X-User-ID')
-        param_user_id = request.args.get('user_id')
-        effective_user_id = None
-        if header_user_id and str(header_user_id).isdigit():
-            effective_user_id = int(header_user_id)
-        elif param_user_id and str(param_user_id).isdigit():
-            effective_user_id = int(param_user_id)
+        effective_user_id = g.user_id
 
         cattle_query = Animal.query.filter_by(id=cattle_id)
         if effective_user_id is not None:
@@ -852,26 +969,9 @@ def update_cattle(cattle_id):
             from datetime import datetime
             cattle.birth_date = datetime.strptime(data['birthDate'], '%Y-%m-%d').date()
         
+        audit.record('update', 'animal', f"Animal atualizado: {cattle.earring or cattle.name or cattle.id}", object_id=cattle.id)
         db.session.commit()
 
-        try:
-            user_id = request.headers.get('X-User-Id')
-            username = request.headers.get('X-User-Name')
-            description = f"Animal atualizado: {cattle.earring or cattle.name or cattle.id}"
-            activity = Activity(
-                user_id=int(user_id) if user_id and str(user_id).isdigit() else None,
-                username=username,
-                action='update',
-                object_type='animal',
-                object_id=cattle.id,
-                description=description
-            )
-            db.session.add(activity)
-            db.session.commit()
-        except Exception as log_error:
-            db.session.rollback()
-            print(f"DEBUG: Falha ao registrar atividade de atualização de gado: {log_error}")
-
         return make_response(jsonify({
             'message': 'Gado atualizado com sucesso',
             'data': cattle.json()
@@ -883,7 +983,7 @@ def update_cattle(cattle_id):
             'message': f'Erro ao atualizar gado: {str(e)}'
         }), 500)
 
-@app.route('/api/cattle/<int:cattle_id>', methods=['DELETE', 'OPTIONS'])
+@bp.route('/api/cattle/<int:cattle_id>', methods=['DELETE', 'OPTIONS'])
 def delete_cattle(cattle_id):
     """Deletar um gado"""
     try:
@@ -893,16 +993,10 @@ def delete_cattle(cattle_id):
         print(f"DEBUG: Recebendo requisição DELETE para gado ID: {cattle_id}")
         
         # Importar modelos necessários
-        from app.models import Animal, Weighing, Movement, Reproduction, HealthRecord, Attachment
+        from app.models import Animal
         
         # Verificar se o gado existe
-        header_user_id = request.headers.get('X-User-Id')
-        payload_user_id = request.json.get('user_id') if request.is_json else None
-        effective_user_id = None
-        if header_user_id and str(header_user_id).isdigit():
-            effective_user_id = int(header_user_id)
-        elif payload_user_id and str(payload_user_id).isdigit():
-            effective_user_id = int(payload_user_id)
+        effective_user_id = identity.request_user_id(request.json.get('user_id') if request.is_json else None)
 
         query = Animal.query.filter_by(id=cattle_id)
         if effective_user_id is not None:
@@ -915,30 +1009,14 @@ def delete_cattle(cattle_id):
         
         print(f"DEBUG: Gado encontrado: {cattle.name}")
         
-        # Deletar registros relacionados manualmente primeiro
         try:
-            # Deletar pesagens
-            Weighing.query.filter_by(animal_id=cattle_id).delete()
-            print(f"DEBUG: Pesagens deletadas")
-            
-            # Deletar movimentos
-            Movement.query.filter_by(animal_id=cattle_id).delete()
-            print(f"DEBUG: Movimentos deletados")
-            
-            # Deletar reproduções
-            Reproduction.query.filter_by(animal_id=cattle_id).delete()
-            print(f"DEBUG: Reproduções deletadas")
-            
-            # Deletar registros de saúde
-            HealthRecord.query.filter_by(animal_id=cattle_id).delete()
-            print(f"DEBUG: Registros de saúde deletados")
-            
-            # Deletar anexos
-            Attachment.query.filter_by(animal_id=cattle_id).delete()
-            print(f"DEBUG: Anexos deletados")
-            
-            # Deletar o gado
+            # Deletar o gado (pesagens, movimentações, vacinas, etc. saem pelo ON DELETE CASCADE)
+            counters_before = projections.animal_snapshot(cattle)
             db.session.delete(cattle)
+            projections.track_animal_change(counters_before, None)
+            # Registrar atividade de exclusão (gravada no mesmo commit)
+            audit.record('delete', 'animal', f"Animal excluído: {cattle.earring or cattle.name or cattle_id}", object_id=cattle_id,
+                         user_id=effective_user_id)
             db.session.commit()
             print(f"DEBUG: Gado {cattle_id} deletado com sucesso")
             
@@ -946,24 +1024,6 @@ def delete_cattle(cattle_id):
             print(f"DEBUG: Erro específico ao deletar: {str(delete_error)}")
             db.session.rollback()
             raise delete_error
-        # Registrar atividade de exclusão
-        try:
-            user_id = request.headers.get('X-User-Id')
-            username = request.headers.get('X-User-Name')
-            description = f"Animal excluído: {cattle.earring or cattle.name or cattle_id}"
-            activity = Activity(
-                user_id=int(user_id) if user_id and str(user_id).isdigit() else None,
-                username=username,
-                action='delete',
-                object_type='animal',
-                object_id=cattle_id,
-                description=description
-            )
-            db.session.add(activity)
-            db.session.commit()
-        except Exception as log_error:
-            db.session.rollback()
-            print(f"DEBUG: Falha ao registrar atividade de exclusão de gado: {log_error}")
 
         return make_response(jsonify({
             'message': 'Gado deletado com sucesso'
@@ -976,22 +1036,28 @@ def delete_cattle(cattle_id):
             'message': f'Erro ao deletar gado: {str(e)}'
         }), 500)
 
-@app.route('/api/cattle', methods=['GET'])
+@bp.route('/api/cattle', methods=['GET'])
 def get_cattle():
     """Listar todos os gados"""
     try:
         
-        header_user_id = request.headers.get('X-User-Id') or request.headers.get('X-User-ID')
-        query_param_user_id = request.args.get('user_id', type=int)
-        user_id = None
-        if header_user_id and str(header_user_id).isdigit():
-            user_id = int(header_user_id)
-        elif query_param_user_id:
-            user_id = query_param_user_id
+        user_id = g.user_id
 
         query = Animal.query
         if user_id is not None:
             query = query.filter(Animal.user_id == user_id)
+
+        if wants_cursor_pagination(request.args):
+            page = paginate_request(query, [Animal.created_at, Animal.id], request.args, count_key=('animals', user_id))
+            cattle_list = [animal.json() for animal in page.items]
+            response = make_response(jsonify({
+                'cattle': cattle_list,
+                'total': len(cattle_list),
+                'next_cursor': page.next_cursor,
+                'total_count': page.total
+            }), 200)
+            return with_page_headers(response, page)
+
         animals = query.all()
         cattle_list = [animal.json() for animal in animals]
         
@@ -1000,6 +1066,8 @@ def get_cattle():
             'total': len(cattle_list)
         }), 200)
         
+    except PaginationError as e:
+        return make_response(jsonify({'message': str(e)}), 400)
     except Exception as e:
         return make_response(jsonify({
             'message': f'Erro ao obter lista de gados: {str(e)}'
@@ -1007,7 +1075,7 @@ def get_cattle():
 
 # ===== ROTAS PARA ACOMPANHAMENTO DE PESO =====
 
-@app.route('/api/weight', methods=['POST'])
+@bp.route('/api/weight', methods=['POST'])
 def add_weight():
     try:
         data = request.json
@@ -1043,26 +1111,14 @@ def add_weight():
         )
         
         db.session.add(weighing)
+        projections.refresh_weight_states([cattle.id])
+        # Registrar atividade de pesagem (gravada no mesmo commit)
+        audit.record(
+            'weigh', 'weighing',
+            f"Peso registrado: {float(weight):.0f} Kg para animal {cattle.earring or cattle.name or cattle_id}",
+            obj=weighing
+        )
         db.session.commit()
-
-        # Registrar atividade de pesagem
-        try:
-            user_id = request.headers.get('X-User-Id')
-            username = request.headers.get('X-User-Name')
-            description = f"Peso registrado: {float(weight):.0f} Kg para animal {cattle.earring or cattle.name or cattle_id}"
-            activity = Activity(
-                user_id=int(user_id) if user_id and str(user_id).isdigit() else None,
-                username=username,
-                action='weigh',
-                object_type='weighing',
-                object_id=weighing.id,
-                description=description
-            )
-            db.session.add(activity)
-            db.session.commit()
-        except Exception as log_error:
-            db.session.rollback()
-            print(f"DEBUG: Falha ao registrar atividade de pesagem: {log_error}")
         
         return make_response(jsonify({
             'message': 'Peso adicionado com sucesso',
@@ -1078,7 +1134,7 @@ def add_weight():
         db.session.rollback()
         return make_response(jsonify({'message': f'Erro ao adicionar peso: {str(e)}'}), 500)
 
-@app.route('/api/weight/<int:cattle_id>', methods=['GET'])
+@bp.route('/api/weight/<int:cattle_id>', methods=['GET'])
 def get_weight_history(cattle_id):
     try:
         # Verificar se o gado existe
@@ -1107,7 +1163,7 @@ def get_weight_history(cattle_id):
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao obter histórico: {str(e)}'}), 500)
 
-@app.route('/api/weight/stats', methods=['GET'])
+@bp.route('/api/weight/stats', methods=['GET'])
 def get_weight_stats():
     try:
         # TODO: Implementar lógica para calcular estatísticas reais
@@ -1120,291 +1176,52 @@ def get_weight_stats():
     except Exception as e:
         return make_response(jsonify({'message': f'Erro ao obter estatísticas: {str(e)}'}), 500)
 
-@app.route('/api/weight/report', methods=['GET'])
+@bp.route('/api/weight/report', methods=['GET'])
 def get_weight_report():
     """Gerar relatório automático de peso baseado nas metas e histórico"""
     try:
-        header_user_id = request.headers.get('X-User-Id') or request.headers.get('X-User-ID')
-        param_user_id = request.args.get('user_id', type=int)
-        effective_user_id = None
-        if header_user_id and str(header_user_id).isdigit():
-            effective_user_id = int(header_user_id)
-        elif param_user_id:
-            effective_user_id = param_user_id
+        effective_user_id = g.user_id
 
-        query = Animal.query
-        if effective_user_id is not None:
-            query = query.filter(Animal.user_id == effective_user_id)
-
-        animals = query.all()
-
-        report_animals = []
-        losing_weight_count = 0
-        reached_target_count = 0
-        with_target_count = 0
-        without_data_count = 0
-        current_weights = []
-
-        for animal in animals:
-            weighings = (
-                Weighing.query
-                .filter_by(animal_id=animal.id)
-                .order_by(Weighing.date.desc())
-                .all()
-            )
-
-            history = [
-                {
-                    'id': weighing.id,
-                    'date': weighing.date.strftime('%Y-%m-%d') if weighing.date else None,
-                    'weight': weighing.weight
-                }
-                for weighing in weighings[:10]
-            ]
-
-            current_weight = None
-            last_date = None
-
-            if history:
-                current_weight = history[0]['weight']
-                last_date = history[0]['date']
-            elif animal.entry_weight is not None:
-                current_weight = animal.entry_weight
-            else:
-                without_data_count += 1
-
-            previous_weight = None
-            if len(history) > 1:
-                previous_weight = history[1]['weight']
-            elif animal.entry_weight is not None:
-                previous_weight = animal.entry_weight
-
-            entry_weight = animal.entry_weight
-            target_weight = animal.target_weight
-
-            weight_change = None
-            if current_weight is not None and previous_weight is not None:
-                weight_change = round(current_weight - previous_weight, 2)
-
-            difference_to_target = None
-            percentage_to_target = None
-            status = 'Sem dados suficientes'
-            message = 'Cadastre pesagens para obter um acompanhamento preciso.'
-            trend = 'stable'
-
-            if current_weight is not None:
-                current_weights.append(current_weight)
-                status = 'Acompanhamento em progresso'
-                message = 'Sem meta definida para este animal.' if not target_weight else ''
-
-                if weight_change is not None:
-                    if weight_change > 0.5:
-                        trend = 'up'
-                    elif weight_change < -0.5:
-                        trend = 'down'
-                        losing_weight_count += 1
-                        status = 'Alerta: perda de peso'
-                        message = f'Perdeu {abs(weight_change):.2f} kg desde a última pesagem.'
-
-                if target_weight:
-                    with_target_count += 1
-                    difference_to_target = round(target_weight - current_weight, 2)
-
-                    if entry_weight is not None:
-                        total_needed = target_weight - entry_weight
-                        if total_needed > 0:
-                            achieved = current_weight - entry_weight
-                            percentage_to_target = round(min(max(achieved / total_needed, 0), 1) * 100, 2)
-
-                    if difference_to_target <= 0:
-                        reached_target_count += 1
-                        status = 'Meta atingida'
-                        message = 'Animal já atingiu ou superou o peso de abate.'
-                        trend = 'up'
-                    elif status != 'Alerta: perda de peso':
-                        status = 'Em progresso'
-                        message = f'Faltam {abs(difference_to_target):.2f} kg para atingir a meta de abate.'
-
-            report_animals.append({
-                'id': animal.id,
-                'name': animal.name or animal.earring,
-                'currentWeight': current_weight,
-                'entryWeight': entry_weight,
-                'targetWeight': target_weight,
-                'differenceToTarget': difference_to_target,
-                'percentageToTarget': percentage_to_target,
-                'weightChange': weight_change,
-                'lastWeighingDate': last_date,
-                'status': status,
-                'message': message,
-                'trend': trend,
-                'history': history
-            })
-
-        total_cattle = len(report_animals)
-        average_weight = round(sum(current_weights) / len(current_weights), 2) if current_weights else None
-
-        alerts = [animal for animal in report_animals if 'Alerta' in animal['status']]
-
-        report = {
-            'summary': {
-                'totalCattle': total_cattle,
-                'withTarget': sum(1 for a in report_animals if a['targetWeight'] not in (None, '')),
-                'reachedTarget': reached_target_count,
-                'losingWeight': losing_weight_count,
-                'withoutData': without_data_count,
-                'averageWeight': average_weight
-            },
-            'alerts': alerts,
-            'animals': report_animals
-        }
+        # Uma única consulta (ROW_NUMBER por animal) em vez de uma por animal
+        report = reports.build_weight_report(effective_user_id)
 
         return make_response(jsonify(report), 200)
     except Exception as e:
         print(f"DEBUG: Erro ao gerar relatório de peso: {str(e)}")
         return make_response(jsonify({'message': f'Erro ao gerar relatório: {str(e)}'}), 500)
 
-@app.route('/api/weight/performance-report', methods=['GET'])
+@bp.route('/api/weight/performance-report', methods=['GET'])
 def get_performance_report():
     """Gerar relatório de desempenho (engorda) com GMD e status"""
     try:
-        header_user_id = request.headers.get('X-User-Id') or request.headers.get('X-User-ID')
-        param_user_id = request.args.get('user_id', type=int)
-        effective_user_id = None
-        if header_user_id and str(header_user_id).isdigit():
-            effective_user_id = int(header_user_id)
-        elif param_user_id:
-            effective_user_id = param_user_id
-
-        query = Animal.query
-        if effective_user_id is not None:
-            query = query.filter(Animal.user_id == effective_user_id)
-
-        animals = query.all()
-        performance_data = []
-
-        for animal in animals:
-            # Buscar as duas últimas pesagens
-            weighings = (
-                Weighing.query
-                .filter_by(animal_id=animal.id)
-                .order_by(Weighing.date.desc())
-                .limit(2)
-                .all()
-            )
+        effective_user_id = g.user_id
 
-            current_weight = None
-            previous_weight = None
-            current_date = None
-            previous_date = None
-
-            if len(weighings) >= 2:
-                current_weight = weighings[0].weight
-                current_date = weighings[0].date
-                previous_weight = weighings[1].weight
-                previous_date = weighings[1].date
-            elif len(weighings) == 1:
-                current_weight = weighings[0].weight
-                current_date = weighings[0].date
-                # Usar peso de entrada como peso anterior
-                if animal.entry_weight:
-                    previous_weight = animal.entry_weight
-                    # Usar data de criação do animal como data anterior
-                    previous_date = animal.created_at.date() if animal.created_at else None
-            else:
-                # Se não há pesagens, usar peso de entrada como atual
-                if animal.entry_weight:
-                    current_weight = animal.entry_weight
-                else:
-                    continue  # Pular animais sem dados de peso
-
-            # Calcular ganho de peso
-            weight_gain = None
-            gmd = None
-            status = 'Sem dados'
-
-            if current_weight is not None and previous_weight is not None:
-                weight_gain = round(current_weight - previous_weight, 2)
-                
-                # Calcular GMD (Ganho Médio Diário)
-                if current_date and previous_date:
-                    days_diff = (current_date - previous_date).days
-                    if days_diff > 0:
-                        gmd = round(weight_gain / days_diff, 3)
-                    else:
-                        gmd = 0
-                else:
-                    # Assumir 30 dias se não tiver datas
-                    gmd = round(weight_gain / 30, 3)
-
-                # Determinar status baseado no GMD
-                if gmd >= 1.4:
-                    status = 'Excelente'
-                elif gmd >= 1.0:
-                    status = 'Bom'
-                elif gmd >= 0.6:
-                    status = 'Regular'
-                else:
-                    status = 'Crítico'
-
-            performance_data.append({
-                'id': f"#{animal.id}",
-                'name': animal.name or animal.earring,
-                'breed': animal.breed or 'N/A',
-                'previous_weight': previous_weight,
-                'current_weight': current_weight,
-                'weight_gain': weight_gain,
-                'gmd': gmd,
-                'status': status
-            })
+        # Últimas pesagens (LAG), GMD, status e resumo em uma única instrução SQL
+        report = reports.build_performance_report(effective_user_id)
 
-        # Calcular resumo
-        total_animals = len(performance_data)
-        excellent_count = sum(1 for a in performance_data if a['status'] == 'Excelente')
-        good_count = sum(1 for a in performance_data if a['status'] == 'Bom')
-        regular_count = sum(1 for a in performance_data if a['status'] == 'Regular')
-        critical_count = sum(1 for a in performance_data if a['status'] == 'Crítico')
-        
-        avg_gmd = None
-        gmd_values = [a['gmd'] for a in performance_data if a['gmd'] is not None]
-        if gmd_values:
-            avg_gmd = round(sum(gmd_values) / len(gmd_values), 3)
-
-        return make_response(jsonify({
-            'animals': performance_data,
-            'summary': {
-                'total': total_animals,
-                'excellent': excellent_count,
-                'good': good_count,
-                'regular': regular_count,
-                'critical': critical_count,
-                'average_gmd': avg_gmd
-            }
-        }), 200)
+        return make_response(jsonify(report), 200)
 
     except Exception as e:
         print(f"DEBUG: Erro ao gerar relatório de desempenho: {str(e)}")
         return make_response(jsonify({'message': f'Erro ao gerar relatório: {str(e)}'}), 500)
 
-@app.route('/api/cattle/filter', methods=['POST'])
+@bp.route('/api/cattle/filter', methods=['POST'])
 def filter_cattle():
     try:
         filters = request.json or {}
         
-        user_id = request.headers.get('X-User-Id') or filters.get('userId')
         herd_id = filters.get('herdId')
-        query = Animal.query
-        if user_id and str(user_id).isdigit():
-            query = query.filter(Animal.user_id == int(user_id))
-        if herd_id:
-            query = query.filter_by(herd_id=herd_id)
+        effective_user_id = identity.request_user_id(filters.get('userId'))
+
+        try:
+            min_weight = float(filters.get('minWeight', 200))
+            max_weight = float(filters.get('maxWeight', 700))
+            limit = parse_limit(filters.get('limit', request.args.get('limit')))
+            cursor = filters.get('cursor', request.args.get('cursor'))
+            after_id = decode_id_cursor(cursor) if cursor else None
+        except (TypeError, ValueError) as e:
+            return make_response(jsonify({'message': f'Parâmetros de filtro inválidos: {str(e)}'}), 400)
 
-        cattle_list = query.all()
-        
-        # Filtrar por peso usando o histórico de pesagens
-        filtered_cattle = []
-        min_weight = filters.get('minWeight', 200)
-        max_weight = filters.get('maxWeight', 700)
         breeds_filter = set()
         if isinstance(filters.get('breeds'), dict):
             breeds_filter = {k.lower() for k, v in filters.get('breeds', {}).items() if v}
@@ -1416,79 +1233,23 @@ def filter_cattle():
             situations_filter = {k for k, v in filters.get('situations', {}).items() if v}
         elif isinstance(filters.get('situations'), list):
             situations_filter = set(filters.get('situations', []))
-        
-        for cattle in cattle_list:
-            current_weight = 350  # Peso padrão
-            situation = "Sem dados"
-            
-            # Buscar o peso mais recente
-            try:
-                latest_weighing = Weighing.query.filter_by(animal_id=cattle.id).order_by(Weighing.date.desc()).first()
-                if latest_weighing:
-                    current_weight = latest_weighing.weight
-                    # Calcular situação baseada no peso
-                    if current_weight > 400:
-                        situation = "Acima da média"
-                    elif current_weight < 300:
-                        situation = "Abaixo da média"
-                    else:
-                        situation = "Estável"
-                else:
-                    # Se não tem pesagem, usar peso de entrada
-                    entry_weight = getattr(cattle, 'entry_weight', None)
-                    if entry_weight:
-                        current_weight = entry_weight
-                        situation = "Sem histórico"
-                    else:
-                        situation = "Sem dados"
-            except Exception as e:
-                print(f"Erro ao processar gado {cattle.id}: {e}")
-                continue
-            
-            # Verificar se o peso está no range
-            if not (min_weight <= current_weight <= max_weight):
-                continue
-
-            if breeds_filter:
-                breed_normalized = (cattle.breed or '').lower()
-                if all(b not in breed_normalized for b in breeds_filter):
-                    continue
-
-            if situations_filter and situation:
-                normalized_situation = situation.lower()
-                matches_situation = False
-                situation_map = {
-                    'acima da média': 'aboveAverage',
-                    'acima da media': 'aboveAverage',
-                    'abaixo da média': 'belowAverage',
-                    'abaixo da media': 'belowAverage',
-                    'crescimento rápido': 'rapidGrowth',
-                    'crescimento rapido': 'rapidGrowth',
-                    'estável': 'stable',
-                    'estavel': 'stable'
-                }
-                normalized_key = situation_map.get(normalized_situation)
-                if normalized_key and normalized_key in situations_filter:
-                    matches_situation = True
-                elif normalized_situation in situations_filter:
-                    matches_situation = True
-                if not matches_situation:
-                    continue
-
-            filtered_cattle.append({
-                'id': cattle.id,
-                'name': cattle.name,
-                'currentWeight': current_weight,
-                'breed': cattle.breed,
-                'situation': situation,
-                'entry_date': cattle.created_at.strftime('%Y-%m-%d') if cattle.created_at else None,
-                'gender': cattle.gender,
-                'status': cattle.status
-            })
-        
+
+        # Peso atual, situação, faixa de peso, raça e situação resolvidos no SQL
+        filtered_cattle, last_id = reports.build_cattle_filter(
+            user_id=effective_user_id,
+            herd_id=herd_id,
+            min_weight=min_weight,
+            max_weight=max_weight,
+            breeds=breeds_filter,
+            situations=situations_filter,
+            limit=limit,
+            after_id=after_id
+        )
+
         return make_response(jsonify({
             'cattle': filtered_cattle,
             'total': len(filtered_cattle),
+            'next_cursor': encode_cursor([last_id]) if last_id is not None else None,
             'filters_applied': filters
         }), 200)
     except Exception as e:
@@ -0,0 +1,89 @@
+from sqlalchemy import text
+
+from app import db
+from app.models import Activity, Animal, Herd, UserHerd, VaccineApplication, Weighing
+
+# Código de pg_constraint.confdeltype para cada ação ON DELETE
+_PG_DELETE_ACTIONS = {'NO ACTION': 'a', 'RESTRICT': 'r', 'CASCADE': 'c', 'SET NULL': 'n', 'SET DEFAULT': 'd'}
+
+
+def sync_foreign_key_actions():
+    """
+    Bancos criados antes de os modelos declararem ondelete têm as FKs sem
+    a ação. No Postgres, recria cada FK cuja ação difere da declarada
+    (NOT VALID + VALIDATE, sem bloquear escritas durante a validação).
+    Retorna a lista "tabela.coluna" ajustada.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return []
+
+    rows = db.session.execute(text(
+        "SELECT con.conname, cl.relname, att.attname, con.confdeltype, cl.relkind "
+        "FROM pg_constraint con "
+        "JOIN pg_class cl ON cl.oid = con.conrelid "
+        "JOIN pg_attribute att ON att.attrelid = con.conrelid AND att.attnum = con.conkey[1] "
+        "WHERE con.contype = 'f' AND array_length(con.conkey, 1) = 1 "
+        "AND cl.relnamespace = 'public'::regnamespace"
+    )).all()
+    existing = {(table, column): (name, action, kind) for name, table, column, action, kind in rows}
+
+    fixed = []
+    for table in db.metadata.sorted_tables:
+        for fk in table.foreign_keys:
+            if not fk.ondelete:
+                continue
+            current = existing.get((table.name, fk.parent.name))
+            expected = _PG_DELETE_ACTIONS.get(fk.ondelete.upper())
+            if current is None or current[1] == expected:
+                continue
+            name, _, kind = current
+            target = fk.column
+            # Tabelas particionadas (activities) não aceitam FK NOT VALID: valida direto
+            not_valid = ' NOT VALID' if kind != 'p' else ''
+            db.session.execute(text(
+                f'ALTER TABLE {table.name} DROP CONSTRAINT "{name}", '
+                f'ADD CONSTRAINT "{name}" FOREIGN KEY ({fk.parent.name}) '
+                f'REFERENCES {target.table.name} ({target.name}) ON DELETE {fk.ondelete}{not_valid}'
+            ))
+            if not_valid:
+                db.session.execute(text(f'ALTER TABLE {table.name} VALIDATE CONSTRAINT "{name}"'))
+            fixed.append(f'{table.name}.{fk.parent.name}')
+    db.session.commit()
+    return fixed
+
+
+def hot_queries(user_id, animal_id, herd_id=None):
+    """Consultas representativas dos endpoints mais acessados, para EXPLAIN"""
+    return [
+        ('GET /api/v1/animals (usuário, paginado)',
+         db.select(Animal).where(Animal.user_id == user_id)
+         .order_by(Animal.created_at, Animal.id).limit(50)),
+        ('GET /api/v1/animals (usuário + fazenda + status)',
+         db.select(Animal).where(Animal.user_id == user_id, Animal.herd_id == herd_id, Animal.status == 'ativo')),
+        ('GET /api/v1/animals/<id>/weighings',
+         db.select(Weighing).where(Weighing.animal_id == animal_id)
+         .order_by(Weighing.date.desc(), Weighing.id.desc()).limit(50)),
+        ('GET /api/v1/animals/<id>/vaccines',
+         db.select(VaccineApplication).where(VaccineApplication.animal_id == animal_id)
+         .order_by(VaccineApplication.application_date.desc(), VaccineApplication.id.desc()).limit(50)),
+        ('GET /api/v1/herds (usuário)',
+         db.select(Herd).join(UserHerd).where(UserHerd.user_id == user_id)
+         .order_by(Herd.created_at, Herd.id).limit(50)),
+        ('GET /api/v1/activities (usuário)',
+         db.select(Activity).where(Activity.user_id == user_id)
+         .order_by(Activity.created_at.desc(), Activity.id.desc()).limit(50)),
+        ('GET /api/v1/export/activities (por data)',
+         db.select(Activity).order_by(Activity.created_at.desc()).limit(50)),
+    ]
+
+
+def explain_hot_queries(user_id, animal_id, herd_id=None):
+    """[(endpoint, [linhas do plano])] com EXPLAIN (Postgres) ou EXPLAIN QUERY PLAN (SQLite)"""
+    dialect = db.engine.dialect
+    prefix = 'EXPLAIN' if dialect.name == 'postgresql' else 'EXPLAIN QUERY PLAN'
+    plans = []
+    for label, statement in hot_queries(user_id, animal_id, herd_id):
+        sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+        rows = db.session.execute(text(f'{prefix} {sql}')).all()
+        plans.append((label, [str(row[-1]) for row in rows]))
+    return plans
@@ -0,0 +1,103 @@
+import logging
+import threading
+from contextlib import ExitStack
+
+from flask import g, jsonify, make_response, request
+from sqlalchemy import text
+
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def dispose_engines(app):
+    """
+    Descarta o pool herdado do processo mestre (gunicorn com preload).
+    close=False: as conexões pertencem ao mestre e não podem ser fechadas
+    pelo worker; o worker só passa a abrir as suas.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def make_psycopg_green():
+    """
+    Workers gevent: faz o psycopg2 esperar o banco cedendo o loop do gevent
+    (psycogreen) em vez de bloquear o processo. Chamar depois do monkey-patch
+    e antes da primeira conexão. Retorna False se o psycogreen não estiver instalado.
+    """
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        logger.warning("psycogreen não instalado: consultas ao Postgres vão bloquear o worker gevent")
+        return False
+    patch_psycopg()
+    return True
+
+
+def warm_pool(app, size):
+    """
+    Abre `size` conexões de uma vez (retidas juntas para o pool não reusar
+    a mesma) e as devolve ao pool, para que as primeiras requisições do
+    worker não paguem o connect. Falha do banco só gera aviso.
+    """
+    if size <= 0:
+        return 0
+    opened = 0
+    with app.app_context():
+        try:
+            with ExitStack() as stack:
+                for _ in range(size):
+                    connection = stack.enter_context(db.engine.connect())
+                    connection.execute(text('SELECT 1'))
+                    opened += 1
+        except Exception as e:
+            logger.warning(f"Aquecimento do pool interrompido após {opened} conexões: {str(e)}")
+    return opened
+
+
+def pool_status(app):
+    """Resumo do pool do engine padrão (conexões abertas, em uso e overflow)"""
+    with app.app_context():
+        return db.engine.pool.status()
+
+
+def without_db_limit(view):
+    """Marca uma rota que não segura conexão com o banco (fica fora do limite de concorrência)"""
+    view.without_db_limit = True
+    return view
+
+
+def install_db_concurrency_limit(app, limit, wait):
+    """
+    Limita as requisições que usam o banco em andamento neste processo a
+    `limit` (o tamanho do pool + overflow). Com gevent, um worker aceita
+    centenas de conexões: acima do limite a requisição espera até `wait`
+    segundos por uma vaga e então responde 503 com Retry-After, em vez de
+    ficar presa no pool_timeout do SQLAlchemy. Rotas marcadas com
+    without_db_limit (diagnóstico/SSE) não contam.
+    """
+    if limit <= 0:
+        return
+    slots = threading.BoundedSemaphore(limit)
+
+    def acquire_slot():
+        if request.method == 'OPTIONS':
+            return None
+        view = app.view_functions.get(request.endpoint)
+        if view is None or getattr(view, 'without_db_limit', False):
+            return None
+        if not slots.acquire(timeout=wait):
+            response = make_response(jsonify({'message': 'Servidor ocupado. Tente novamente em instantes.'}), 503)
+            response.headers['Retry-After'] = '1'
+            return response
+        g.db_slot = True
+        return None
+
+    def release_slot(exc):
+        if g.pop('db_slot', False):
+            slots.release()
+
+    app.before_request(acquire_slot)
+    app.teardown_request(release_slot)
@@ -1,48 +1,228 @@
-import boto3
 import logging
 import os
-from botocore.exceptions import ClientError
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
 
 logger = logging.getLogger(__name__)
 
+# GetParameters accepts at most 10 names per call
+_GET_PARAMETERS_MAX = 10
+
+SSM_CACHE_TTL = float(os.getenv('SSM_CACHE_TTL', '300'))  # Seconds a fetched value is served without refetching
+SSM_REFRESH_INTERVAL = float(os.getenv('SSM_REFRESH_INTERVAL', '0'))  # Background refresh period (0 = half the TTL)
+
+_client = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+class SSMParameterError(RuntimeError):
+    """One or more requested SSM parameters do not exist."""
+    pass
+
+
+def get_ssm_client():
+    """
+    One SSM client per process. boto3 clients are thread-safe (sessions are
+    not); keyed on the pid so a forked worker doesn't share its parent's
+    connection pool.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            # boto3 is slow to import; load it only when SSM is actually used
+            import boto3
+            _client = boto3.client('ssm', region_name=os.getenv('AWS_DEFAULT_REGION', 'us-east-1'))
+            _client_pid = os.getpid()
+        return _client
+
+
+def get_ssm_parameters(names: Iterable[str], with_decryption: bool = True, client=None) -> Dict[str, str]:
+    """
+    Fetches several parameters with batched GetParameters calls (up to 10
+    names per round trip). Raises SSMParameterError if any name is missing.
+    """
+    from botocore.exceptions import ClientError
+
+    names = list(dict.fromkeys(names))
+    ssm = client or get_ssm_client()
+    values: Dict[str, str] = {}
+    invalid = []
+    for start in range(0, len(names), _GET_PARAMETERS_MAX):
+        batch = names[start:start + _GET_PARAMETERS_MAX]
+        try:
+            response = ssm.get_parameters(Names=batch, WithDecryption=with_decryption)
+        except ClientError as e:
+            logger.error(f"Failed to fetch SSM parameters {', '.join(batch)}: {str(e)}")
+            raise
+        values.update({parameter['Name']: parameter['Value'] for parameter in response['Parameters']})
+        invalid.extend(response.get('InvalidParameters', []))
+    if invalid:
+        raise SSMParameterError(f"SSM parameters not found: {', '.join(invalid)}")
+    return values
+
+
 def get_ssm_parameter(param_name: str, with_decryption: bool = True) -> str:
     """
     Fetches a parameter from AWS SSM Parameter Store.
     """
-    session = boto3.Session()
-    ssm = session.client('ssm', region_name=os.getenv('AWS_DEFAULT_REGION', 'us-east-1'))
-    
-    try:
-        response = ssm.get_parameter(
-            Name=param_name,
-            WithDecryption=with_decryption
-        )
-        return response['Parameter']['Value']
-    except ClientError as e:
-        logger.error(f"Failed to fetch SSM parameter {param_name}: {str(e)}")
-        raise
+    return get_ssm_parameters([param_name], with_decryption=with_decryption)[param_name]
+
+
+class SSMParameterCache:
+    """
+    In-process cache of a fixed set of SSM parameters. The first get()
+    fetches them in one batched call; after that a daemon thread refetches
+    every `refresh_interval` seconds so rotated values are picked up without
+    a restart. If a refresh fails, the last good values keep being served
+    and the failure is logged.
+    """
+
+    def __init__(self, names: Iterable[str], ttl: Optional[float] = None,
+                 refresh_interval: Optional[float] = None, client=None):
+        self.names = list(names)
+        self.ttl = SSM_CACHE_TTL if ttl is None else ttl
+        self.refresh_interval = refresh_interval or SSM_REFRESH_INTERVAL or self.ttl / 2
+        self.client = client
+        self._values: Optional[Dict[str, str]] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._refresher_pid: Optional[int] = None
+        self._stop = threading.Event()
+        self.fetches = 0
+        self.failures = 0
+
+    def _fetch(self) -> Dict[str, str]:
+        values = get_ssm_parameters(self.names, client=self.client)
+        with self._lock:
+            self._values = values
+            self._fetched_at = time.monotonic()
+            self.fetches += 1
+        return values
+
+    def refresh(self) -> bool:
+        """Refetch now; returns False (keeping the previous values) on failure."""
+        try:
+            self._fetch()
+            return True
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            logger.error(f"SSM parameter refresh failed, serving cached values: {str(e)}")
+            return False
+
+    def get(self) -> Dict[str, str]:
+        self._start_refresher()
+        with self._lock:
+            values = self._values
+            fresh = values is not None and time.monotonic() - self._fetched_at < self.ttl
+        if fresh:
+            return dict(values)
+        if values is None:
+            # Cold: one caller fetches, the rest wait for its result. Nothing
+            # to fall back to, so errors reach the caller.
+            with self._fetch_lock:
+                with self._lock:
+                    values = self._values
+                if values is None:
+                    values = self._fetch()
+            return dict(values)
+        self.refresh()
+        with self._lock:
+            return dict(self._values)
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh()
+
+    def _start_refresher(self) -> None:
+        # Keyed on the pid so a worker forked from a preloaded master starts its own
+        with self._lock:
+            if self._refresher_pid == os.getpid() or self.refresh_interval <= 0:
+                return
+            self._refresher_pid = os.getpid()
+        thread = threading.Thread(target=self._refresh_loop, name="ssm-refresher", daemon=True)
+        thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "parameters": len(self.names),
+                "age_seconds": round(time.monotonic() - self._fetched_at, 1) if self._values is not None else None,
+                "fetches": self.fetches,
+                "failures": self.failures,
+            }
+
+
+_credential_caches: Dict[str, SSMParameterCache] = {}
+_credential_caches_lock = threading.Lock()
+
+
+def _db_base_path(project_name: str) -> str:
+    # Standard paths based on Terraform output
+    return f"/{project_name}/postgres/bovicare"
+
+
+def get_db_credentials_cache(project_name: str = 'bovicare') -> SSMParameterCache:
+    """Shared cache of host/username/password for a project (one per process)."""
+    base_path = _db_base_path(project_name)
+    with _credential_caches_lock:
+        cache = _credential_caches.get(base_path)
+        if cache is None:
+            cache = SSMParameterCache([
+                f"{base_path}/host",
+                f"{base_path}/admin/username",
+                f"{base_path}/admin/password",
+            ])
+            _credential_caches[base_path] = cache
+        return cache
+
+
+def get_db_credentials(project_name: str = 'bovicare') -> Dict[str, str]:
+    """{'host', 'user', 'password'} from the cache (one batched SSM call when cold)."""
+    base_path = _db_base_path(project_name)
+    values = get_db_credentials_cache(project_name).get()
+    return {
+        'host': values[f"{base_path}/host"],
+        'user': values[f"{base_path}/admin/username"],
+        'password': values[f"{base_path}/admin/password"],
+    }
+
 
 def get_db_connection_string(project_name: str = 'bovicare', env: str = 'production') -> str:
     """
     Constructs the SQLAlchemy connection string by fetching credentials from SSM.
     Expects parameters at: /project/postgres/company/admin/... and /project/postgres/company/host
     """
-    # Standard paths based on Terraform output
-    base_path = f"/{project_name}/postgres/bovicare"
-    
     try:
         logger.info("Fetching database credentials from AWS SSM...")
-        host = get_ssm_parameter(f"{base_path}/host")
-        user = get_ssm_parameter(f"{base_path}/admin/username")
-        password = get_ssm_parameter(f"{base_path}/admin/password")
-        
+        credentials = get_db_credentials(project_name)
+
         # DB Name is 'bovicare'
         dbname = "bovicare"
         port = "5432"
-        
-        return f"postgresql://{user}:{password}@{host}:{port}/{dbname}"
-        
+
+        return f"postgresql://{credentials['user']}:{credentials['password']}@{credentials['host']}:{port}/{dbname}"
+
     except Exception as e:
         logger.error(f"Error constructing DB connection string: {str(e)}")
         raise
 
+
+def use_ssm_credentials(engine, project_name: str = 'bovicare') -> None:
+    """
+    Resolve host/user/password from the SSM cache each time the engine opens
+    a connection, so rotated credentials apply to new connections without a
+    restart (pooled ones are replaced as pool_recycle expires them).
+    Nothing is fetched until the first connection.
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'do_connect')
+    def _inject_credentials(dialect, connection_record, cargs, cparams):
+        cparams.update(get_db_credentials(project_name))
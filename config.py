@@ -3,10 +3,71 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def _engine_options(database_uri):
+    """Opções do pool do SQLAlchemy; tamanho/overflow só valem para bancos em servidor (não SQLite)"""
+    options = {
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1').lower() not in ('0', 'false', 'no'),  # Testa a conexão antes de usar (derrubadas pelo servidor/firewall)
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),  # Segundos até reabrir uma conexão (-1 desativa)
+    }
+    if database_uri and not database_uri.startswith('sqlite'):
+        options.update({
+            'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),  # Conexões mantidas abertas por processo
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),  # Conexões extras em picos, fechadas ao devolver
+            'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),  # Espera por uma conexão livre antes de erro
+        })
+    if database_uri and database_uri.startswith('postgresql'):
+        options['connect_args'] = {'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '10'))}
+    return options
+
+
 class Config:
-    SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
+    # Sem SQLALCHEMY_DATABASE_URI, host/usuário/senha vêm do SSM (/<projeto>/postgres/bovicare/...) a cada nova conexão
+    DB_SSM_PROJECT = None if os.getenv('SQLALCHEMY_DATABASE_URI') else os.getenv('DB_SSM_PROJECT')
+    SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI') or (
+        'postgresql+psycopg2:///bovicare' if DB_SSM_PROJECT else None
+    )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
+    DB_POOL_WARMUP = int(os.getenv('DB_POOL_WARMUP', '0'))  # Conexões abertas por worker do gunicorn ao subir (0 = não aquece)
+    DB_CONCURRENCY_LIMIT = int(os.getenv('DB_CONCURRENCY_LIMIT', '0'))  # Requisições usando o banco ao mesmo tempo por processo (0 = sem limite)
+    DB_CONCURRENCY_WAIT = float(os.getenv('DB_CONCURRENCY_WAIT', '2'))  # Segundos esperando vaga antes de responder 503
+    # Criar/migrar o schema ao subir a aplicação (desenvolvimento); em produção use `flask db-migrate`
+    SCHEMA_AUTO_MIGRATE = os.getenv('SCHEMA_AUTO_MIGRATE', '0').lower() in ('1', 'true', 'yes')
 
     # RAG Service Configuration
     RAG_SERVICE_URL = os.getenv('RAG_SERVICE_URL', 'http://localhost:8000')
-    RAG_SERVICE_TIMEOUT = int(os.getenv('RAG_SERVICE_TIMEOUT', '180'))  # 180 seconds (3 minutes)
\ No newline at end of file
+    RAG_SERVICE_TIMEOUT = int(os.getenv('RAG_SERVICE_TIMEOUT', '180'))  # 180 seconds (3 minutes)
+    RAG_CONNECT_TIMEOUT = float(os.getenv('RAG_CONNECT_TIMEOUT', '5'))  # TCP connect only; RAG_SERVICE_TIMEOUT is the read timeout
+    RAG_POOL_SIZE = int(os.getenv('RAG_POOL_SIZE', '10'))  # Keep-alive connections kept per RAG host
+    RAG_MAX_RETRIES = int(os.getenv('RAG_MAX_RETRIES', '2'))  # Retries on connection errors only
+    RAG_RETRY_BACKOFF = float(os.getenv('RAG_RETRY_BACKOFF', '0.5'))  # Backoff factor between retries (seconds)
+    RAG_BREAKER_FAILURES = int(os.getenv('RAG_BREAKER_FAILURES', '5'))  # Consecutive failures that open the circuit
+    RAG_BREAKER_COOLDOWN = float(os.getenv('RAG_BREAKER_COOLDOWN', '30'))  # Seconds the circuit stays open before a trial call
+    RAG_HEALTH_INTERVAL = float(os.getenv('RAG_HEALTH_INTERVAL', '10'))  # Seconds between background health probes
+    RAG_HEALTH_TIMEOUT = float(os.getenv('RAG_HEALTH_TIMEOUT', '5'))  # Read timeout of each health probe
+    RAG_CACHE_SIZE = int(os.getenv('RAG_CACHE_SIZE', '512'))  # Cached diagnose answers (0 disables the cache)
+    RAG_CACHE_TTL = int(os.getenv('RAG_CACHE_TTL', '3600'))  # Seconds a cached answer stays valid
+    RAG_CACHE_SYNC_INTERVAL = float(os.getenv('RAG_CACHE_SYNC_INTERVAL', '1'))  # Max seconds a worker serves its cache before checking for an invalidation
+    RAG_CACHE_ADMIN_TOKEN = os.getenv('RAG_CACHE_ADMIN_TOKEN')  # Required in X-Admin-Token to invalidate the cache; unset disables the endpoint
+
+    # Fila de mensagens (e-mail/SMS de recuperação de senha)
+    OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', '2'))  # Threads que drenam a fila
+    OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '5'))  # Segundos entre consultas quando a fila está vazia
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '5'))  # Tentativas antes de marcar a mensagem como failed
+    OUTBOX_RETRY_BASE = float(os.getenv('OUTBOX_RETRY_BASE', '30'))  # Espera da primeira nova tentativa (dobra a cada falha)
+    OUTBOX_INPROCESS_WORKERS = os.getenv('OUTBOX_INPROCESS_WORKERS', '1').lower() not in ('0', 'false', 'no')  # Workers dentro da API; desative ao usar `flask outbox-worker`
+
+    # Feed de atividades em memória (últimas atividades por usuário)
+    ACTIVITY_BUFFER_SIZE = int(os.getenv('ACTIVITY_BUFFER_SIZE', '50'))  # Atividades guardadas por usuário
+    ACTIVITY_BUFFER_TTL = float(os.getenv('ACTIVITY_BUFFER_TTL', '30'))  # Validade máxima do feed carregado (escritas são detectadas pela geração)
+    ACTIVITY_BUFFER_USERS = int(os.getenv('ACTIVITY_BUFFER_USERS', '10000'))  # Usuários mantidos em memória (LRU)
+
+    # Cache de usuários por processo (identidade da requisição e páginas de perfil)
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))  # Usuários mantidos em memória (LRU; 0 desativa)
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))  # Segundos até reler do banco (alterações de outros processos)
+
+    # Retenção da tabela activities (partições mensais no Postgres, tabelas de arquivo no SQLite)
+    ACTIVITY_RETENTION_MONTHS = int(os.getenv('ACTIVITY_RETENTION_MONTHS', '12'))  # Meses mantidos na tabela ativa (0 mantém tudo)
+    ACTIVITY_RETENTION_ACTION = os.getenv('ACTIVITY_RETENTION_ACTION', 'archive')  # archive (desanexa/move para activities_archive_AAAA_MM) ou drop
+    ACTIVITY_PARTITIONS_AHEAD = int(os.getenv('ACTIVITY_PARTITIONS_AHEAD', '3'))  # Partições futuras criadas com antecedência
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""
+Perfil de produção do gunicorn (lido automaticamente por `gunicorn run:app`
+quando executado na raiz do projeto).
+
+Por padrão os workers são gevent (cooperativos): os streams SSE do
+diagnóstico ficam abertos esperando o RAG sem ocupar uma thread cada, e o
+psycopg2 cede o worker durante as consultas (psycogreen). Sem gevent
+instalado, ou com GUNICORN_WORKER_CLASS=gthread, usa threads.
+
+Workers e threads derivam da quantidade de CPUs e podem ser sobrescritos
+por variáveis de ambiente (ver README). Com gthread e preload, a aplicação
+é importada uma vez no mestre e cada worker descarta o pool de conexões
+herdado (post_fork); em todos os casos cada worker aquece o seu próprio
+pool (post_worker_init).
+"""
+import os
+import multiprocessing
+from importlib.util import find_spec
+
+_cpus = multiprocessing.cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5003')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent' if find_spec('gevent') else 'gthread')
+workers = int(os.getenv('GUNICORN_WORKERS', str(2 * _cpus + 1)))
+# Requisições passam a maior parte do tempo esperando banco/RAG: algumas threads por worker
+threads = int(os.getenv('GUNICORN_THREADS', '4')) if worker_class == 'gthread' else 1
+# gevent: conexões simultâneas por worker (streams SSE do diagnóstico)
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))
+
+# Com gevent o monkey-patch acontece no worker: a aplicação precisa ser importada depois dele.
+# Locks e sockets criados antes (no mestre) ficariam nativos e travariam o worker inteiro.
+preload_app = os.getenv('GUNICORN_PRELOAD', '0' if worker_class == 'gevent' else '1').lower() in ('1', 'true', 'yes')
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Reciclar workers periodicamente (0 desativa); jitter evita que todos reiniciem juntos
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+# Uma conexão por thread e todas abertas no boot, a menos que configurado explicitamente.
+# Precisa estar no ambiente antes de config.Config ser importado (preload ou worker).
+os.environ.setdefault('DB_POOL_SIZE', str(threads if worker_class == 'gthread' else 5))
+os.environ.setdefault('DB_POOL_WARMUP', os.environ['DB_POOL_SIZE'])
+# gevent: das worker_connections, só pool + overflow podem usar o banco ao mesmo tempo;
+# o excedente espera DB_CONCURRENCY_WAIT segundos e recebe 503 (gthread já é limitado pelas threads)
+if worker_class == 'gevent':
+    os.environ.setdefault('DB_CONCURRENCY_LIMIT', str(
+        int(os.environ['DB_POOL_SIZE']) + int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    ))
+
+
+def on_starting(server):
+    pool_size = int(os.environ['DB_POOL_SIZE'])
+    max_overflow = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    budget = int(os.getenv('DB_MAX_CONNECTIONS', '100'))
+    peak = workers * (pool_size + max_overflow)
+    server.log.info(
+        f"{workers} workers {worker_class} x {threads} threads (preload={preload_app}); "
+        f"pool do banco {pool_size}+{max_overflow} por worker, até {peak} conexões"
+    )
+    db_limit = int(os.getenv('DB_CONCURRENCY_LIMIT', '0'))
+    if worker_class == 'gevent':
+        server.log.info(
+            f"Até {worker_connections} conexões por worker; {db_limit or 'sem limite de'} requisições "
+            f"usando o banco ao mesmo tempo (DB_CONCURRENCY_LIMIT)"
+        )
+        if not db_limit or db_limit > pool_size + max_overflow:
+            server.log.warning(
+                f"DB_CONCURRENCY_LIMIT acima do pool ({pool_size}+{max_overflow}): requisições excedentes "
+                f"ficam esperando o pool por até DB_POOL_TIMEOUT segundos em vez de receber 503"
+            )
+    if worker_class == 'gevent' and preload_app:
+        server.log.warning("GUNICORN_PRELOAD com gevent importa a aplicação antes do monkey-patch; use GUNICORN_PRELOAD=0")
+    if worker_class == 'gevent' and not find_spec('psycogreen'):
+        server.log.warning("psycogreen não instalado: com gevent, cada consulta ao Postgres bloqueia o worker inteiro")
+    if peak > budget:
+        server.log.warning(
+            f"Até {peak} conexões com o banco excedem DB_MAX_CONNECTIONS={budget}; "
+            f"reduza GUNICORN_WORKERS, DB_POOL_SIZE ou DB_MAX_OVERFLOW"
+        )
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return
+    from app import serving
+    serving.dispose_engines(worker.app.wsgi())
+
+
+def post_worker_init(worker):
+    from app import serving
+    from config import Config
+    # Antes de qualquer conexão: o import da aplicação não abre nenhuma
+    if worker_class == 'gevent':
+        serving.make_psycopg_green()
+    opened = serving.warm_pool(worker.wsgi, Config.DB_POOL_WARMUP)
+    worker.log.info(f"Worker {worker.pid}: {opened} conexões com o banco abertas no boot")
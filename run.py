@@ -1,4 +1,7 @@
-from app import app
+from app import create_app
 
+app = create_app()
+
+# Servidor de desenvolvimento; em produção: gunicorn run:app (ver gunicorn.conf.py)
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5003, debug=True)
@@ -0,0 +1,185 @@
+"""
+Load benchmark: the Flask development server (`python run.py`, debug on)
+against the production profile (`gunicorn run:app` with gunicorn.conf.py).
+
+Both servers run the same app against the same seeded database. A pool of
+keep-alive clients cycles through a mix of read endpoints for a fixed time.
+The script reports throughput, latency percentiles and errors for each setup.
+
+Usage:
+    python scripts/bench_serving.py
+
+Environment:
+    BENCH_DATABASE_URI   database to seed and serve (default: throwaway SQLite file)
+    BENCH_CONCURRENCY    concurrent clients (default 32)
+    BENCH_DURATION       seconds of load per server (default 10)
+    BENCH_ANIMALS        animals seeded for the benchmark user (default 500)
+    BENCH_TARGETS        comma-separated subset of: dev, gunicorn (default both)
+    GUNICORN_*/DB_POOL_* are passed through to the gunicorn run
+"""
+import os
+import sys
+import time
+import random
+import socket
+import logging
+import tempfile
+import statistics
+import subprocess
+import threading
+from datetime import date, timedelta
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if not os.getenv('BENCH_DATABASE_URI'):
+    _db_file = os.path.join(tempfile.mkdtemp(prefix='bovicare-bench-'), 'bench.db')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{_db_file}"
+else:
+    os.environ['SQLALCHEMY_DATABASE_URI'] = os.environ['BENCH_DATABASE_URI']
+
+CONCURRENCY = int(os.getenv('BENCH_CONCURRENCY', '32'))
+DURATION = float(os.getenv('BENCH_DURATION', '10'))
+ANIMALS = int(os.getenv('BENCH_ANIMALS', '500'))
+TARGETS = os.getenv('BENCH_TARGETS', 'dev,gunicorn').split(',')
+USER_ID = 1
+
+DEV_SERVER = (
+    "import sys; from run import app; "
+    "app.run(host='127.0.0.1', port=int(sys.argv[1]), debug=True, use_reloader=False)"
+)
+
+
+def seed():
+    """One user with a herd of ANIMALS animals and a short weighing history each; returns animal ids."""
+    from app import create_app, db, migrations
+    from app.models import User, Herd, UserHerd, Animal, Weighing
+
+    app = create_app()
+    with app.app_context():
+        migrations.setup_schema(log=logger.info)
+        if db.session.get(User, USER_ID):
+            return [row.id for row in db.session.query(Animal.id).filter(Animal.user_id == USER_ID)]
+
+        rnd = random.Random(USER_ID)
+        herd = Herd(name='Bench')
+        db.session.add_all([User(id=USER_ID, username='bench', email='bench@bovicare.com', password='x'), herd])
+        db.session.flush()
+        db.session.add(UserHerd(user_id=USER_ID, herd_id=herd.id))
+        db.session.execute(Animal.__table__.insert(), [
+            {'earring': f'S-{i}', 'name': f'Animal {i}', 'user_id': USER_ID, 'herd_id': herd.id,
+             'status': 'ativo', 'entry_weight': 250.0}
+            for i in range(ANIMALS)
+        ])
+        animal_ids = [row.id for row in db.session.query(Animal.id).filter(Animal.user_id == USER_ID)]
+        db.session.execute(Weighing.__table__.insert(), [
+            {'animal_id': animal_id, 'weight': round(250.0 + 30 * j + rnd.uniform(-5, 5), 1),
+             'date': date(2025, 1, 1) + timedelta(days=30 * j)}
+            for animal_id in animal_ids for j in range(5)
+        ])
+        db.session.commit()
+        return animal_ids
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(target, port):
+    env = dict(os.environ, OUTBOX_INPROCESS_WORKERS='0', SCHEMA_AUTO_MIGRATE='0')
+    if target == 'dev':
+        command = [sys.executable, '-c', DEV_SERVER, str(port)]
+    else:
+        env.update(GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_ACCESS_LOG='')
+        command = [sys.executable, '-m', 'gunicorn', 'run:app']
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{target} server exited: {process.stderr.read().decode()[-2000:]}")
+        try:
+            requests.get(f'http://127.0.0.1:{port}/test', timeout=1)
+            return process
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{target} server did not come up on port {port}")
+
+
+def load(base_url, animal_ids):
+    """Run CONCURRENCY clients for DURATION seconds; returns (latencies in ms, errors)."""
+    paths = [
+        '/api/v1/animals?per_page=20',
+        '/api/v1/dashboard',
+        '/api/v1/activities?limit=20',
+        '/test',
+    ]
+    headers = {'X-User-Id': str(USER_ID)}
+    latencies, errors = [], []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + DURATION
+
+    def client(seed_value):
+        rnd = random.Random(seed_value)
+        session = requests.Session()
+        local_latencies, local_errors = [], 0
+        while time.monotonic() < stop_at:
+            path = rnd.choice(paths + [f'/api/v1/animals/{rnd.choice(animal_ids)}/weighings'])
+            started = time.perf_counter()
+            try:
+                response = session.get(base_url + path, headers=headers, timeout=30)
+                if response.status_code >= 500:
+                    local_errors += 1
+            except requests.RequestException:
+                local_errors += 1
+            local_latencies.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(CONCURRENCY)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(errors)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run():
+    animal_ids = seed()
+    logger.info(f"Seeded {len(animal_ids)} animals; {CONCURRENCY} clients for {DURATION:.0f}s per server")
+
+    results = []
+    for target in TARGETS:
+        port = free_port()
+        process = start_server(target, port)
+        try:
+            latencies, errors = load(f'http://127.0.0.1:{port}', animal_ids)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        results.append((target, len(latencies), errors, latencies))
+
+    logger.info(f"{'server':<10} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for target, count, errors, latencies in results:
+        logger.info(
+            f"{target:<10} {count:>9} {count / DURATION:>8.1f} {statistics.median(latencies):>8.1f} "
+            f"{percentile(latencies, 0.95):>8.1f} {percentile(latencies, 0.99):>8.1f} {errors:>7}"
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,110 @@
+import sys
+import os
+import time
+import random
+import logging
+import tempfile
+from datetime import date, timedelta
+
+# Add the parent directory to sys.path to allow importing 'app'
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Use a throwaway SQLite database BEFORE importing app, unless one is provided
+if not os.getenv('BENCH_DATABASE_URI'):
+    _db_file = os.path.join(tempfile.mkdtemp(prefix='bovicare-bench-'), 'bench.db')
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{_db_file}"
+else:
+    os.environ['SQLALCHEMY_DATABASE_URI'] = os.environ['BENCH_DATABASE_URI']
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Herd, UserHerd, Animal, Weighing
+
+app = create_app()
+
+HERD_SIZES = [int(n) for n in os.getenv('BENCH_HERD_SIZES', '100,1000,5000').split(',')]
+WEIGHINGS_PER_ANIMAL = int(os.getenv('BENCH_WEIGHINGS_PER_ANIMAL', '15'))
+ENDPOINT = os.getenv('BENCH_ENDPOINT', '/api/weight/report')
+
+
+def seed_user(user_id, herd_size):
+    """Create a user with `herd_size` animals and a weighing history for each one."""
+    rnd = random.Random(user_id)
+    user = User(id=user_id, username=f'bench{user_id}', email=f'bench{user_id}@bovicare.com', password='x')
+    herd = Herd(name=f'Bench {user_id}')
+    db.session.add_all([user, herd])
+    db.session.flush()
+    db.session.add(UserHerd(user_id=user_id, herd_id=herd.id))
+
+    animals = [
+        {
+            'earring': f'B{user_id}-{i}',
+            'name': f'Animal {i}',
+            'user_id': user_id,
+            'herd_id': herd.id,
+            'status': 'ativo',
+            'entry_weight': 250.0,
+            'target_weight': rnd.choice([None, 450.0, 520.0])
+        }
+        for i in range(herd_size)
+    ]
+    db.session.execute(Animal.__table__.insert(), animals)
+    animal_ids = [row.id for row in db.session.query(Animal.id).filter(Animal.user_id == user_id)]
+
+    weighings = []
+    for animal_id in animal_ids:
+        weight = 250.0
+        for j in range(WEIGHINGS_PER_ANIMAL):
+            weight += rnd.uniform(-5, 35)
+            weighings.append({
+                'animal_id': animal_id,
+                'weight': round(weight, 1),
+                'date': date(2024, 1, 1) + timedelta(days=30 * j)
+            })
+    db.session.execute(Weighing.__table__.insert(), weighings)
+    db.session.commit()
+
+
+def run():
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    results = []
+    with app.app_context():
+        db.create_all()
+        event.listen(db.engine, 'before_cursor_execute', count_statement)
+        client = app.test_client()
+
+        for user_id, herd_size in enumerate(HERD_SIZES, start=1000):
+            seed_user(user_id, herd_size)
+            db.session.remove()
+
+            statements.clear()
+            started = time.perf_counter()
+            response = client.get(ENDPOINT, headers={'X-User-Id': str(user_id)})
+            elapsed = time.perf_counter() - started
+
+            if response.status_code != 200:
+                logger.error(f"{ENDPOINT} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+                sys.exit(1)
+
+            results.append((herd_size, len(statements), elapsed))
+            logger.info(f"{herd_size:>6} animals: {len(statements)} queries, {elapsed * 1000:.1f} ms")
+
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+    query_counts = {count for _, count, _ in results}
+    if len(query_counts) != 1:
+        logger.error(f"Query count grows with herd size: {results}")
+        sys.exit(1)
+    logger.info(f"OK: query count is constant ({query_counts.pop()}) across herd sizes {HERD_SIZES}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,148 @@
+"""
+End-to-end check of the password-reset outbox against a local SMTP sink
+(aiosmtpd), with no real mail server:
+
+1. POST /auth/forgot-password while nothing listens on the SMTP port:
+   the API must answer right away (delivery happens in the worker).
+2. The in-process worker's first attempt is refused and rescheduled.
+3. An aiosmtpd sink comes up on that port; the retry must deliver the
+   email exactly once, with the reset code, and clear the stored payload.
+
+Usage:
+    pip install aiosmtpd
+    python scripts/check_outbox_smtp.py
+
+Environment:
+    CHECK_TIMEOUT   seconds to wait for each step (default 30)
+"""
+import os
+import sys
+import time
+import email
+import socket
+import logging
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logging.getLogger('mail.log').setLevel(logging.WARNING)
+
+TIMEOUT = float(os.getenv('CHECK_TIMEOUT', '30'))
+EMAIL = 'reset-check@bovicare.test'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+SMTP_PORT = free_port()
+
+# Must be in place before the app (and app.email_service) is imported
+os.environ.update(
+    SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bovicare-outbox-'), 'outbox.db')}",
+    SCHEMA_AUTO_MIGRATE='0',
+    SMTP_SERVER='127.0.0.1',
+    SMTP_PORT=str(SMTP_PORT),
+    SMTP_USE_TLS='0',
+    EMAIL_USER='noreply@bovicare.test',
+    SMTP_NO_AUTH='1',
+    OUTBOX_INPROCESS_WORKERS='1',
+    OUTBOX_WORKERS='1',
+    OUTBOX_POLL_INTERVAL='0.2',
+    OUTBOX_RETRY_BASE='1',
+)
+
+
+class Sink:
+    """aiosmtpd handler that keeps every message it receives"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        message = email.message_from_bytes(envelope.content)
+        body = ''.join(
+            part.get_payload(decode=True).decode('utf-8', 'replace')
+            for part in message.walk() if part.get_content_type() == 'text/plain'
+        )
+        self.messages.append((envelope.rcpt_tos, body))
+        return '250 OK'
+
+
+def wait_for(description, predicate):
+    deadline = time.monotonic() + TIMEOUT
+    while time.monotonic() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(0.1)
+    raise SystemExit(f"FAIL: timed out waiting for {description}")
+
+
+def run():
+    from aiosmtpd.controller import Controller
+
+    from app import create_app, db, migrations
+    from app.models import User, PasswordReset, OutboundMessage
+    from app.outbox import SENT, PENDING, CLEARED_PAYLOAD
+
+    app = create_app()
+    with app.app_context():
+        migrations.setup_schema(log=logger.info)
+        db.session.add(User(username='reset-check', email=EMAIL, password='x'))
+        db.session.commit()
+
+    def message_state():
+        with app.app_context():
+            message = OutboundMessage.query.one_or_none()
+            state = None if message is None else (message.status, message.attempts, message.last_error, message.payload)
+            db.session.remove()
+            return state
+
+    started = time.perf_counter()
+    response = app.test_client().post('/auth/forgot-password', json={'method': 'email', 'email': EMAIL})
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if response.status_code != 200:
+        raise SystemExit(f"FAIL: forgot-password answered {response.status_code}: {response.get_json()}")
+    logger.info(f"forgot-password answered 200 in {elapsed_ms:.1f} ms with no SMTP server listening")
+
+    status, attempts, last_error, _ = wait_for(
+        'the first (refused) attempt',
+        lambda: (state := message_state()) and state[1] >= 1 and state[0] == PENDING and state[2] and state
+    )
+    logger.info(f"attempt {attempts} refused and rescheduled: {last_error}")
+
+    sink = Sink()
+    controller = Controller(sink, hostname='127.0.0.1', port=SMTP_PORT)
+    controller.start()
+    try:
+        status, attempts, _, payload = wait_for(
+            'delivery after the sink came up',
+            lambda: (state := message_state()) and state[0] == SENT and state
+        )
+        time.sleep(1)  # a duplicate send would show up here
+    finally:
+        controller.stop()
+
+    with app.app_context():
+        code = PasswordReset.query.one().code
+
+    failures = []
+    if len(sink.messages) != 1:
+        failures.append(f"expected 1 email at the sink, got {len(sink.messages)}")
+    elif sink.messages[0][0] != [EMAIL] or code not in sink.messages[0][1]:
+        failures.append("email at the sink has the wrong recipient or no reset code")
+    if payload != CLEARED_PAYLOAD:
+        failures.append(f"payload not cleared after delivery: {payload}")
+    if failures:
+        raise SystemExit('FAIL: ' + '; '.join(failures))
+    logger.info(f"OK: delivered once after {attempts} attempts; stored payload cleared")
+
+
+if __name__ == "__main__":
+    run()
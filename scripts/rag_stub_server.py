@@ -0,0 +1,115 @@
+"""
+Local stand-in for the RAG service, for exercising the chat proxy without
+OpenAI/Milvus. Implements the endpoints the API calls:
+
+    GET  /health       -> {"status": "ok"}
+    POST /ask          -> {"response": ..., "sources": [...]} after the full delay
+    POST /ask/stream   -> Server-Sent Events: token..., sources, done
+
+Usage:
+    python scripts/rag_stub_server.py
+    RAG_SERVICE_URL=http://localhost:8001 python run.py
+    curl -N -X POST localhost:5003/api/chat/diagnose/stream \
+         -H 'Content-Type: application/json' -d '{"message": "bezerro com diarreia"}'
+
+Environment:
+    STUB_PORT          port to listen on (default 8001)
+    STUB_TOKENS        tokens per answer (default 40)
+    STUB_TOKEN_DELAY   seconds between tokens (default 0.05), simulating LLM generation
+"""
+import os
+import sys
+import json
+import time
+import logging
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PORT = int(os.getenv('STUB_PORT', '8001'))
+TOKENS = int(os.getenv('STUB_TOKENS', '40'))
+TOKEN_DELAY = float(os.getenv('STUB_TOKEN_DELAY', '0.05'))
+
+SOURCES = [
+    {'title': 'Manual de Sanidade Bovina (stub)', 'page': 12},
+    {'title': 'Boletim Técnico Embrapa (stub)', 'page': 3}
+]
+
+
+def answer_tokens(query):
+    words = f"Resposta simulada para: {query}.".split()
+    filler = ['Observe', 'o', 'animal', 'e', 'consulte', 'um', 'veterinário.']
+    while len(words) < TOKENS:
+        words.extend(filler)
+    return [word + ' ' for word in words[:TOKENS]]
+
+
+class StubRAGHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _read_query(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        return body.get('query', '')
+
+    def _send_json(self, payload, status=200):
+        raw = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _send_event(self, event, payload):
+        chunk = f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8')
+        self.wfile.write(f"{len(chunk):x}\r\n".encode('ascii') + chunk + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == '/health':
+            return self._send_json({'status': 'ok', 'stub': True})
+        self._send_json({'detail': 'Not Found'}, 404)
+
+    def do_POST(self):
+        if self.path == '/ask':
+            tokens = answer_tokens(self._read_query())
+            time.sleep(TOKEN_DELAY * len(tokens))
+            return self._send_json({'response': ''.join(tokens).strip(), 'sources': SOURCES})
+
+        if self.path == '/ask/stream':
+            tokens = answer_tokens(self._read_query())
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for token in tokens:
+                time.sleep(TOKEN_DELAY)
+                self._send_event('token', {'text': token})
+            self._send_event('sources', {'sources': SOURCES})
+            self._send_event('done', {})
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        self._send_json({'detail': 'Not Found'}, 404)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def main():
+    server = ThreadingHTTPServer(('0.0.0.0', PORT), StubRAGHandler)
+    server.daemon_threads = True
+    logger.info(f"Stub RAG service listening on http://localhost:{PORT} "
+                f"({TOKENS} tokens, {TOKEN_DELAY}s/token)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Stopping stub RAG service")
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,6 @@
 import sys
 import os
 import logging
-import boto3
-from botocore.exceptions import ClientError
 from werkzeug.security import generate_password_hash
 
 # Add the parent directory to sys.path to allow importing 'app'
@@ -12,51 +10,22 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_ssm_parameter(param_name: str, with_decryption: bool = True) -> str:
-    """Fetches a parameter from AWS SSM Parameter Store."""
-    session = boto3.Session()
-    ssm = session.client('ssm', region_name=os.getenv('AWS_DEFAULT_REGION', 'us-east-1'))
-    
-    try:
-        response = ssm.get_parameter(
-            Name=param_name,
-            WithDecryption=with_decryption
-        )
-        return response['Parameter']['Value']
-    except ClientError as e:
-        logger.error(f"Failed to fetch SSM parameter {param_name}: {str(e)}")
-        raise
-
-def get_db_connection_string(project_name: str = 'bovicare', env: str = 'production') -> str:
-    """Constructs the SQLAlchemy connection string by fetching credentials from SSM."""
-    base_path = f"/{project_name}/postgres/bovicare"
-    
-    try:
-        logger.info("Fetching database credentials from AWS SSM...")
-        host = get_ssm_parameter(f"{base_path}/host")
-        user = get_ssm_parameter(f"{base_path}/admin/username")
-        password = get_ssm_parameter(f"{base_path}/admin/password")
-        
-        dbname = "bovicare"
-        port = "5432"
-        
-        return f"postgresql://{user}:{password}@{host}:{port}/{dbname}"
-        
-    except Exception as e:
-        logger.error(f"Error constructing DB connection string: {str(e)}")
-        raise
+# Host/username/password in one batched GetParameters call
+from app.utils.aws_db import get_db_connection_string
 
-# 1. Get Connection String from AWS BEFORE importing app
+# 1. Get Connection String from AWS BEFORE creating the app
 logger.info("Retrieving database configuration...")
 db_uri = get_db_connection_string()
 
 # 2. Set environment variable so app can use it during initialization
 os.environ['SQLALCHEMY_DATABASE_URI'] = db_uri
 
-# Now import app (it will read SQLALCHEMY_DATABASE_URI from env)
-from app import app, db
+# Now create the app (it will read SQLALCHEMY_DATABASE_URI from env)
+from app import create_app, db, migrations
 from app.models import User
 
+app = create_app()
+
 def init_db():
     """
     Initialize the database schema and seed default admin user.
@@ -64,9 +33,9 @@ def init_db():
     try:
         
         with app.app_context():
-            # 3. Create Tables
+            # 3. Create tables and apply migrations/indexes
             logger.info("Creating database tables...")
-            db.create_all()
+            migrations.setup_schema(log=logger.info)
             logger.info("Tables created successfully.")
             
             # 4. Create Admin User